@@ -0,0 +1,75 @@
+"""Coste por petición de verificar_autenticacion() en cada servicio (user-019).
+
+Mide la verificación con API key, con un JWT ya en la cache de tokens
+verificados, con un JWT sin cache (la primera petición de cada token), con un
+JWT inválido y con el header X-Auth-Interna firmado entre servicios (usuario y
+pedido). Como referencia mide verify_jwt_in_request, que es lo que se hacía en
+cada petición antes de la cache. Cada servicio se mide en su propio proceso.
+
+Uso: python microservicios/bench/autenticacion.py [servicio ...] [--peticiones N]
+"""
+import argparse
+import secrets
+import subprocess
+import sys
+import time
+import warnings
+
+from flask_jwt_extended import create_access_token, verify_jwt_in_request
+
+from servicios import cargar_app
+
+SERVICIOS = ("usuario-service", "pedido-service", "gateway-service")
+
+def medir_caso(app, headers, peticiones, verificar):
+    """Microsegundos por llamada a verificar() dentro de una petición con esos headers"""
+    with app.app.test_request_context('/usuarios', headers=headers):
+        verificar()
+        inicio = time.perf_counter()
+        for _ in range(peticiones):
+            verificar()
+        return (time.perf_counter() - inicio) / peticiones * 1e6
+
+def medir_servicio(servicio, peticiones):
+    # JWT_SECRET de los config.env de ejemplo es corto; PyJWT lo avisa en cada token
+    warnings.filterwarnings("ignore", message="The HMAC key is")
+    # Con SECRETO_INTERNO aleatorio para poder medir también las llamadas internas firmadas
+    app = cargar_app(servicio, SECRETO_INTERNO=secrets.token_hex(32), AUTH_REQUIRED="True")
+    with app.app.app_context():
+        token = create_access_token(identity='admin')
+    casos = {
+        "api_key": {'X-API-Key': app.API_KEY},
+        "jwt": {'Authorization': f'Bearer {token}'},
+        "jwt_invalido": {'Authorization': f'Bearer {token[:-4]}AAAA'},
+    }
+    if app.autenticacion.llamadas_internas:
+        casos["interna"] = app.autenticacion.headers_llamada_interna(servicio, 'admin')
+
+    # Primera verificación de cada token: con max_entradas = 0 la cache (aún vacía) no guarda nada
+    max_entradas, app.verificador_jwt.cache.max_entradas = app.verificador_jwt.cache.max_entradas, 0
+    print(f"{servicio:16} {'jwt_sin_cache':22} "
+          f"{medir_caso(app, casos['jwt'], peticiones, app.verificar_autenticacion):8.2f} µs")
+    app.verificador_jwt.cache.max_entradas = max_entradas
+    for caso, headers in casos.items():
+        print(f"{servicio:16} {caso:22} {medir_caso(app, headers, peticiones, app.verificar_autenticacion):8.2f} µs")
+    print(f"{servicio:16} {'verify_jwt_in_request':22} "
+          f"{medir_caso(app, casos['jwt'], peticiones, verify_jwt_in_request):8.2f} µs  (referencia)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("servicios", nargs="*", metavar="servicio", help=f"por defecto: {' '.join(SERVICIOS)}")
+    parser.add_argument("--peticiones", type=int, default=5000, help="llamadas medidas en cada caso")
+    args = parser.parse_args()
+    for servicio in args.servicios:
+        if servicio not in SERVICIOS:
+            parser.error(f"servicio desconocido: {servicio}")
+
+    if len(args.servicios) == 1:
+        medir_servicio(args.servicios[0], args.peticiones)
+        return
+    # Un proceso por servicio: cada uno carga su config.env sin heredar la del anterior
+    for servicio in args.servicios or SERVICIOS:
+        subprocess.run([sys.executable, __file__, servicio, "--peticiones", str(args.peticiones)], check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Prueba de estrés multihilo de UsuarioDB y PedidoDB (user-014).
+
+Varios hilos crean, eliminan, actualizan y leen a la vez sobre la misma tabla
+con el intervalo de cambio de hilo al mínimo, y al final se comprueba que:
+- los IDs creados son únicos y contiguos (el asignador no repite ni salta),
+- el total de registros es exactamente el esperado,
+- ninguna actualización se pierde: cada actualizador escribe su propio campo
+  del mismo registro y al final cada campo tiene el último valor que escribió,
+- ningún lector ve un registro a medias (dos campos que se escriben juntos),
+- el índice por usuario de PedidoDB coincide con un recorrido completo.
+
+Sale con código 1 si alguna comprobación falla.
+Uso: python microservicios/bench/estres_db.py [usuario-service|pedido-service ...] [--por-hilo N]
+"""
+import argparse
+import sys
+import threading
+import time
+
+from servicios import cargar_app
+
+CREADORES = 16
+LECTORES = 4
+USUARIOS_PEDIDOS = 7
+
+# Por tabla: campos que escriben juntos (registro a medias si difieren) y un campo por actualizador
+CAMPOS = {
+    "usuario-service": {"pareja": ("nombre", "email"), "propios": ("nombre", "email", "telefono")},
+    "pedido-service": {"pareja": ("producto", "estado"), "propios": ("producto", "estado", "cantidad")},
+}
+
+class Tabla:
+    """Operaciones de UsuarioDB o PedidoDB con los mismos nombres"""
+
+    def __init__(self, app, servicio):
+        self.usuarios = servicio == "usuario-service"
+        sufijo = "usuario" if self.usuarios else "pedido"
+        self.db = app.UsuarioDB() if self.usuarios else app.PedidoDB()
+        self.crear = getattr(self.db, f"crear_{sufijo}")
+        self.actualizar = getattr(self.db, f"actualizar_{sufijo}")
+        self.eliminar = getattr(self.db, f"eliminar_{sufijo}")
+        self.contar = getattr(self.db, f"contar_{sufijo}s")
+
+    def datos(self, i):
+        if self.usuarios:
+            return {"nombre": "x", "email": "x@example.com", "telefono": "0"}
+        return {"usuario_id": 1 + i % USUARIOS_PEDIDOS, "producto": "p", "cantidad": 1, "precio": 1.0}
+
+    def valor(self, campo, n, k):
+        # cantidad es un entero; el resto de campos son cadenas
+        return n * 1_000_000 + k if campo == "cantidad" else f"{n}-{k}"
+
+def estresar(app, servicio, por_hilo):
+    """Lista de fallos (vacía si todo cuadra) tras una ronda de estrés sobre la tabla de servicio"""
+    tabla = Tabla(app, servicio)
+    pareja, propios = CAMPOS[servicio]["pareja"], CAMPOS[servicio]["propios"]
+    objetivo_pareja = tabla.crear(dict(tabla.datos(0), **{campo: "inicial" for campo in pareja}))["id"]
+    objetivo_propios = tabla.crear(tabla.datos(1))["id"]
+    base = tabla.contar()
+    creados = [[] for _ in range(CREADORES)]
+    ultimos = {}
+    fallos = []
+    parar = threading.Event()
+
+    def creador(n):
+        for i in range(por_hilo):
+            registro = tabla.crear(tabla.datos(i))
+            creados[n].append(registro["id"])
+            if i % 3 == 0:
+                tabla.eliminar(registro["id"])
+
+    def actualizador_pareja(n):
+        for k in range(por_hilo):
+            valor = f"{n}-{k}"
+            tabla.actualizar(objetivo_pareja, {pareja[0]: valor, pareja[1]: valor})
+
+    def actualizador_propio(n, campo):
+        for k in range(por_hilo):
+            tabla.actualizar(objetivo_propios, {campo: tabla.valor(campo, n, k)})
+        ultimos[campo] = tabla.valor(campo, n, por_hilo - 1)
+
+    def lector():
+        while not parar.is_set():
+            try:
+                registro = tabla.db.obtener_por_id(objetivo_pareja)
+                if registro[pareja[0]] != registro[pareja[1]]:
+                    fallos.append(f"registro a medias: {registro[pareja[0]]} / {registro[pareja[1]]}")
+                if not tabla.usuarios:
+                    pagina, _ = tabla.db.listar(100, None, {"usuario_id": 3})
+                    if any(pedido["usuario_id"] != 3 for pedido in pagina):
+                        fallos.append("el filtro por usuario_id devolvió pedidos de otro usuario")
+                tabla.db.obtener_todos()
+            except Exception as e:
+                fallos.append(f"{type(e).__name__} al leer: {e}")
+
+    escritores = [threading.Thread(target=creador, args=(n,)) for n in range(CREADORES)]
+    escritores += [threading.Thread(target=actualizador_pareja, args=(n,)) for n in range(2)]
+    escritores += [threading.Thread(target=actualizador_propio, args=(n, campo)) for n, campo in enumerate(propios)]
+    lectores = [threading.Thread(target=lector) for _ in range(LECTORES)]
+    for hilo in lectores + escritores:
+        hilo.start()
+    for hilo in escritores:
+        hilo.join()
+    parar.set()
+    for hilo in lectores:
+        hilo.join()
+
+    ids = sorted(i for lista in creados for i in lista)
+    if len(ids) != len(set(ids)):
+        fallos.append(f"{len(ids) - len(set(ids))} IDs duplicados")
+    elif ids != list(range(ids[0], ids[0] + len(ids))):
+        fallos.append("los IDs creados no son contiguos")
+    esperados = base + sum(len(lista) - len(lista[::3]) for lista in creados)
+    if tabla.contar() != esperados:
+        fallos.append(f"total {tabla.contar()}, esperado {esperados}")
+    registro = tabla.db.obtener_por_id(objetivo_propios)
+    for campo, valor in ultimos.items():
+        if registro[campo] != valor:
+            fallos.append(f"actualización perdida en '{campo}': {registro[campo]!r}, esperado {valor!r}")
+    if not tabla.usuarios:
+        todos = tabla.db.obtener_todos()
+        for usuario_id in range(1, USUARIOS_PEDIDOS + 1):
+            por_indice = [pedido["id"] for pedido in tabla.db.obtener_por_usuario(usuario_id)]
+            por_recorrido = [pedido["id"] for pedido in todos if pedido["usuario_id"] == usuario_id]
+            if por_indice != por_recorrido:
+                fallos.append(f"el índice del usuario {usuario_id} no coincide con un recorrido completo")
+    return len(ids), fallos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("servicios", nargs="*", metavar="servicio", help=f"por defecto: {' '.join(CAMPOS)}")
+    parser.add_argument("--por-hilo", type=int, default=2000, help="operaciones de cada hilo escritor")
+    args = parser.parse_args()
+    for servicio in args.servicios:
+        if servicio not in CAMPOS:
+            parser.error(f"servicio desconocido: {servicio}")
+
+    sys.setswitchinterval(1e-6)  # cambiar de hilo lo más a menudo posible para provocar carreras
+    correcto = True
+    for servicio in args.servicios or list(CAMPOS):
+        inicio = time.perf_counter()
+        creados, fallos = estresar(cargar_app(servicio), servicio, args.por_hilo)
+        print(f"{servicio}: {creados} creados por {CREADORES} hilos en {time.perf_counter() - inicio:.1f} s, "
+              f"{len(fallos)} fallos")
+        for fallo in sorted(set(fallos))[:10]:
+            print(f"  ❌ {fallo}")
+        correcto = correcto and not fallos
+    print("✅ Sin IDs duplicados ni actualizaciones perdidas" if correcto else "❌ Prueba de estrés fallida")
+    return 0 if correcto else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
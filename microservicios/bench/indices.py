@@ -0,0 +1,82 @@
+"""Coste por operación de PedidoDB según el tamaño de la tabla (índices hash de user-004).
+
+Compara el backend en memoria (diccionario id -> pedido e índice por usuario_id)
+con la lista que se recorría antes, reproducida en PedidoDBLista. Con la lista
+cada operación crece con las filas; con los índices se mantiene constante
+(obtener_por_usuario crece solo con los pedidos que devuelve: filas / 1000).
+
+Uso: python microservicios/bench/indices.py [filas ...]
+"""
+import sys
+
+from servicios import cargar_app, medir
+
+FILAS = (100, 10_000, 100_000, 1_000_000)
+USUARIOS = 1000
+
+class PedidoDBLista:
+    """PedidoDB anterior a los índices: lista de diccionarios recorrida en cada operación"""
+
+    def __init__(self):
+        self.pedidos = []
+        self.next_id = 1
+
+    def obtener_por_id(self, pedido_id):
+        for pedido in self.pedidos:
+            if pedido["id"] == pedido_id:
+                return pedido
+        return None
+
+    def obtener_por_usuario(self, usuario_id):
+        return [pedido for pedido in self.pedidos if pedido["usuario_id"] == usuario_id]
+
+    def crear_pedido(self, datos_pedido):
+        nuevo_pedido = dict(datos_pedido, id=self.next_id)
+        self.pedidos.append(nuevo_pedido)
+        self.next_id += 1
+        return nuevo_pedido
+
+    def actualizar_pedido(self, pedido_id, datos_actualizados):
+        for pedido in self.pedidos:
+            if pedido["id"] == pedido_id:
+                pedido.update(datos_actualizados)
+                return pedido
+        return None
+
+    def eliminar_pedido(self, pedido_id):
+        for i, pedido in enumerate(self.pedidos):
+            if pedido["id"] == pedido_id:
+                return self.pedidos.pop(i)
+        return None
+
+    def contar_pedidos(self):
+        return len(self.pedidos)
+
+def llenar(db, filas):
+    for i in range(filas - db.contar_pedidos()):
+        db.crear_pedido({"usuario_id": i % USUARIOS + 1, "producto": "Producto", "cantidad": 1,
+                         "precio": 10.0, "estado": "pendiente"})
+    return db
+
+def medir_tabla(db, filas):
+    """Microsegundos por get, update, delete y obtener_por_usuario sobre una tabla de filas pedidos"""
+    repeticiones = 200 if filas <= 100_000 else 20
+    centro = filas // 2
+    return [segundos * 1e6 for segundos in (
+        medir(lambda i: db.obtener_por_id(centro + i), repeticiones),
+        medir(lambda i: db.actualizar_pedido(centro + i, {"estado": "enviado"}), repeticiones),
+        medir(lambda i: db.eliminar_pedido(centro + i), repeticiones),
+        medir(lambda i: db.obtener_por_usuario(i % USUARIOS + 1), repeticiones),
+    )]
+
+def main():
+    filas_medidas = [int(filas) for filas in sys.argv[1:]] or FILAS
+    app = cargar_app('pedido-service')
+    print(f"{'filas':>10} {'backend':8} {'get':>10} {'update':>10} {'delete':>10} {'por_usuario':>12}  (µs/op)")
+    for filas in filas_medidas:
+        for nombre, db in (("lista", PedidoDBLista()), ("indice", app.PedidoDB())):
+            get, update, delete, por_usuario = medir_tabla(llenar(db, filas), filas)
+            print(f"{filas:>10} {nombre:8} {get:10.2f} {update:10.2f} {delete:10.2f} {por_usuario:12.2f}")
+
+if __name__ == "__main__":
+    main()
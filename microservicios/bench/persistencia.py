@@ -0,0 +1,82 @@
+"""Rendimiento de la persistencia de UsuarioDB (WAL con snapshots, user-015).
+
+Mide las escrituras por segundo con un fsync por escritura (WAL_FSYNC=escritura)
+y con group commit (WAL_FSYNC=grupo, un fsync por lote), con 1 y 16 hilos,
+frente a la tabla sin persistencia. Después mide el arranque de una tabla
+grande solo desde el snapshot y con una cola del WAL por reaplicar.
+
+Los ficheros se escriben en un directorio temporal (--directorio para medir
+otro disco) que se borra al terminar.
+Uso: python microservicios/bench/persistencia.py [--escrituras N] [--filas N] [--cola N]
+"""
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+
+from servicios import cargar_app
+
+HILOS = (1, 16)
+
+def escribir(db, escrituras, hilos):
+    """Escrituras por segundo creando usuarios desde hilos hilos"""
+    def escritor():
+        for _ in range(escrituras // hilos):
+            db.crear_usuario({"nombre": "Usuario", "email": "usuario@example.com", "telefono": "123"})
+    trabajadores = [threading.Thread(target=escritor) for _ in range(hilos)]
+    inicio = time.perf_counter()
+    for hilo in trabajadores:
+        hilo.start()
+    for hilo in trabajadores:
+        hilo.join()
+    return escrituras // hilos * hilos / (time.perf_counter() - inicio)
+
+def abrir(app, directorio):
+    """Milisegundos en cargar la tabla guardada en directorio"""
+    inicio = time.perf_counter()
+    db = app.UsuarioDB(app.Persistencia(directorio, 'usuarios', True, 0, app.logs))
+    return db, (time.perf_counter() - inicio) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escrituras", type=int, default=4000, help="usuarios creados en cada medición")
+    parser.add_argument("--filas", type=int, default=200_000, help="usuarios de la tabla para medir el arranque")
+    parser.add_argument("--cola", type=int, default=20_000, help="operaciones del WAL por reaplicar al arrancar")
+    parser.add_argument("--directorio", help="dónde crear los ficheros (por defecto, el temporal del sistema)")
+    args = parser.parse_args()
+
+    app = cargar_app('usuario-service')
+    raiz = tempfile.mkdtemp(prefix="bench-persistencia-", dir=args.directorio)
+    try:
+        for modo, agrupado in (("fsync por escritura", False), ("group commit", True)):
+            for hilos in HILOS:
+                db = app.UsuarioDB(app.Persistencia(f"{raiz}/{agrupado}-{hilos}", 'usuarios', agrupado, 0, app.logs))
+                por_segundo = escribir(db, args.escrituras, hilos)
+                print(f"{modo:20} {hilos:2} hilos: {por_segundo:9.0f} escrituras/s, "
+                      f"{db._persistencia.wal.fsyncs} fsyncs")
+                db._persistencia.cerrar()
+        print(f"{'sin persistencia':20} {1:2} hilos: {escribir(app.UsuarioDB(), args.escrituras, 1):9.0f} escrituras/s")
+
+        # Tabla grande: se crea en lotes y el primer arranque reaplica el WAL y lo compacta en un snapshot
+        directorio = f"{raiz}/arranque"
+        db, _ = abrir(app, directorio)
+        for inicio in range(0, args.filas, 10_000):
+            db.crear_usuarios([{"nombre": f"Usuario {i}", "email": f"usuario{i}@example.com", "telefono": "123"}
+                               for i in range(inicio, min(inicio + 10_000, args.filas))])
+        db._persistencia.cerrar()
+        db, _ = abrir(app, directorio)
+        db._persistencia.cerrar()
+        db, ms = abrir(app, directorio)
+        print(f"arranque con {args.filas} usuarios, solo snapshot: {ms:7.0f} ms")
+        for i in range(args.cola):
+            db.actualizar_usuario(1 + i % args.filas, {"telefono": str(i)})
+        db._persistencia.cerrar()
+        db, ms = abrir(app, directorio)
+        db._persistencia.cerrar()
+        print(f"arranque con {args.filas} usuarios y {args.cola} operaciones en el WAL: {ms:7.0f} ms")
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
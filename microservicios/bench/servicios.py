@@ -0,0 +1,47 @@
+"""Carga el app.py de un microservicio dentro del proceso para medirlo sin levantar servidores.
+
+Los scripts de este directorio se ejecutan desde la raíz del repositorio, por ejemplo:
+    python microservicios/bench/indices.py
+"""
+import importlib.util
+import os
+import sys
+import time
+
+MICROSERVICIOS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Solo el código que se mide: sin persistencia, trazas ni logs por debajo de ERROR
+ENTORNO_MEDICION = {
+    "DB_BACKEND": "memoria",
+    "PERSISTENCIA": "False",
+    "LOG_LEVEL": "ERROR",
+    "TRAZAS_MUESTREO": "0",
+    "TRAZAS_ARCHIVO": "",
+    "SERVER_MODE": "development",
+}
+
+def cargar_app(servicio, **entorno):
+    """Módulo app.py de servicio ('usuario-service', 'pedido-service' o 'gateway-service').
+
+    Se carga con su config.env; ENTORNO_MEDICION y entorno tienen prioridad
+    porque load_dotenv no sobrescribe las variables ya definidas.
+    """
+    directorio = os.path.join(MICROSERVICIOS, servicio)
+    os.environ.update(ENTORNO_MEDICION)
+    os.environ.update(entorno)
+    os.chdir(directorio)  # config.env y data/ son relativos al servicio
+    for ruta in (MICROSERVICIOS, directorio):
+        if ruta not in sys.path:
+            sys.path.insert(0, ruta)
+    spec = importlib.util.spec_from_file_location(f"app_{servicio.replace('-', '_')}",
+                                                  os.path.join(directorio, 'app.py'))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+def medir(funcion, repeticiones):
+    """Segundos por llamada de funcion() (se le pasa el número de repetición)"""
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        funcion(i)
+    return (time.perf_counter() - inicio) / repeticiones
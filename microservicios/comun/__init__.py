@@ -0,0 +1,7 @@
+"""Código común de los microservicios: reloj, logs, métricas, trazas, resiliencia,
+persistencia, autenticación, lectura de peticiones, monitor de salud y arranque con gunicorn.
+
+Cada app.py añade microservicios/ a sys.path e importa de aquí; los objetos de
+cada proceso (logs, metricas, trazas...) los crea el servicio con su
+configuración y se pasan a las clases y funciones que los usan.
+"""
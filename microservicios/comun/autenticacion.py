@@ -0,0 +1,166 @@
+"""Autenticación compartida por los microservicios: API key, llamadas internas firmadas y JWT.
+
+La API key se compara en tiempo constante. Los JWT ya verificados se guardan en
+una cache acotada (clave: SHA-256 del token) hasta su `exp`, así que la firma de
+cada token se comprueba una sola vez y no en cada petición.
+
+Llamadas internas: quien llama firma con SECRETO_INTERNO (HMAC-SHA256) la
+identidad original, el servicio destino y una caducidad de TOKEN_INTERNO_TTL
+segundos. El destino la comprueba con un solo HMAC, sin decodificar el JWT.
+"""
+from collections import OrderedDict
+import base64
+import hashlib
+import hmac
+import threading
+import time
+
+from flask_jwt_extended import decode_token
+
+HEADER_AUTH_INTERNA = 'X-Auth-Interna'
+IDENTIDAD_API_KEY = 'api-key'
+
+class CacheTokensJWT:
+    """Cache LRU de tokens JWT verificados: SHA-256 del token -> (expira_en, identidad)"""
+    
+    def __init__(self, max_entradas):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def obtener(self, clave):
+        """Identidad del token o None si no está o ya expiró"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            if entrada[0] <= time.time():
+                del self._entradas[clave]
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            return entrada[1]
+    
+    def guardar(self, clave, expira_en, identidad):
+        """Guardar un token verificado desalojando el menos usado si se supera el límite"""
+        if self.max_entradas <= 0:
+            return
+        with self._lock:
+            self._entradas[clave] = (expira_en, identidad)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.evictions += 1
+    
+    def estadisticas(self):
+        """Contadores de uso de la cache"""
+        with self._lock:
+            return {"entradas": len(self._entradas), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}
+
+class VerificadorJWT:
+    """Tokens JWT de acceso verificados con la configuración de flask_jwt_extended de app"""
+    
+    def __init__(self, app, max_entradas, logs):
+        self.app = app
+        self.cache = CacheTokensJWT(max_entradas)
+        self.logs = logs
+    
+    def identidad(self, token):
+        """Identidad de un token JWT de acceso válido; lanza una excepción si no lo es.
+    
+        Los tokens sin `exp` se verifican siempre (no hay hasta cuándo guardarlos).
+        """
+        clave = hashlib.sha256(token.encode('utf-8')).digest()
+        identidad = self.cache.obtener(clave)
+        if identidad is not None:
+            return identidad
+    
+        with self.app.app_context():
+            datos = decode_token(token)
+        if datos.get('type') != 'access':
+            raise ValueError('Se requiere un token de acceso')
+        identidad = datos.get(self.app.config['JWT_IDENTITY_CLAIM'])
+        if not identidad:
+            raise ValueError('El token no tiene identidad')
+        if 'exp' in datos:
+            self.cache.guardar(clave, datos['exp'], identidad)
+        self.logs.info("Token JWT verificado", usuario=identidad)
+        return identidad
+
+class Autenticacion:
+    """Credenciales de las peticiones que recibe un servicio y de las llamadas que hace a otros.
+    
+    Con llamadas_internas=False (el gateway) el header X-Auth-Interna se
+    ignora: solo se aceptan la API key y los JWT. Sin secreto_interno las
+    llamadas entre servicios envían la API key compartida.
+    """
+    
+    def __init__(self, servicio, api_key, secreto_interno, ttl_interno, verificador_jwt, logs, llamadas_internas=True):
+        self.servicio = servicio
+        self.api_key = api_key
+        self.ttl_interno = ttl_interno
+        self.verificador_jwt = verificador_jwt
+        self.logs = logs
+        self.llamadas_internas = llamadas_internas
+        self._api_key = api_key.encode('utf-8') if api_key else None
+        self._secreto = secreto_interno.encode('utf-8') if secreto_interno else None
+    
+    def api_key_valida(self, api_key):
+        """Comparar la API key recibida con la configurada en tiempo constante"""
+        if api_key is None or self._api_key is None:
+            return False
+        return hmac.compare_digest(api_key.encode('utf-8'), self._api_key)
+    
+    def _firma(self, destino, carga):
+        return hmac.digest(self._secreto, f"{destino}.{carga}".encode('utf-8'), 'sha256').hex()
+    
+    def firmar_llamada_interna(self, identidad, destino):
+        """Valor del header X-Auth-Interna: <expira>.<identidad en base64url>.<firma>"""
+        identidad_b64 = base64.urlsafe_b64encode(identidad.encode('utf-8')).decode('ascii')
+        carga = f"{int(time.time()) + self.ttl_interno}.{identidad_b64}"
+        return f"{carga}.{self._firma(destino, carga)}"
+    
+    def identidad_llamada_interna(self, valor):
+        """Identidad de un header X-Auth-Interna dirigido a este servicio; lanza ValueError si no es válido"""
+        carga, _, firma = valor.rpartition('.')
+        expira, _, identidad_b64 = carga.partition('.')
+        if not hmac.compare_digest(firma.encode('utf-8'), self._firma(self.servicio, carga).encode('ascii')):
+            raise ValueError('Firma de llamada interna no válida')
+        if int(expira) < time.time():
+            raise ValueError('Llamada interna caducada')
+        return base64.urlsafe_b64decode(identidad_b64).decode('utf-8')
+    
+    def headers_llamada_interna(self, destino, identidad=None):
+        """Headers para llamar a destino en nombre de identidad (por defecto, este servicio)"""
+        if self._secreto is None:
+            return {'X-API-Key': self.api_key} if self.api_key else {}
+        return {HEADER_AUTH_INTERNA: self.firmar_llamada_interna(identidad or self.servicio, destino)}
+    
+    def identidad_peticion(self, headers, ruta):
+        """Identidad de una petición (llamada interna, API key o JWT) o None si no está autenticada"""
+        # Llamada interna firmada por el gateway u otro microservicio
+        llamada_interna = headers.get(HEADER_AUTH_INTERNA)
+        if self.llamadas_internas and llamada_interna is not None and self._secreto is not None:
+            try:
+                return self.identidad_llamada_interna(llamada_interna)
+            except ValueError as e:
+                self.logs.warning("Autenticación fallida", motivo=str(e), ruta=ruta)
+                return None
+        
+        if self.api_key_valida(headers.get('X-API-Key')):
+            return IDENTIDAD_API_KEY
+        
+        try:
+            autorizacion = headers.get('Authorization', '')
+            if not autorizacion.startswith('Bearer '):
+                raise ValueError('Falta el header Authorization con un token Bearer')
+            return self.verificador_jwt.identidad(autorizacion[len('Bearer '):])
+        except Exception as e:
+            self.logs.warning("Autenticación fallida", motivo=str(e), ruta=ruta)
+        return None
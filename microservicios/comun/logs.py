@@ -0,0 +1,97 @@
+"""Logs estructurados: una línea JSON por evento con la fecha, el nivel, el servicio,
+el mensaje y los campos del evento.
+
+Los hilos de las peticiones solo encolan el evento; el hilo 'logs' lo convierte en
+JSON y escribe en stdout por lotes, así que ninguna petición espera a una
+escritura. Las líneas de depuración que se generan en cada petición se muestrean
+con LOG_MUESTREO_DEBUG.
+"""
+import json
+import queue
+import random
+import threading
+import traceback
+
+from comun.reloj import ahora_ms, formatear_fecha
+
+NIVELES_LOG = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+class Logs:
+    """Logs de un servicio: logs.info("Pedido creado", pedido_id=3)
+    
+    La cola (queue.SimpleQueue) está acotada a max_cola eventos: si el hilo
+    escritor no da abasto, los eventos nuevos se descartan y se cuentan en
+    lugar de bloquear la petición.
+    """
+    
+    def __init__(self, servicio, nivel, muestreo_debug, max_cola, salida):
+        self.servicio = servicio
+        self.nivel = NIVELES_LOG.get(nivel, NIVELES_LOG["INFO"])
+        self.muestreo_debug = muestreo_debug
+        self.max_cola = max_cola
+        self.descartados = 0
+        self._salida = salida
+        self._cola = queue.SimpleQueue()
+        self._hilo = threading.Thread(target=self._bucle, name='logs', daemon=True)
+        self._hilo.start()
+    
+    def debug(self, mensaje, **campos):
+        if self.nivel <= 10:
+            self._encolar("DEBUG", mensaje, campos)
+    
+    def info(self, mensaje, **campos):
+        if self.nivel <= 20:
+            self._encolar("INFO", mensaje, campos)
+    
+    def warning(self, mensaje, **campos):
+        if self.nivel <= 30:
+            self._encolar("WARNING", mensaje, campos)
+    
+    def error(self, mensaje, **campos):
+        self._encolar("ERROR", mensaje, campos)
+    
+    def exception(self, mensaje, **campos):
+        """Error con la traza de la excepción que se está tratando"""
+        campos["excepcion"] = traceback.format_exc()
+        self._encolar("ERROR", mensaje, campos)
+    
+    def debug_muestreado(self, mensaje, **campos):
+        """Depuración del camino caliente: solo se escribe una fracción muestreo_debug de las llamadas"""
+        if self.nivel <= 10 and random.random() < self.muestreo_debug:
+            campos["muestreo"] = self.muestreo_debug
+            self._encolar("DEBUG", mensaje, campos)
+    
+    def detener(self):
+        """Escribir lo que quede en la cola (antes de reemplazar el proceso o al salir)"""
+        if self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join()
+    
+    def _encolar(self, nivel, mensaje, campos):
+        if self._cola.qsize() >= self.max_cola:
+            self.descartados += 1
+            return
+        self._cola.put((ahora_ms(), nivel, mensaje, campos))
+    
+    def _linea(self, evento):
+        ms, nivel, mensaje, campos = evento
+        linea = {"ts": formatear_fecha(ms), "nivel": nivel, "servicio": self.servicio, "mensaje": mensaje}
+        linea.update(campos)
+        return json.dumps(linea, ensure_ascii=False, default=str) + "\n"
+    
+    def _bucle(self):
+        while True:
+            lote = [self._cola.get()]
+            while len(lote) < 1000:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            fin = None in lote
+            try:
+                self._salida.write("".join(self._linea(evento) for evento in lote if evento is not None))
+                self._salida.flush()
+            except (OSError, ValueError):
+                pass  # sin stdout no hay dónde avisar; se pierden estas líneas
+            if fin:
+                return
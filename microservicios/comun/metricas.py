@@ -0,0 +1,250 @@
+"""Métricas en el formato de texto de Prometheus (GET /metrics).
+
+Medir no toma ningún lock: cada hilo suma en su propio fragmento (un dict) y
+/metrics junta los fragmentos al leerlos. Con varios workers de gunicorn cada
+proceso vuelca sus valores en METRICAS_DIR cada METRICAS_INTERVALO segundos y
+/metrics agrega los de todos los procesos.
+"""
+from bisect import bisect_left
+import atexit
+import json
+import os
+import threading
+import time
+
+from flask import g, request
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE_METRICAS = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Tipo y descripción de las métricas que miden los módulos de comun; cada servicio añade las suyas
+DEFINICION_METRICAS = {
+    "http_requests_total": ("counter", "Peticiones atendidas por método, ruta y código de estado"),
+    "http_request_duration_seconds": ("histogram", "Latencia de las peticiones por método, ruta y código de estado"),
+    "http_requests_in_flight": ("gauge", "Peticiones en curso"),
+    "upstream_request_duration_seconds": ("histogram", "Latencia de las llamadas a otros microservicios por destino y código"),
+    "upstream_errors_total": ("counter", "Llamadas a otros microservicios sin respuesta o con error 5xx"),
+    "upstream_rejected_total": ("counter", "Llamadas a otros microservicios no enviadas por circuito abierto o plazo agotado"),
+    "circuit_breaker_state": ("gauge", "Procesos con el circuito hacia cada microservicio en cada estado"),
+    "circuit_breaker_opened_total": ("counter", "Veces que se abrió el circuito hacia cada microservicio"),
+    "upstream_retries_total": ("counter", "Reintentos de llamadas a otros microservicios"),
+    "upstream_retry_budget_exhausted_total": ("counter", "Reintentos descartados por falta de presupuesto"),
+    "http_pool_connections": ("gauge", "Conexiones del pool hacia otros microservicios por estado"),
+    "http_pool_connections_created_total": ("counter", "Conexiones abiertas por el pool hacia otros microservicios"),
+    "log_events_dropped_total": ("counter", "Eventos de log descartados con la cola llena")
+}
+
+class Metricas:
+    """Contadores, gauges e histogramas de latencia de este proceso.
+    
+    Las etiquetas son una tupla de pares (nombre, valor). El estado que no se
+    mide en cada petición (tamaño de las caches, conexiones del pool...) lo
+    devuelven los colectores registrados al leer los valores. definiciones es el
+    {nombre: (tipo, descripción)} de las métricas del servicio.
+    """
+    
+    def __init__(self, definiciones):
+        self.definiciones = definiciones
+        self._local = threading.local()
+        self._fragmentos = []
+        self._lock = threading.Lock()  # solo para registrar el fragmento de un hilo nuevo
+        self._colectores = {}
+    
+    def _fragmento(self):
+        try:
+            return self._local.fragmento
+        except AttributeError:
+            fragmento = self._local.fragmento = {}
+            with self._lock:
+                self._fragmentos.append(fragmento)
+            return fragmento
+    
+    def sumar(self, nombre, etiquetas=(), valor=1):
+        """Sumar a un contador (o a un gauge; con valor negativo, restar)"""
+        fragmento = self._fragmento()
+        clave = (nombre, etiquetas)
+        fragmento[clave] = fragmento.get(clave, 0) + valor
+    
+    def observar(self, nombre, etiquetas, segundos):
+        """Apuntar una duración en un histograma de latencia"""
+        fragmento = self._fragmento()
+        clave = (nombre, etiquetas)
+        cubos = fragmento.get(clave)
+        if cubos is None:
+            cubos = fragmento[clave] = [0] * (len(BUCKETS_LATENCIA) + 2)  # cubos, +Inf y suma
+        cubos[bisect_left(BUCKETS_LATENCIA, segundos)] += 1
+        cubos[-1] += segundos
+    
+    def registrar_llamada(self, destino, inicio, codigo=None, error=None):
+        """Latencia y errores de una llamada a otro microservicio iniciada en inicio (perf_counter).
+        
+        codigo es el código HTTP de la respuesta; error, la excepción si no la hubo.
+        """
+        if error is not None:
+            estado = 'error'
+            self.sumar("upstream_errors_total", (("target", destino), ("error", type(error).__name__)))
+        else:
+            estado = str(codigo)
+            if codigo >= 500:
+                self.sumar("upstream_errors_total", (("target", destino), ("error", f"http_{estado}")))
+        self.observar("upstream_request_duration_seconds", (("target", destino), ("status", estado)),
+                      time.perf_counter() - inicio)
+    
+    def registrar_colector(self, nombre, colector):
+        """colector() devuelve una lista de (nombre, etiquetas, valor) con el estado actual"""
+        self._colectores[nombre] = colector
+    
+    def valores(self):
+        """{(nombre, etiquetas): valor} de este proceso (los histogramas, como lista de cubos)"""
+        valores = {}
+        for fragmento in list(self._fragmentos):
+            for clave, valor in list(fragmento.items()):
+                acumular_metrica(valores, clave, valor)
+        for colector in list(self._colectores.values()):
+            for nombre, etiquetas, valor in colector():
+                valores[(nombre, etiquetas)] = valor
+        return valores
+
+def acumular_metrica(valores, clave, valor):
+    """Sumar valor (número o cubos de un histograma) a valores[clave]"""
+    if isinstance(valor, list):
+        cubos = valores.get(clave)
+        if cubos is None:
+            valores[clave] = list(valor)
+        else:
+            for i, cantidad in enumerate(valor):
+                cubos[i] += cantidad
+    else:
+        valores[clave] = valores.get(clave, 0) + valor
+
+def proceso_vivo(pid):
+    """El proceso pid sigue en marcha"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class MetricasProcesos:
+    """Métricas de todos los workers de gunicorn a través de un directorio compartido.
+    
+    Cada proceso escribe sus valores en <pid>.json cada intervalo segundos (y al
+    salir). Los contadores e histogramas de un worker que ya terminó se siguen
+    sumando, para que los totales no bajen al reciclarlo; sus gauges no.
+    """
+    
+    def __init__(self, metricas, directorio, intervalo, logs):
+        self.metricas = metricas
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self.logs = logs
+        self._pid = os.getpid()
+    
+    def iniciar(self):
+        threading.Thread(target=self._bucle, name='metricas', daemon=True).start()
+        atexit.register(self.volcar)
+    
+    def _bucle(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.volcar()
+            except Exception:
+                self.logs.exception("Error volcando las métricas", directorio=self.directorio)
+    
+    def volcar(self):
+        """Escribir los valores de este proceso (renombrado atómico: nadie lee un fichero a medias)"""
+        ruta = os.path.join(self.directorio, f"{self._pid}.json")
+        with open(f"{ruta}.tmp", 'w', encoding='utf-8') as archivo:
+            json.dump([[nombre, etiquetas, valor] for (nombre, etiquetas), valor in self.metricas.valores().items()],
+                      archivo, separators=(',', ':'))
+        os.replace(f"{ruta}.tmp", ruta)
+    
+    def agregar(self, valores):
+        """Sumar a valores (los de este proceso) lo último que volcaron los demás workers"""
+        definiciones = self.metricas.definiciones
+        for nombre_archivo in os.listdir(self.directorio):
+            pid, extension = os.path.splitext(nombre_archivo)
+            if extension != '.json' or pid == str(self._pid):
+                continue
+            try:
+                with open(os.path.join(self.directorio, nombre_archivo), encoding='utf-8') as archivo:
+                    volcado = json.load(archivo)
+            except (OSError, ValueError):
+                continue
+            vivo = proceso_vivo(int(pid))
+            for nombre, etiquetas, valor in volcado:
+                if nombre not in definiciones or (not vivo and definiciones[nombre][0] == 'gauge'):
+                    continue
+                acumular_metrica(valores, (nombre, tuple(map(tuple, etiquetas))), valor)
+        return valores
+
+def series_cache(prefijo, estadisticas):
+    """Series de una cache LRU a partir de su estadisticas()"""
+    return [
+        (f"{prefijo}_entries", (), estadisticas["entradas"]),
+        (f"{prefijo}_hits_total", (), estadisticas["hits"]),
+        (f"{prefijo}_misses_total", (), estadisticas["misses"]),
+        (f"{prefijo}_evictions_total", (), estadisticas["evictions"])
+    ]
+
+def _escapar_etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _etiquetas_prometheus(etiquetas):
+    if not etiquetas:
+        return ''
+    return '{' + ','.join(f'{nombre}="{_escapar_etiqueta(valor)}"' for nombre, valor in etiquetas) + '}'
+
+def exponer_metricas(valores, definiciones):
+    """Texto de Prometheus con las métricas agrupadas por nombre (definiciones: tipo y descripción de cada una)"""
+    por_nombre = {}
+    for (nombre, etiquetas), valor in valores.items():
+        por_nombre.setdefault(nombre, []).append((etiquetas, valor))
+    lineas = []
+    for nombre in sorted(por_nombre):
+        tipo, descripcion = definiciones[nombre]
+        lineas.append(f"# HELP {nombre} {descripcion}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for etiquetas, valor in sorted(por_nombre[nombre], key=lambda serie: serie[0]):
+            if tipo != 'histogram':
+                lineas.append(f"{nombre}{_etiquetas_prometheus(etiquetas)} {valor}")
+                continue
+            acumulado = 0
+            for limite, cantidad in zip(BUCKETS_LATENCIA + ('+Inf',), valor):
+                acumulado += cantidad
+                lineas.append(f"{nombre}_bucket{_etiquetas_prometheus(etiquetas + (('le', str(limite)),))} {acumulado}")
+            lineas.append(f"{nombre}_sum{_etiquetas_prometheus(etiquetas)} {valor[-1]}")
+            lineas.append(f"{nombre}_count{_etiquetas_prometheus(etiquetas)} {acumulado}")
+    return "\n".join(lineas) + "\n"
+
+def valores_metricas(metricas, metricas_procesos):
+    """Valores de este proceso más los de los demás workers (metricas_procesos None: solo este proceso)"""
+    valores = metricas.valores()
+    if metricas_procesos is not None:
+        metricas_procesos.agregar(valores)
+    return valores
+
+def medir_peticiones(app, metricas):
+    """Registrar en la app de Flask los hooks que cuentan cada petición y su latencia"""
+    
+    @app.before_request
+    def iniciar_medicion():
+        g.inicio_medicion = time.perf_counter()
+        metricas.sumar("http_requests_in_flight")
+    
+    @app.after_request
+    def medir_peticion(response):
+        """Contar la petición y su latencia por método, ruta (la regla, no la URL) y código"""
+        peticion = request._get_current_object()  # un solo acceso al proxy de Flask
+        regla = peticion.url_rule.rule if peticion.url_rule is not None else 'desconocida'
+        etiquetas = (("method", peticion.method), ("route", regla), ("status", str(response.status_code)))
+        metricas.sumar("http_requests_total", etiquetas)
+        metricas.observar("http_request_duration_seconds", etiquetas, time.perf_counter() - g.inicio_medicion)
+        return response
+    
+    @app.teardown_request
+    def terminar_medicion(error=None):
+        metricas.sumar("http_requests_in_flight", valor=-1)
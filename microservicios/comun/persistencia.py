@@ -0,0 +1,370 @@
+"""Persistencia de las tablas en memoria y conexión a SQLite.
+
+Para el backend en memoria: cada escritura se apunta en un registro append-only
+(WAL, una línea JSON por operación) antes de responder, y cada SNAPSHOT_CADA
+escrituras se guarda una foto compacta de la tabla. Al arrancar se carga la
+foto y se reaplican las operaciones posteriores del WAL.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+def sincronizar_directorio(directorio):
+    """fsync del directorio para que los renombrados sobrevivan a una caída (POSIX)"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    descriptor = os.open(directorio, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+def a_diccionario(registro):
+    """Registro compacto como diccionario (para json.dump)"""
+    return registro.a_diccionario()
+
+class RegistroEscrituras:
+    """Registro append-only de escrituras (WAL) en JSONL.
+    
+    Con fsync agrupado (group commit) las líneas se encolan y un hilo las
+    escribe con un solo fsync por lote, así que las peticiones concurrentes
+    comparten el coste del fsync. Sin agrupar, cada línea se escribe y se
+    sincroniza antes de continuar. Si una escritura o un fsync falla, el
+    fichero se recorta hasta lo último confirmado y el WAL deja de aceptar
+    líneas (las que no se confirmaron no se reaplicarán al arrancar).
+    """
+    
+    def __init__(self, ruta, fsync_agrupado, logs):
+        self.ruta = ruta
+        self.fsync_agrupado = fsync_agrupado
+        self.logs = logs
+        # Sin buffer: lo que no se ha escrito con write() no puede llegar a disco después
+        self._archivo = open(ruta, 'ab', buffering=0)
+        self._tamano_durable = self._archivo.seek(0, os.SEEK_END)
+        self._cond = threading.Condition()
+        self._pendientes = []  # líneas en bytes o ('rotar', ruta_anterior, lsn)
+        self._lsn_encolado = 0
+        self._lsn_durable = 0
+        self._error = None
+        self._rotado = threading.Event()
+        self._cerrado = False
+        self.fsyncs = 0
+        self._hilo = None
+        if fsync_agrupado:
+            self._hilo = threading.Thread(target=self._bucle, name='wal', daemon=True)
+            self._hilo.start()
+    
+    @property
+    def lsn_durable(self):
+        """Última línea que ya está en disco"""
+        return self._lsn_durable
+    
+    def encolar(self, lsn, linea):
+        """Añadir una línea (con el lock de escritura de la tabla tomado, para conservar el orden).
+        
+        Tras un error de escritura el WAL deja de aceptar líneas, así que
+        cualquier escritura posterior falla también.
+        """
+        if not self.fsync_agrupado:
+            if self._error is not None:
+                raise self._error
+            try:
+                self._escribir(linea)
+                self._sincronizar()
+            except OSError as e:
+                self._fallar(e)
+                raise
+            self._lsn_durable = lsn
+            return
+        with self._cond:
+            if self._error is not None:
+                raise self._error
+            self._pendientes.append(linea)
+            self._lsn_encolado = lsn
+            self._cond.notify_all()
+    
+    def esperar(self, lsn):
+        """Bloquear hasta que la línea lsn esté en disco"""
+        with self._cond:
+            while self._lsn_durable < lsn and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+    
+    def rotar(self, ruta_anterior):
+        """Mover lo escrito hasta ahora a ruta_anterior y seguir en un fichero vacío"""
+        self._rotado.clear()
+        if not self.fsync_agrupado:
+            self._rotar(ruta_anterior)
+            return
+        with self._cond:
+            self._pendientes.append(('rotar', ruta_anterior, self._lsn_encolado))
+            self._cond.notify_all()
+    
+    def esperar_rotacion(self):
+        self._rotado.wait()
+    
+    def cerrar(self):
+        """Terminar de escribir lo encolado y cerrar el fichero"""
+        with self._cond:
+            self._cerrado = True
+            self._cond.notify_all()
+        if self._hilo is not None:
+            self._hilo.join()
+        self._archivo.close()
+    
+    def _escribir(self, datos):
+        vista = memoryview(datos)
+        while vista:
+            vista = vista[self._archivo.write(vista):]
+    
+    def _sincronizar(self):
+        os.fsync(self._archivo.fileno())
+        self._tamano_durable = self._archivo.tell()
+        self.fsyncs += 1
+    
+    def _rotar(self, ruta_anterior):
+        self._sincronizar()
+        self._archivo.close()
+        os.replace(self.ruta, ruta_anterior)
+        self._archivo = open(self.ruta, 'ab', buffering=0)
+        self._tamano_durable = 0
+        sincronizar_directorio(os.path.dirname(os.path.abspath(self.ruta)))
+        self._rotado.set()
+    
+    def _fallar(self, error):
+        """Dejar el WAL inutilizable y quitar del fichero lo que no se llegó a confirmar"""
+        self.logs.error("Error escribiendo el WAL", ruta=self.ruta, error=str(error))
+        self._error = error
+        try:
+            os.ftruncate(self._archivo.fileno(), self._tamano_durable)
+            os.fsync(self._archivo.fileno())
+        except OSError as e:
+            self.logs.error("No se pudo recortar el WAL", ruta=self.ruta, error=str(e))
+    
+    def _bucle(self):
+        while True:
+            with self._cond:
+                while not self._pendientes:
+                    if self._cerrado:
+                        return
+                    self._cond.wait()
+                lote, self._pendientes = self._pendientes, []
+                hasta = self._lsn_encolado
+            try:
+                lineas = []
+                for elemento in lote:
+                    if isinstance(elemento, tuple):
+                        self._escribir(b"".join(lineas))
+                        lineas = []
+                        self._rotar(elemento[1])
+                        # Lo anterior a la rotación ya está en disco aunque después falle algo
+                        with self._cond:
+                            self._lsn_durable = elemento[2]
+                    else:
+                        lineas.append(elemento)
+                self._escribir(b"".join(lineas))
+                self._sincronizar()
+            except OSError as e:
+                with self._cond:
+                    self._fallar(e)
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._lsn_durable = hasta
+                self._cond.notify_all()
+
+class Persistencia:
+    """Snapshot + WAL de una tabla guardados en un directorio.
+    
+    Los registros se guardan como objetos JSON; los que no son diccionarios
+    (registros compactos) se convierten con su método a_diccionario().
+    
+    Un solo proceso puede usar el directorio a la vez: cargar() toma un
+    bloqueo exclusivo (flock) que dura hasta cerrar() o hasta que el proceso
+    termina. En una recarga de gunicorn (HUP) el worker nuevo arranca antes de
+    que el antiguo acabe sus peticiones; así espera a que salga y carga el WAL
+    completo en vez de compactarlo mientras el antiguo sigue escribiendo en él.
+    """
+    
+    def __init__(self, directorio, nombre, fsync_agrupado, snapshot_cada, logs):
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self.ruta_snapshot = os.path.join(directorio, f"{nombre}.snapshot.json")
+        self.ruta_wal = os.path.join(directorio, f"{nombre}.wal")
+        self.ruta_wal_anterior = f"{self.ruta_wal}.anterior"
+        self.ruta_bloqueo = os.path.join(directorio, f"{nombre}.lock")
+        self._bloqueo = None
+        self.fsync_agrupado = fsync_agrupado
+        self.snapshot_cada = snapshot_cada
+        self.logs = logs
+        self.lsn = 0
+        self.escrituras_desde_snapshot = 0
+        self._snapshot_en_curso = False
+        self._hilo_snapshot = None
+        self.wal = None
+    
+    def cargar(self):
+        """Cargar la foto y reaplicar el WAL.
+    
+        Devuelve (registros ordenados por ID, siguiente_id) o None si no hay
+        datos guardados. Si hubo que reaplicar el WAL guarda una foto nueva y lo
+        deja vacío.
+        """
+        self._bloquear()
+        inicio = time.perf_counter()
+        registros, siguiente_id, hay_datos = {}, 1, False
+        if os.path.exists(self.ruta_snapshot):
+            with open(self.ruta_snapshot, encoding='utf-8') as archivo:
+                foto = json.load(archivo)
+            registros = {registro["id"]: registro for registro in foto["registros"]}
+            siguiente_id, self.lsn, hay_datos = foto["siguiente_id"], foto["lsn"], True
+    
+        reaplicadas, cola_rota = 0, False
+        for ruta in (self.ruta_wal_anterior, self.ruta_wal):
+            if not os.path.exists(ruta):
+                continue
+            hay_datos = True
+            with open(ruta, 'rb') as archivo:
+                for linea in archivo:
+                    try:
+                        operacion = json.loads(linea)
+                    except ValueError:
+                        cola_rota = True  # última línea incompleta tras una caída
+                        break
+                    if operacion["lsn"] <= self.lsn:
+                        continue
+                    self.lsn = operacion["lsn"]
+                    reaplicadas += 1
+                    for cambio in operacion["operaciones"] if operacion["op"] == "lote" else (operacion,):
+                        if cambio["op"] == "eliminar":
+                            registros.pop(cambio["id"], None)
+                        else:
+                            registro = cambio["registro"]
+                            registros[registro["id"]] = registro
+                            siguiente_id = max(siguiente_id, registro["id"] + 1)
+    
+        registros = dict(sorted(registros.items()))
+        if reaplicadas or cola_rota or os.path.exists(self.ruta_wal_anterior):
+            # Compactar al arrancar para que el próximo arranque sea solo la foto
+            self._escribir_snapshot(list(registros.values()), siguiente_id, self.lsn)
+            open(self.ruta_wal, 'wb').close()
+            if os.path.exists(self.ruta_wal_anterior):
+                os.remove(self.ruta_wal_anterior)
+        if hay_datos:
+            self.logs.info("Datos cargados", directorio=self.directorio, registros=len(registros),
+                           operaciones_wal=reaplicadas, ms=round((time.perf_counter() - inicio) * 1000))
+        self.wal = RegistroEscrituras(self.ruta_wal, self.fsync_agrupado, self.logs)
+        return (registros, siguiente_id) if hay_datos else None
+    
+    def _bloquear(self):
+        if fcntl is None:
+            return
+        self._bloqueo = open(self.ruta_bloqueo, 'a')
+        try:
+            fcntl.flock(self._bloqueo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.logs.info("Esperando a que otro proceso suelte la persistencia", directorio=self.directorio)
+            fcntl.flock(self._bloqueo, fcntl.LOCK_EX)
+    
+    def cerrar(self):
+        """Terminar el snapshot en curso, cerrar el WAL y soltar el directorio para otro proceso"""
+        if self._hilo_snapshot is not None:
+            self._hilo_snapshot.join()
+        self.wal.cerrar()
+        if self._bloqueo is not None:
+            self._bloqueo.close()
+            self._bloqueo = None
+    
+    def registrar(self, operacion, registro):
+        """Apuntar una operación en el WAL (con el lock de escritura tomado); devuelve su LSN"""
+        return self._apuntar({"op": operacion, **self._cambio(operacion, registro)}, 1)
+    
+    def registrar_lote(self, operaciones):
+        """Apuntar varias operaciones (operacion, registro) como una sola línea del WAL.
+        
+        Tras una caída la línea se reaplica entera o se descarta entera, así que
+        el lote es atómico también en disco. Devuelve su LSN.
+        """
+        cambios = [{"op": operacion, **self._cambio(operacion, registro)} for operacion, registro in operaciones]
+        return self._apuntar({"op": "lote", "operaciones": cambios}, len(cambios))
+    
+    @staticmethod
+    def _cambio(operacion, registro):
+        return {"id": registro["id"]} if operacion == "eliminar" else {"registro": registro}
+    
+    def _apuntar(self, entrada, escrituras):
+        lsn = self.lsn + 1
+        entrada = {"lsn": lsn, **entrada}
+        self.wal.encolar(lsn, (json.dumps(entrada, separators=(',', ':'), default=a_diccionario) + "\n").encode('utf-8'))
+        self.lsn = lsn
+        self.escrituras_desde_snapshot += escrituras
+        return lsn
+    
+    def esperar(self, lsn):
+        """Esperar a que la operación sea durable (sin el lock de escritura: así se agrupan los fsync)"""
+        self.wal.esperar(lsn)
+    
+    def lsn_durable(self):
+        """LSN de la última operación que ya está en disco"""
+        return self.wal.lsn_durable
+    
+    def necesita_snapshot(self):
+        return (self.snapshot_cada > 0 and not self._snapshot_en_curso
+                and self.escrituras_desde_snapshot >= self.snapshot_cada)
+    
+    def iniciar_snapshot(self, registros, siguiente_id):
+        """Cortar el WAL en este punto y escribir la foto en segundo plano (con el lock de escritura tomado)"""
+        self._snapshot_en_curso = True
+        self.escrituras_desde_snapshot = 0
+        self.wal.rotar(self.ruta_wal_anterior)
+        self._hilo_snapshot = threading.Thread(target=self._snapshot_en_segundo_plano,
+                                               args=(registros, siguiente_id, self.lsn), name='snapshot', daemon=True)
+        self._hilo_snapshot.start()
+    
+    def _snapshot_en_segundo_plano(self, registros, siguiente_id, lsn):
+        try:
+            inicio = time.perf_counter()
+            # La foto solo puede sustituir al WAL si las operaciones que incluye ya están en disco
+            self.wal.esperar(lsn)
+            self._escribir_snapshot(registros, siguiente_id, lsn)
+            self.wal.esperar_rotacion()
+            os.remove(self.ruta_wal_anterior)
+            self.logs.info("Snapshot guardado", registros=len(registros), ms=round((time.perf_counter() - inicio) * 1000))
+        except OSError as e:
+            # El WAL anterior se conserva (se reaplica al arrancar) y no se hacen más snapshots
+            self.logs.error("Error guardando el snapshot", error=str(e))
+            return
+        self._snapshot_en_curso = False
+    
+    def _escribir_snapshot(self, registros, siguiente_id, lsn):
+        temporal = f"{self.ruta_snapshot}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump({"lsn": lsn, "siguiente_id": siguiente_id, "registros": registros}, archivo,
+                      separators=(',', ':'), default=a_diccionario)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, self.ruta_snapshot)
+        sincronizar_directorio(self.directorio)
+
+def conectar_sqlite(ruta, row_factory):
+    """Abrir una conexión SQLite en modo autocommit con las opciones del servicio"""
+    conexion = sqlite3.connect(ruta, timeout=10, isolation_level=None, cached_statements=256)
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    conexion.row_factory = row_factory
+    return conexion
+
+def fila_a_diccionario(cursor, fila):
+    """Fila de SQLite como diccionario (fecha_actualizacion solo aparece tras una actualización)"""
+    registro = dict(zip([columna[0] for columna in cursor.description], fila))
+    if registro.get("fecha_actualizacion", 0) is None:
+        del registro["fecha_actualizacion"]
+    return registro
+
@@ -0,0 +1,121 @@
+"""Lectura de las peticiones de los microservicios y formato de sus colecciones.
+
+Listados: paginación por cursor (limit y after_id), filtros por campo y
+proyección (fields). Con `Accept: application/x-ndjson` la colección se envía
+en streaming, un objeto JSON por línea, sin límite de página.
+
+Operaciones en lote: los endpoints /bulk validan todos los elementos antes de
+escribir y aplican el lote entero o nada; la respuesta lleva un resultado o un
+error por elemento.
+"""
+import json
+
+MIMETYPE_NDJSON = 'application/x-ndjson'
+
+# ===== LISTADOS =====
+
+def leer_parametros_listado(request, filtros_permitidos, limite_defecto, limite_max, streaming=False):
+    """Leer limit, after_id, fields y filtros de la query string.
+    
+    filtros_permitidos es un diccionario {campo: tipo}. En modo streaming el
+    limit es opcional y no tiene máximo. Lanza ValueError con un mensaje para
+    el cliente si algún parámetro no es válido.
+    """
+    args = request.args
+    try:
+        limit = int(args['limit']) if args.get('limit') else (None if streaming else limite_defecto)
+        after_id = int(args['after_id']) if args.get('after_id') else None
+    except ValueError:
+        raise ValueError("Los parámetros 'limit' y 'after_id' deben ser enteros")
+    if limit is not None and (limit < 1 or (not streaming and limit > limite_max)):
+        raise ValueError(f"El parámetro 'limit' debe estar entre 1 y {limite_max}")
+    
+    filtros = {}
+    for campo, tipo in filtros_permitidos.items():
+        if campo in args:
+            try:
+                filtros[campo] = tipo(args[campo])
+            except ValueError:
+                raise ValueError(f"Valor inválido para el filtro '{campo}'")
+    
+    campos = [c.strip() for c in args.get('fields', '').split(',') if c.strip()] or None
+    return limit, after_id, filtros, campos
+
+def acepta_ndjson(request):
+    """El cliente pidió la colección como NDJSON (un objeto JSON por línea)"""
+    return MIMETYPE_NDJSON in request.headers.get('Accept', '')
+
+def linea_ndjson(datos):
+    return json.dumps(datos, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+def proyectar(datos, campos):
+    """Quedarse solo con los campos pedidos (todos si campos es None)"""
+    if campos is None:
+        return datos
+    return {campo: datos[campo] for campo in campos if campo in datos}
+
+# ===== OPERACIONES EN LOTE =====
+
+def leer_lote(request, max_elementos):
+    """Elementos del cuerpo de una petición en lote: array JSON o NDJSON (un objeto por línea).
+    
+    Devuelve (elementos, errores): las líneas NDJSON que no son JSON válido
+    quedan como None y se anotan en errores. Lanza ValueError con un mensaje
+    para el cliente si el cuerpo no es un lote o supera max_elementos.
+    """
+    cuerpo = request.get_data()
+    errores = []
+    if MIMETYPE_NDJSON in request.headers.get('Content-Type', ''):
+        lineas = [linea for linea in cuerpo.splitlines() if linea.strip()]
+        try:
+            # Todas las líneas como un solo array: un único json.loads en C
+            elementos = json.loads(b'[' + b','.join(lineas) + b']')
+        except ValueError:
+            elementos = None
+        if not isinstance(elementos, list) or len(elementos) != len(lineas):
+            # Alguna línea no es JSON válido: se analizan una a una para señalarlas
+            elementos = []
+            for linea in lineas:
+                try:
+                    elementos.append(json.loads(linea))
+                except ValueError:
+                    errores.append({"indice": len(elementos), "error": "JSON inválido"})
+                    elementos.append(None)
+    else:
+        try:
+            elementos = json.loads(cuerpo)
+        except ValueError:
+            elementos = None
+        if not isinstance(elementos, list):
+            raise ValueError("El cuerpo debe ser un array JSON o NDJSON (Content-Type: application/x-ndjson)")
+    if not elementos:
+        raise ValueError("El lote está vacío")
+    if len(elementos) > max_elementos:
+        raise ValueError(f"El lote admite como máximo {max_elementos} elementos")
+    return elementos, errores
+
+def ids_del_lote(elementos, errores, admite_numeros=False):
+    """IDs de los elementos de un PATCH o DELETE en lote ({"id": 1, ...}, o 1 si admite_numeros).
+    
+    Anota en errores los elementos sin un ID entero o con un ID repetido.
+    """
+    ids = []
+    vistos = set()
+    for indice, elemento in enumerate(elementos):
+        if elemento is None:
+            ids.append(None)
+            continue
+        id_elemento = elemento.get("id") if isinstance(elemento, dict) else (elemento if admite_numeros else None)
+        if not isinstance(id_elemento, int) or isinstance(id_elemento, bool):
+            errores.append({"indice": indice, "error": "El campo 'id' (entero) es requerido"})
+        elif id_elemento in vistos:
+            errores.append({"indice": indice, "error": f"El ID {id_elemento} está repetido en el lote"})
+        else:
+            vistos.add(id_elemento)
+        ids.append(id_elemento)
+    return ids
+
+def errores_no_encontrados(ids, no_encontrados, mensaje):
+    """Error de cada elemento del lote cuyo ID no existe"""
+    no_encontrados = set(no_encontrados)
+    return [{"indice": indice, "error": mensaje} for indice, id_elemento in enumerate(ids) if id_elemento in no_encontrados]
@@ -0,0 +1,25 @@
+"""Fechas de los servicios.
+
+Las fechas se guardan como milisegundos desde epoch (enteros ordenables) y solo
+se formatean en ISO-8601 UTC al responder, sin lanzar procesos externos.
+"""
+from functools import lru_cache
+import time
+
+def ahora_ms():
+    """Milisegundos desde epoch (UTC)"""
+    return time.time_ns() // 1_000_000
+
+@lru_cache(maxsize=4096)
+def _formatear_segundo(segundo):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(segundo))
+
+def formatear_fecha(ms):
+    """Formatear milisegundos desde epoch como ISO-8601 UTC"""
+    if ms is None:
+        return None
+    return f"{_formatear_segundo(ms // 1000)}.{ms % 1000:03d}Z"
+
+def timestamp_actual():
+    """Fecha actual en ISO-8601 UTC con precisión de segundos"""
+    return f"{_formatear_segundo(int(time.time()))}Z"
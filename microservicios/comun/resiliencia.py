@@ -0,0 +1,405 @@
+"""Resiliencia de las llamadas a otros microservicios: fallan rápido en lugar de acumular esperas.
+
+- Plazo: el límite de tiempo de la petición llega en el header X-Plazo-Ms (el
+  gateway pone como mucho PLAZO_PETICION). Cada llamada usa como timeout lo que
+  queda de él y lo propaga en el mismo header, así que ningún salto espera más
+  que quien lo llamó.
+- Circuito por microservicio: tras CIRCUITO_FALLOS fallos seguidos se abre y las
+  llamadas se rechazan sin tocar la red durante CIRCUITO_ESPERA segundos.
+- Reintentos de los GET que fallan por la red o con 502/503/504, con una espera
+  exponencial aleatoria (jitter) y limitados por un presupuesto por microservicio
+  (REINTENTOS_PROPORCION de las llamadas más REINTENTOS_MINIMO_POR_SEGUNDO), para
+  que los reintentos no multipliquen la carga de un servicio que ya va mal.
+"""
+import contextvars
+import random
+import threading
+import time
+
+from flask import request
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool, Timeout
+from urllib3.exceptions import EmptyPoolError
+
+HEADER_PLAZO = 'X-Plazo-Ms'
+PLAZO_MINIMO = 0.005  # segundos: con menos tiempo no se llama
+
+# Límite de la petición en curso en time.monotonic() (None = sin plazo)
+plazo_peticion = contextvars.ContextVar('plazo_peticion', default=None)
+
+def leer_plazo(valor, maximo):
+    """Límite (time.monotonic()) del header X-Plazo-Ms, de como mucho maximo segundos (0 = sin máximo)"""
+    segundos = maximo or None
+    if valor:
+        try:
+            restante = int(valor) / 1000
+        except ValueError:
+            restante = None
+        if restante is not None and restante >= 0 and (segundos is None or restante < segundos):
+            segundos = restante
+    return time.monotonic() + segundos if segundos is not None else None
+
+def tiempo_restante():
+    """Segundos que quedan del plazo de la petición en curso (None si no tiene)"""
+    plazo = plazo_peticion.get()
+    return plazo - time.monotonic() if plazo is not None else None
+
+def limitar_plazo(app, maximo=None):
+    """Registrar en la app de Flask el hook que fija el plazo de cada petición.
+    
+    El plazo es el que le queda a quien llama (header X-Plazo-Ms) y, con maximo,
+    como mucho maximo(peticion) segundos (0 = sin máximo).
+    """
+    
+    @app.before_request
+    def iniciar_plazo():
+        peticion = request._get_current_object()
+        plazo_peticion.set(leer_plazo(peticion.headers.get(HEADER_PLAZO), maximo(peticion) if maximo else 0))
+
+class Circuito:
+    """Circuit breaker hacia un microservicio: cerrado, abierto o semiabierto.
+    
+    Cerrado deja pasar todas las llamadas y cuenta los fallos seguidos (errores de
+    red y respuestas 5xx). Al llegar a fallos se abre y rechaza las llamadas
+    durante espera segundos; después queda semiabierto y deja pasar una sola
+    llamada de prueba, que lo cierra si va bien y lo vuelve a abrir si falla.
+    El estado es de cada proceso. Con fallos <= 0 no se abre nunca. Las
+    aperturas se cuentan en metricas y los cambios de estado se anotan en logs.
+    """
+    
+    CERRADO, SEMIABIERTO, ABIERTO = 'cerrado', 'semiabierto', 'abierto'
+    
+    def __init__(self, nombre, fallos, espera, metricas, logs):
+        self.nombre = nombre
+        self.fallos = fallos
+        self.espera = espera
+        self.metricas = metricas
+        self.logs = logs
+        self.estado = self.CERRADO
+        self._fallos_seguidos = 0
+        self._hasta = 0.0  # abierto: hasta cuándo se rechaza; semiabierto: hasta cuándo se espera a la prueba
+        self._lock = threading.Lock()
+    
+    def permitir(self):
+        """La llamada puede enviarse (semiabierto: solo la de prueba)"""
+        if self.estado == self.CERRADO:
+            return True
+        with self._lock:
+            if self.estado == self.CERRADO:
+                return True
+            ahora = time.monotonic()
+            if ahora < self._hasta:
+                return False
+            # Abierto con la espera cumplida, o semiabierto con una prueba que no llegó a terminar
+            self._cambiar(self.SEMIABIERTO, ahora + self.espera)
+            return True
+    
+    def registrar(self, exito):
+        """Anotar el resultado de una llamada enviada"""
+        if exito:
+            if self.estado == self.CERRADO and not self._fallos_seguidos:
+                return
+            with self._lock:
+                self._fallos_seguidos = 0
+                if self.estado != self.CERRADO:
+                    self._cambiar(self.CERRADO, 0.0)
+            return
+        with self._lock:
+            self._fallos_seguidos += 1
+            if (self.estado == self.SEMIABIERTO
+                    or (self.estado == self.CERRADO and 0 < self.fallos <= self._fallos_seguidos)):
+                self._cambiar(self.ABIERTO, time.monotonic() + self.espera)
+    
+    def _cambiar(self, estado, hasta):
+        anterior, self.estado, self._hasta = self.estado, estado, hasta
+        if estado == self.ABIERTO:
+            self.metricas.sumar("circuit_breaker_opened_total", (("target", self.nombre),))
+            self.logs.warning("Circuito abierto", destino=self.nombre, anterior=anterior,
+                         fallos_seguidos=self._fallos_seguidos, espera_segundos=self.espera)
+        else:
+            self.logs.info("Circuito " + estado, destino=self.nombre, anterior=anterior)
+
+# Solo se reintentan las lecturas y los errores que suelen ser pasajeros
+METODOS_REINTENTABLES = frozenset(('GET', 'HEAD'))
+CODIGOS_REINTENTABLES = frozenset((502, 503, 504))
+
+class PresupuestoReintentos:
+    """Cubo de fichas que limita los reintentos hacia un microservicio.
+    
+    Cada llamada aporta proporcion fichas, cada segundo se suman
+    minimo_por_segundo y cada reintento gasta una. El saldo no pasa de lo que da
+    el mínimo en 10 s, para que un rato tranquilo no permita luego una ráfaga.
+    Cada llamada se repite como mucho reintentos_max veces, con la espera
+    exponencial que empieza en espera_base segundos.
+    """
+    
+    def __init__(self, proporcion, minimo_por_segundo, reintentos_max, espera_base):
+        self.proporcion = proporcion
+        self.minimo_por_segundo = minimo_por_segundo
+        self.reintentos_max = reintentos_max
+        self.espera_base = espera_base
+        self.maximo = max(1.0, minimo_por_segundo * 10)
+        self._saldo = self.maximo
+        self._actualizado = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def depositar(self):
+        """Sumar las fichas que aporta una llamada"""
+        with self._lock:
+            self._saldo = min(self.maximo, self._saldo + self.proporcion)
+    
+    def retirar(self):
+        """Gastar una ficha para un reintento (False si no quedan)"""
+        with self._lock:
+            ahora = time.monotonic()
+            self._saldo = min(self.maximo, self._saldo + (ahora - self._actualizado) * self.minimo_por_segundo)
+            self._actualizado = ahora
+            if self._saldo < 1:
+                return False
+            self._saldo -= 1
+            return True
+
+class LlamadaRechazada(requests.exceptions.ConnectionError):
+    """La llamada no se envió: circuito abierto o plazo agotado (motivo)"""
+    
+    def __init__(self, destino, motivo):
+        super().__init__(f"Llamada a {destino} rechazada ({motivo})")
+        self.motivo = motivo
+
+def espera_reintento(circuito, presupuesto, intento):
+    """Segundos a esperar antes de repetir el intento número intento (0 el primero), o None si no se repite.
+    
+    La espera es aleatoria entre 0 y presupuesto.espera_base * 2^intento (full
+    jitter) y tiene que caber en el plazo. No se reintenta con el circuito ya
+    abierto ni sin fichas en el presupuesto.
+    """
+    if intento >= presupuesto.reintentos_max or circuito.estado != Circuito.CERRADO:
+        return None
+    espera = random.uniform(0, presupuesto.espera_base * 2 ** intento)
+    restante = tiempo_restante()
+    if restante is not None and restante - espera < PLAZO_MINIMO:
+        return None
+    destino = (("target", circuito.nombre),)
+    if not presupuesto.retirar():
+        circuito.metricas.sumar("upstream_retry_budget_exhausted_total", destino)
+        return None
+    circuito.metricas.sumar("upstream_retries_total", destino)
+    return espera
+
+def rechazo_llamada(circuito):
+    """Motivo para no enviar una llamada ('deadline' o 'circuit_open') o None si puede enviarse"""
+    restante = tiempo_restante()
+    if restante is not None and restante < PLAZO_MINIMO:
+        motivo = 'deadline'
+    elif not circuito.permitir():
+        motivo = 'circuit_open'
+    else:
+        return None
+    circuito.metricas.sumar("upstream_rejected_total", (("target", circuito.nombre), ("reason", motivo)))
+    return motivo
+
+class Intentos:
+    """Decisiones del bucle de intentos de una llamada, sin hacer E/S.
+    
+    El cliente envía cada intento a su manera (requests, aiohttp) y pregunta
+    aquí si puede enviarlo y si tiene que repetirlo, así que el plazo, el
+    circuito, el presupuesto y los códigos reintentables se aplican igual en
+    todos los clientes.
+    """
+    
+    def __init__(self, destino, circuito, presupuesto, metodo):
+        self.destino = destino
+        self.circuito = circuito
+        self.presupuesto = presupuesto
+        self.reintentable = metodo in METODOS_REINTENTABLES
+        self.intento = 0
+        if self.reintentable:
+            presupuesto.depositar()
+    
+    def siguiente(self, headers):
+        """(segundos que quedan de plazo o None, headers con X-Plazo-Ms) del próximo intento.
+        
+        Lanza LlamadaRechazada si el circuito está abierto o ya no queda plazo.
+        """
+        motivo = rechazo_llamada(self.circuito)
+        if motivo is not None:
+            raise LlamadaRechazada(self.destino, motivo)
+        restante = tiempo_restante()
+        if restante is None:
+            return None, headers
+        return restante, {**headers, HEADER_PLAZO: str(int(restante * 1000))}
+    
+    def fallo(self):
+        """El intento falló por la red: segundos a esperar antes de repetirlo, o None si no se repite"""
+        self.circuito.registrar(False)
+        return self._repetir() if self.reintentable else None
+    
+    def respuesta(self, codigo):
+        """El intento recibió codigo: segundos a esperar antes de repetirlo, o None si la respuesta vale"""
+        self.circuito.registrar(codigo < 500)
+        if self.reintentable and codigo in CODIGOS_REINTENTABLES:
+            return self._repetir()
+        return None
+    
+    def _repetir(self):
+        espera = espera_reintento(self.circuito, self.presupuesto, self.intento)
+        if espera is not None:
+            self.intento += 1
+        return espera
+
+def series_circuitos(circuitos):
+    """Estado de cada circuito como tres series 0/1 (sumadas entre workers, cuántos hay en cada estado)"""
+    return [
+        ("circuit_breaker_state", (("target", circuito.nombre), ("state", estado)), int(circuito.estado == estado))
+        for circuito in circuitos
+        for estado in (Circuito.CERRADO, Circuito.SEMIABIERTO, Circuito.ABIERTO)
+    ]
+
+
+class _EsperaPoolAcotada:
+    """Pool de urllib3 con block=True que espera una conexión libre como mucho su timeout de conexión.
+    
+    requests no pasa pool_timeout a urllib3, así que sin esto la espera no
+    tendría límite. Tampoco se espera más de lo que queda del plazo de la petición.
+    """
+    
+    def _get_conn(self, timeout=None):
+        if timeout is None:
+            timeout = self.timeout.connect_timeout
+            restante = tiempo_restante()
+            if restante is not None:
+                timeout = max(0.0, min(timeout, restante))
+        return super()._get_conn(timeout)
+
+class _PoolHTTP(_EsperaPoolAcotada, HTTPConnectionPool):
+    pass
+
+class _PoolHTTPS(_EsperaPoolAcotada, HTTPSConnectionPool):
+    pass
+
+class AdaptadorPoolLimitado(HTTPAdapter):
+    """HTTPAdapter con como mucho pool_size conexiones abiertas a la vez hacia un microservicio.
+    
+    Con todas ocupadas, una llamada espera a que se libere una (pool_block=True)
+    como mucho espera_pool segundos, en lugar de abrir una conexión de más que
+    se cerraría al devolverla. Si no llega a tiempo falla con un ConnectionError
+    de requests, como un error de red.
+    """
+    
+    def __init__(self, pool_size, espera_pool):
+        self.espera_pool = espera_pool
+        super().__init__(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        # El timeout del pool solo se usa para la espera: requests pasa el suyo en cada llamada
+        super().init_poolmanager(connections, maxsize, block, timeout=Timeout(connect=self.espera_pool), **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _PoolHTTP, 'https': _PoolHTTPS}
+    
+    def send(self, request, *args, **kwargs):
+        try:
+            return super().send(request, *args, **kwargs)
+        except EmptyPoolError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+class ClienteHTTP:
+    """Cliente HTTP con pool de conexiones keep-alive hacia un microservicio.
+    
+    Cada llamada pasa por circuito y presupuesto, y se mide en metricas y trazas.
+    Como mucho pool_size llamadas a la vez: las demás esperan una conexión libre
+    hasta connect_timeout segundos (AdaptadorPoolLimitado).
+    """
+    
+    def __init__(self, nombre, base_url, pool_size, connect_timeout, read_timeout, circuito, presupuesto, metricas,
+                 trazas):
+        self.nombre = nombre
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self._adapter = AdaptadorPoolLimitado(pool_size, connect_timeout)
+        self.session = requests.Session()
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+        self.peticiones = 0
+        self.circuito = circuito
+        self.presupuesto = presupuesto
+        self.metricas = metricas
+        self.trazas = trazas
+    
+    def request(self, method, endpoint, **kwargs):
+        """Enviar una petición dentro del plazo y del circuito, reintentando los GET que fallan.
+        
+        Lanza LlamadaRechazada sin enviar nada si el circuito está abierto o ya no
+        queda plazo; si no, la excepción o la respuesta del último intento.
+        """
+        conexion, lectura = kwargs.pop('timeout', self.timeout)
+        headers = kwargs.pop('headers', None) or {}
+        intentos = Intentos(self.nombre, self.circuito, self.presupuesto, method)
+        while True:
+            restante, headers_intento = intentos.siguiente(headers)
+            timeout = (conexion, lectura) if restante is None else (min(conexion, restante), min(lectura, restante))
+            try:
+                response = self.enviar(method, endpoint, timeout=timeout, headers=headers_intento, **kwargs)
+            except requests.exceptions.RequestException:
+                espera = intentos.fallo()
+                if espera is None:
+                    raise
+            else:
+                espera = intentos.respuesta(response.status_code)
+                if espera is None:
+                    return response
+                response.close()
+            time.sleep(espera)
+    
+    def enviar(self, method, endpoint, **kwargs):
+        """Un solo intento reutilizando conexiones del pool (con su latencia en /metrics y su span)"""
+        kwargs.setdefault('timeout', self.timeout)
+        self.peticiones += 1
+        inicio = time.perf_counter()
+        with self.trazas.span(f"{method} {self.nombre}", tipo='client', endpoint=endpoint) as span:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **self.trazas.headers()}
+            try:
+                response = self.session.request(method, f"{self.base_url}{endpoint}", **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.metricas.registrar_llamada(self.nombre, inicio, error=e)
+                raise
+            self.metricas.registrar_llamada(self.nombre, inicio, codigo=response.status_code)
+            if span is not None:
+                span.atributos["estado"] = response.status_code
+        return response
+    
+    def estadisticas(self):
+        """Conexiones en uso, inactivas y creadas en el pool"""
+        en_uso = inactivas = creadas = 0
+        pools = self._adapter.poolmanager.pools
+        for clave in list(pools.keys()):
+            pool = pools.get(clave)
+            if pool is None or pool.pool is None:
+                continue
+            conexiones = list(pool.pool.queue)
+            inactivas += sum(1 for conexion in conexiones if conexion is not None)
+            en_uso += pool.pool.maxsize - len(conexiones)
+            creadas += pool.num_connections
+        return {
+            "url": self.base_url,
+            "pool_size": self.pool_size,
+            "en_uso": en_uso,
+            "inactivas": inactivas,
+            "conexiones_creadas": creadas,
+            "peticiones": self.peticiones,
+            "timeout_conexion": self.timeout[0],
+            "timeout_lectura": self.timeout[1],
+            "circuito": self.circuito.estado
+        }
+
+def series_pools(clientes):
+    """Conexiones de los pools de los clientes HTTP a partir de su estadisticas()"""
+    series = []
+    for cliente in clientes:
+        estadisticas = cliente.estadisticas()
+        destino = (("target", cliente.nombre),)
+        series.append(("http_pool_connections", destino + (("state", "in_use"),), estadisticas["en_uso"]))
+        series.append(("http_pool_connections", destino + (("state", "idle"),), estadisticas["inactivas"]))
+        if "conexiones_creadas" in estadisticas:
+            series.append(("http_pool_connections_created_total", destino, estadisticas["conexiones_creadas"]))
+    return series
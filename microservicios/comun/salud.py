@@ -0,0 +1,85 @@
+"""Monitor del /health de los microservicios de los que depende un servicio.
+
+Un hilo de fondo sondea cada INTERVALO segundos y las rutas leen la última foto
+del estado sin hacer peticiones, así que los health checks externos no se
+amplifican en tráfico hacia los microservicios. El gateway asíncrono envuelve
+este mismo monitor y solo cambia cómo se envían los sondeos (aiohttp).
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import requests
+
+from comun.reloj import ahora_ms, formatear_fecha
+
+class MonitorSalud:
+    """Última foto del estado de salud de los microservicios de clientes (ClienteHTTP)"""
+    
+    def __init__(self, clientes, intervalo, timeout, logs):
+        self.clientes = clientes
+        self.intervalo = intervalo
+        self.timeout = timeout
+        self.logs = logs
+        self._estado = {}
+        self._iniciado = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(clientes)), thread_name_prefix='monitor-salud')
+    
+    def iniciar(self):
+        """Primer sondeo y arranque del hilo de monitorización (una vez por proceso)"""
+        with self._lock:
+            if self._iniciado:
+                return
+            self.sondear()
+            threading.Thread(target=self._bucle, name='monitor-salud', daemon=True).start()
+            self._iniciado = True
+    
+    def _bucle(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.sondear()
+            except Exception:
+                self.logs.exception("Error en el monitor de salud")
+    
+    def sondear(self):
+        """Sondear todos los microservicios en paralelo y publicar el nuevo estado"""
+        self.publicar(self._executor.map(self._sondear_servicio, self.clientes))
+    
+    def _sondear_servicio(self, cliente):
+        inicio = time.perf_counter()
+        try:
+            response = cliente.enviar('GET', "/health", timeout=(cliente.timeout[0], self.timeout))
+        except requests.exceptions.RequestException:
+            return self.resultado(cliente, inicio, None)
+        return self.resultado(cliente, inicio, response.status_code)
+    
+    def resultado(self, cliente, inicio, codigo):
+        """(nombre, estado) de un sondeo empezado en inicio (perf_counter); codigo None = no se pudo conectar"""
+        if codigo is None:
+            estado = {'estado': 'unreachable', 'url': cliente.base_url, 'error': 'No se pudo conectar'}
+        else:
+            estado = {'estado': 'healthy' if codigo == 200 else 'unhealthy', 'url': cliente.base_url, 'codigo': codigo}
+        ahora = formatear_fecha(ahora_ms())
+        estado['latencia_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+        estado['ultima_verificacion'] = ahora
+        estado['ultimo_healthy'] = (
+            ahora if estado['estado'] == 'healthy' else self._estado.get(cliente.nombre, {}).get('ultimo_healthy')
+        )
+        return cliente.nombre, estado
+    
+    def publicar(self, resultados):
+        """Sustituir la foto del estado por los (nombre, estado) de un sondeo completo"""
+        self._estado = dict(resultados)
+    
+    @property
+    def estado(self):
+        """Foto del último sondeo, sin arrancar el monitor"""
+        return self._estado
+    
+    def snapshot(self):
+        """Último estado conocido de cada microservicio"""
+        if not self._iniciado:
+            self.iniciar()
+        return self._estado
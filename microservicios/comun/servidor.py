@@ -0,0 +1,25 @@
+"""Arranque en producción: `python app.py` con SERVER_MODE=production se reemplaza por gunicorn.
+
+El proceso que lanza gunicorn no atiende peticiones: cada worker importa app.py y
+crea su base de datos, logs, trazas y métricas. Por eso cada servicio llama a
+lanzar_gunicorn() justo después de leer SERVER_MODE, antes de crear nada (en
+particular antes de cargar los datos iniciales o escribir en el WAL).
+"""
+import importlib.util
+import os
+import sys
+
+CONFIG_GUNICORN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+def lanzar_gunicorn(aplicacion, *opciones):
+    """Reemplazar este proceso por gunicorn con microservicios/gunicorn.conf.py.
+    
+    aplicacion es el módulo y la variable WSGI/ASGI ('app:app'); opciones se
+    añaden a la línea de comandos (por ejemplo '-k', 'aiohttp.GunicornWebWorker').
+    Si gunicorn no está instalado no hace nada y devuelve False, y el servicio
+    sigue con su servidor de desarrollo.
+    """
+    if importlib.util.find_spec('gunicorn') is None:
+        return False
+    sys.stdout.flush()
+    os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', CONFIG_GUNICORN, *opciones, aplicacion])
@@ -0,0 +1,239 @@
+"""Trazas distribuidas con W3C Trace Context.
+
+Cada petición continúa la traza del header traceparent (o empieza una, muestreada
+con TRAZAS_MUESTREO) y las llamadas a otros microservicios lo propagan. El span en
+curso vive en una variable de contexto, así que los spans de autenticación, base
+de datos y JSON se anidan solos. Los spans terminados se guardan en memoria (los
+últimos TRAZAS_MAX_SPANS) y en TRAZAS_ARCHIVO, un JSONL que comparten los workers.
+"""
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+import contextvars
+import heapq
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+span_actual = contextvars.ContextVar('span_actual', default=None)
+
+class Span:
+    """Operación de una traza; si no está muestreada solo sirve para propagar el contexto"""
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'nombre', 'tipo', 'muestreado', 'atributos',
+                 'inicio_us', '_inicio', '_token')
+    
+    def __init__(self, trace_id, parent_id, nombre, tipo, muestreado, atributos):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.nombre = nombre
+        self.tipo = tipo
+        self.muestreado = muestreado
+        self.atributos = atributos
+        self.inicio_us = time.time_ns() // 1000
+        self._inicio = time.perf_counter()
+    
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.muestreado else '00'}"
+    
+    def a_diccionario(self, servicio):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "servicio": servicio,
+            "nombre": self.nombre,
+            "tipo": self.tipo,
+            "inicio_us": self.inicio_us,
+            "duracion_ms": round((time.perf_counter() - self._inicio) * 1000, 3),
+            "atributos": self.atributos
+        }
+
+def leer_traceparent(valor):
+    """(trace_id, parent_id, muestreado) de un header traceparent, o None si falta o no es válido"""
+    partes = valor.strip().lower().split('-') if valor else ()
+    if (len(partes) < 4 or len(partes[0]) != 2 or partes[0] == 'ff' or (partes[0] == '00' and len(partes) != 4)
+            or len(partes[1]) != 32 or len(partes[2]) != 16 or len(partes[3]) != 2):
+        return None
+    try:
+        int(partes[1], 16), int(partes[2], 16)
+        flags = int(partes[3], 16)
+    except ValueError:
+        return None
+    if partes[1] == '0' * 32 or partes[2] == '0' * 16:
+        return None
+    return partes[1], partes[2], bool(flags & 1)
+
+def trazando():
+    """La petición en curso se está trazando"""
+    span = span_actual.get()
+    return span is not None and span.muestreado
+
+class Trazas:
+    """Colector de spans: memoria acotada y, opcionalmente, un fichero JSONL.
+    
+    Las peticiones solo añaden el span terminado a la memoria y a una cola; el
+    hilo 'trazas' lo escribe en el fichero por lotes (y lo rota al pasar de
+    archivo_max_bytes, conservando el anterior en <archivo>.1).
+    """
+    
+    def __init__(self, servicio, muestreo, max_spans, archivo, archivo_max_bytes, logs):
+        self.servicio = servicio
+        self.muestreo = muestreo
+        self.archivo = archivo
+        self.archivo_max_bytes = archivo_max_bytes
+        self.logs = logs
+        self._spans = deque(maxlen=max_spans)
+        self._cola = queue.SimpleQueue()
+        if archivo:
+            threading.Thread(target=self._bucle, name='trazas', daemon=True).start()
+    
+    def iniciar_peticion(self, traceparent, nombre, **atributos):
+        """Span de servidor de una petición; queda como span en curso hasta terminar_peticion"""
+        padre = leer_traceparent(traceparent)
+        if padre is None:
+            padre = (f"{random.getrandbits(128):032x}", None, random.random() < self.muestreo)
+        span = Span(padre[0], padre[1], nombre, 'server', padre[2], atributos)
+        span._token = span_actual.set(span)
+        return span
+    
+    def terminar_peticion(self, span):
+        span_actual.reset(span._token)
+        if span.muestreado:
+            self._guardar(span)
+    
+    @contextmanager
+    def span(self, nombre, tipo='interno', **atributos):
+        """Span hijo del actual (no hace nada si la petición no se traza)"""
+        padre = span_actual.get()
+        if padre is None or not padre.muestreado:
+            yield None
+            return
+        span = Span(padre.trace_id, padre.span_id, nombre, tipo, True, atributos)
+        token = span_actual.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.atributos["error"] = type(e).__name__
+            raise
+        finally:
+            span_actual.reset(token)
+            self._guardar(span)
+    
+    def headers(self):
+        """Header traceparent para propagar la traza en curso a otro microservicio"""
+        span = span_actual.get()
+        return {'traceparent': span.traceparent()} if span is not None else {}
+    
+    def buscar(self, trace_id):
+        """Spans de una traza ordenados por inicio (de memoria y, con fichero, de todos los workers)"""
+        spans = {span["span_id"]: span for span in list(self._spans) if span["trace_id"] == trace_id}
+        for ruta in ((f"{self.archivo}.1", self.archivo) if self.archivo else ()):
+            try:
+                with open(ruta, encoding='utf-8') as archivo:
+                    for linea in archivo:
+                        if trace_id not in linea:
+                            continue
+                        try:
+                            span = json.loads(linea)
+                        except ValueError:
+                            continue
+                        if span.get("trace_id") == trace_id:
+                            spans[span["span_id"]] = span
+            except OSError:
+                continue
+        return sorted(spans.values(), key=lambda span: span["inicio_us"])
+    
+    def peticiones_lentas(self, limite):
+        """Spans de servidor más lentos entre los que quedan en memoria"""
+        peticiones = [span for span in list(self._spans) if span["tipo"] == 'server']
+        return heapq.nlargest(limite, peticiones, key=lambda span: span["duracion_ms"])
+    
+    def _guardar(self, span):
+        registro = span.a_diccionario(self.servicio)
+        self._spans.append(registro)
+        if self.archivo:
+            self._cola.put(registro)
+    
+    def _bucle(self):
+        while True:
+            lote = [self._cola.get()]
+            while len(lote) < 1000:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                os.makedirs(os.path.dirname(self.archivo) or '.', exist_ok=True)
+                with open(self.archivo, 'a', encoding='utf-8') as archivo:
+                    archivo.write("".join(json.dumps(span, ensure_ascii=False) + "\n" for span in lote))
+                    rotar = archivo.tell() >= self.archivo_max_bytes
+                if rotar:
+                    os.replace(self.archivo, f"{self.archivo}.1")
+            except OSError as e:
+                self.logs.warning("No se pudieron guardar las trazas", archivo=self.archivo, error=str(e))
+
+def operaciones_trazadas(trazas):
+    """Decorador de clase: cada método público de la clase es un span 'db.<método>' de trazas"""
+    def decorar(clase):
+        for nombre, metodo in list(vars(clase).items()):
+            if inspect.isfunction(metodo) and not nombre.startswith('_'):
+                setattr(clase, nombre, _operacion_trazada(trazas, f"db.{nombre}", metodo))
+        return clase
+    return decorar
+
+def _operacion_trazada(trazas, nombre_span, metodo):
+    @wraps(metodo)
+    def operacion(*args, **kwargs):
+        if not trazando():
+            return metodo(*args, **kwargs)
+        with trazas.span(nombre_span, tipo='db'):
+            return metodo(*args, **kwargs)
+    return operacion
+
+class ProveedorJSONTrazado(DefaultJSONProvider):
+    """JSON de Flask con la serialización de cada respuesta como span 'json.serializar'"""
+    
+    def __init__(self, app, trazas):
+        super().__init__(app)
+        self.trazas = trazas
+    
+    def response(self, *args, **kwargs):
+        if not trazando():
+            return super().response(*args, **kwargs)
+        with self.trazas.span("json.serializar"):
+            return super().response(*args, **kwargs)
+
+def trazar_peticiones(app, trazas):
+    """Registrar en la app de Flask los hooks que abren y cierran el span de cada petición"""
+    app.json = ProveedorJSONTrazado(app, trazas)
+    
+    @app.before_request
+    def iniciar_traza():
+        peticion = request._get_current_object()
+        regla = peticion.url_rule.rule if peticion.url_rule is not None else 'desconocida'
+        trazas.iniciar_peticion(
+            peticion.headers.get('traceparent'), f"{peticion.method} {regla}", metodo=peticion.method, ruta=peticion.path
+        )
+    
+    @app.after_request
+    def cerrar_traza(response):
+        """Anotar el código de estado y devolver traceparent para poder buscar la traza"""
+        span = span_actual.get()
+        if span is not None and span.muestreado:
+            span.atributos["estado"] = response.status_code
+            response.headers['traceparent'] = span.traceparent()
+        return response
+    
+    @app.teardown_request
+    def terminar_traza(error=None):
+        span = span_actual.get()
+        if span is not None and span.tipo == 'server':
+            trazas.terminar_peticion(span)
@@ -1,69 +1,117 @@
-from flask import Flask, jsonify, request, render_template
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
+from flask import Flask, jsonify, request, g, has_request_context, render_template, Response
+from flask_jwt_extended import jwt_required, create_access_token
 from dotenv import load_dotenv
 from functools import wraps
 import os
+import sys
+import atexit
+import contextvars
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# Código compartido por los microservicios (microservicios/comun)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from comun.logs import Logs
+from comun.metricas import (
+    CONTENT_TYPE_METRICAS, Metricas, MetricasProcesos, series_cache, valores_metricas, exponer_metricas,
+    medir_peticiones
+)
+from comun.autenticacion import Autenticacion, VerificadorJWT
+from comun.peticiones import acepta_ndjson
+from comun.servidor import lanzar_gunicorn
+from comun.salud import MonitorSalud
+from comun.trazas import Trazas, trazar_peticiones
+from comun.resiliencia import limitar_plazo, LlamadaRechazada, ClienteHTTP, series_circuitos, series_pools
 
 # Cargar variables de entorno
 load_dotenv('config.env')
 
+# Configuración, tabla de rutas, cache de respuestas y cuerpos de respuesta
+# compartidos con el gateway asíncrono (app_async.py); importarlo no crea nada
+from compartido import (
+    SERVICIO, SERVER_MODE, API_KEY, AUTH_REQUIRED, CACHE_JWT_MAX, SECRETO_INTERNO, TOKEN_INTERNO_TTL,
+    LOG_LEVEL, LOG_MUESTREO_DEBUG, LOG_COLA_MAX, METRICAS_DIR, METRICAS_INTERVALO,
+    TRAZAS_MUESTREO, TRAZAS_MAX_SPANS, TRAZAS_ARCHIVO, TRAZAS_ARCHIVO_MAX_MB, ADMIN_USER, ADMIN_PASSWORD,
+    USUARIO_SERVICE_URL, PEDIDO_SERVICE_URL, USUARIO_SERVICE_POOL_SIZE, PEDIDO_SERVICE_POOL_SIZE,
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HEALTH_INTERVALO, HEALTH_TIMEOUT, FANOUT_WORKERS,
+    configurar_jwt, DEFINICION_METRICAS, plazo_maximo, circuito_hacia, presupuesto_reintentos,
+    RUTAS_CACHEABLES, RespuestaMicroservicio, etag_coincide, crear_cache_respuestas, series_cache_respuestas,
+    DEPENDENCIAS_CACHE, informacion_gateway, resumen_salud, componer_dashboard, etag_dashboard,
+    trace_id_valido, desglose_traza, RUTAS_PROXY, URLS_SERVICIOS, HEADERS_REENVIADOS
+)
+
+# Con SERVER_MODE=production `python app.py` solo lanza gunicorn, antes de crear la base de
+# datos, los logs, las trazas o las métricas: los crea cada worker al importar este módulo
+if __name__ == "__main__" and SERVER_MODE == 'production':
+    lanzar_gunicorn('app:app')
+
 app = Flask(__name__)
 
 # Configuración de JWT
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET', 'fallback_secret_key')
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'fallback_secret')
-jwt = JWTManager(app)
+jwt = configurar_jwt(app)
+
+# ===== LOGS =====
+# Logs estructurados del servicio (comun/logs.py)
+
+logs = Logs(SERVICIO, LOG_LEVEL, LOG_MUESTREO_DEBUG, LOG_COLA_MAX, sys.stdout)
+atexit.register(logs.detener)
+
+# ===== MÉTRICAS =====
+# Métricas de Prometheus en GET /metrics (comun/metricas.py), definidas en compartido.py
+
+metricas = Metricas(DEFINICION_METRICAS)
+metricas.registrar_colector('logs', lambda: [("log_events_dropped_total", (), logs.descartados)])
+metricas_procesos = MetricasProcesos(metricas, METRICAS_DIR, METRICAS_INTERVALO, logs) if METRICAS_DIR else None
+if metricas_procesos is not None:
+    metricas_procesos.iniciar()
+medir_peticiones(app, metricas)
+
+# ===== TRAZAS =====
+# Trazas distribuidas con W3C Trace Context (comun/trazas.py)
 
-# Variables de configuración
-API_KEY = os.getenv('API_KEY')
-AUTH_REQUIRED = os.getenv('AUTH_REQUIRED', 'False').lower() == 'true'
-ADMIN_USER = os.getenv('ADMIN_USER', 'admin')
-ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin123')
+trazas = Trazas(SERVICIO, TRAZAS_MUESTREO, TRAZAS_MAX_SPANS, TRAZAS_ARCHIVO, TRAZAS_ARCHIVO_MAX_MB * 1024 * 1024, logs)
+trazar_peticiones(app, trazas)
 
-# URLs de los microservicios
-USUARIO_SERVICE_URL = os.getenv('USUARIO_SERVICE_URL', 'http://localhost:5004')
-PEDIDO_SERVICE_URL = os.getenv('PEDIDO_SERVICE_URL', 'http://localhost:5005')
+# ===== RESILIENCIA =====
+# Plazo de cada petición, circuit breaker y reintentos de las llamadas a los
+# microservicios (comun/resiliencia.py)
+
+limitar_plazo(app, plazo_maximo)
 
 # ===== FUNCIONES DE AUTENTICACIÓN =====
+# API key, llamadas internas firmadas y JWT: ver comun/autenticacion.py
+
+verificador_jwt = VerificadorJWT(app, CACHE_JWT_MAX, logs)
+metricas.registrar_colector('jwt', lambda: series_cache("jwt_cache", verificador_jwt.cache.estadisticas()))
+autenticacion = Autenticacion(SERVICIO, API_KEY, SECRETO_INTERNO, TOKEN_INTERNO_TTL, verificador_jwt, logs, llamadas_internas=False)
 
-def verificar_api_key():
-    """Verificar API key en headers"""
+def headers_llamada_interna(destino, identidad=None):
+    """Headers para llamar a otro microservicio en nombre de la identidad de la petición actual"""
     if not AUTH_REQUIRED:
-        return True
-    
-    api_key = request.headers.get('X-API-Key')
-    return api_key == API_KEY
+        return {}
+    if identidad is None and has_request_context():
+        identidad = g.get('identidad')
+    return autenticacion.headers_llamada_interna(destino, identidad)
 
 def verificar_autenticacion():
-    """Verificar autenticación (API key o JWT)"""
+    """Verificar autenticación (API key o JWT) y guardar la identidad en g.identidad"""
     if not AUTH_REQUIRED:
         return True
     
-    # Verificar API key
-    if verificar_api_key():
-        print("✅ [GATEWAY] Autenticación exitosa con API Key")
-        return True
-    
-    # Verificar JWT token
-    try:
-        from flask_jwt_extended import verify_jwt_in_request
-        verify_jwt_in_request()
-        identity = get_jwt_identity()
-        if identity:
-            print(f"✅ [GATEWAY] Autenticación exitosa con JWT para usuario: {identity}")
-            return True
-    except Exception as e:
-        print(f"❌ [GATEWAY] Error en autenticación JWT: {e}")
-    
-    print("❌ [GATEWAY] Autenticación fallida")
-    return False
+    identidad = autenticacion.identidad_peticion(request.headers, request.path)
+    if identidad is None:
+        return False
+    g.identidad = identidad
+    return True
 
 def requiere_autenticacion(f):
     """Decorador para requerir autenticación en endpoints"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not verificar_autenticacion():
+        with trazas.span("autenticacion"):
+            autenticado = verificar_autenticacion()
+        if not autenticado:
             return jsonify({
                 'error': 'No autorizado',
                 'mensaje': 'Se requiere autenticación válida (API Key o JWT Token)',
@@ -75,10 +123,29 @@ def requiere_autenticacion(f):
 
 # ===== FUNCIONES DE COMUNICACIÓN CON MICROSERVICIOS =====
 
-def hacer_peticion_microservicio(service_url, endpoint, method='GET', data=None, headers=None):
-    """Hacer petición a un microservicio"""
+def cliente_http(nombre, base_url, pool_size):
+    """Cliente con pool de conexiones keep-alive, circuito y presupuesto de reintentos hacia un microservicio"""
+    return ClienteHTTP(nombre, base_url, pool_size, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+                       circuito_hacia(nombre, metricas, logs), presupuesto_reintentos(), metricas, trazas)
+
+# Un cliente (y un pool) por microservicio, indexado por su URL base
+clientes_http = {
+    USUARIO_SERVICE_URL: cliente_http('usuario-service', USUARIO_SERVICE_URL, USUARIO_SERVICE_POOL_SIZE),
+    PEDIDO_SERVICE_URL: cliente_http('pedido-service', PEDIDO_SERVICE_URL, PEDIDO_SERVICE_POOL_SIZE)
+}
+
+metricas.registrar_colector('pools', lambda: series_pools(clientes_http.values()))
+metricas.registrar_colector('circuitos', lambda: series_circuitos(c.circuito for c in clientes_http.values()))
+
+def hacer_peticion_microservicio(service_url, endpoint, method='GET', data=None, headers=None, stream=False, body=None,
+                                 identidad=None):
+    """Hacer petición a un microservicio (data se envía como JSON, body tal cual).
+    
+    La llamada se firma en nombre de identidad (por defecto, la de la petición actual).
+    """
     try:
         url = f"{service_url}{endpoint}"
+        cliente = clientes_http[service_url]
         
         # Preparar headers
         request_headers = {}
@@ -86,138 +153,129 @@ def hacer_peticion_microservicio(service_url, endpoint, method='GET', data=None,
             request_headers.update(headers)
         
         # Agregar autenticación si es requerida
-        if AUTH_REQUIRED and API_KEY:
-            request_headers['X-API-Key'] = API_KEY
-        
-        print(f"🔄 [GATEWAY] Enviando {method} a {url}")
+        request_headers.update(headers_llamada_interna(cliente.nombre, identidad))
         
-        if method == 'GET':
-            response = requests.get(url, headers=request_headers, timeout=10)
-        elif method == 'POST':
-            response = requests.post(url, json=data, headers=request_headers, timeout=10)
-        elif method == 'PUT':
-            response = requests.put(url, json=data, headers=request_headers, timeout=10)
-        elif method == 'DELETE':
-            response = requests.delete(url, headers=request_headers, timeout=10)
+        if data is not None:
+            response = cliente.request(method, endpoint, json=data, headers=request_headers, stream=stream)
+        else:
+            response = cliente.request(method, endpoint, data=body or None, headers=request_headers, stream=stream)
         
-        print(f"📡 [GATEWAY] Respuesta de {service_url}: {response.status_code}")
+        logs.debug_muestreado("Respuesta de microservicio", metodo=method, url=url, estado=response.status_code)
         return response
         
+    except LlamadaRechazada as e:
+        logs.debug_muestreado("Llamada al microservicio rechazada", url=url, motivo=e.motivo)
+        return None
     except requests.exceptions.RequestException as e:
-        print(f"❌ [GATEWAY] Error comunicándose con {service_url}: {e}")
+        logs.error("Error comunicándose con el microservicio", url=url, error=str(e))
         return None
 
-def verificar_salud_servicios():
-    """Verificar el estado de todos los microservicios"""
-    servicios_status = {}
+def con_query_string(endpoint):
+    """Añadir al endpoint la query string original sin modificarla"""
+    query_string = request.query_string.decode('utf-8')
+    return f"{endpoint}?{query_string}" if query_string else endpoint
+
+# Pool de hilos compartido para peticiones en paralelo (fan-out)
+executor_fanout = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+
+def ejecutar_en_paralelo(tareas):
+    """Ejecutar varias funciones sin argumentos en paralelo y devolver sus resultados en orden.
     
-    # Verificar usuario-service
-    try:
-        response = requests.get(f"{USUARIO_SERVICE_URL}/health", timeout=5)
-        servicios_status['usuario-service'] = {
-            'estado': 'healthy' if response.status_code == 200 else 'unhealthy',
-            'url': USUARIO_SERVICE_URL,
-            'codigo': response.status_code
-        }
-    except:
-        servicios_status['usuario-service'] = {
-            'estado': 'unreachable',
-            'url': USUARIO_SERVICE_URL,
-            'error': 'No se pudo conectar'
-        }
+    La latencia total es la de la tarea más lenta en lugar de la suma de todas.
+    Cada tarea corre con una copia del contexto, así que sigue en la traza en curso.
+    """
+    futuros = [executor_fanout.submit(contextvars.copy_context().run, tarea) for tarea in tareas]
+    return [futuro.result() for futuro in futuros]
+
+monitor_salud = MonitorSalud(list(clientes_http.values()), HEALTH_INTERVALO, HEALTH_TIMEOUT, logs)
+
+def verificar_salud_servicios():
+    """Estado de todos los microservicios según el último sondeo del monitor"""
+    return monitor_salud.snapshot()
+
+# ===== CACHE DE RESPUESTAS =====
+# Los GET de /usuarios y /pedidos (también las dos partes de /dashboard) se sirven
+# de la cache de respuestas de compartido.py, invalidada por cada escritura.
+
+cache_respuestas = crear_cache_respuestas()
+metricas.registrar_colector('cache_respuestas', lambda: series_cache_respuestas(cache_respuestas))
+
+def consultar_con_cache(servicio, endpoint, identidad, accept=None):
+    """GET a un microservicio, de la cache si la respuesta guardada sigue al día.
     
-    # Verificar pedido-service
-    try:
-        response = requests.get(f"{PEDIDO_SERVICE_URL}/health", timeout=5)
-        servicios_status['pedido-service'] = {
-            'estado': 'healthy' if response.status_code == 200 else 'unhealthy',
-            'url': PEDIDO_SERVICE_URL,
-            'codigo': response.status_code
-        }
-    except:
-        servicios_status['pedido-service'] = {
-            'estado': 'unreachable',
-            'url': PEDIDO_SERVICE_URL,
-            'error': 'No se pudo conectar'
-        }
+    Devuelve (RespuestaMicroservicio, de_cache), o (None, False) si el
+    microservicio no respondió. Solo se guardan las respuestas 200.
+    """
+    clave = (endpoint, accept, identidad)
+    respuesta = cache_respuestas.obtener(clave, servicio)
+    if respuesta is not None:
+        return respuesta, True
     
-    return servicios_status
+    generacion = cache_respuestas.generacion(servicio)
+    response = hacer_peticion_microservicio(URLS_SERVICIOS[servicio], endpoint,
+                                            headers={'Accept': accept} if accept else None, identidad=identidad)
+    if response is None:
+        return None, False
+    respuesta = RespuestaMicroservicio(response.status_code, response.headers.get('Content-Type', 'application/json'),
+                                       response.content)
+    if respuesta.codigo == 200:
+        cache_respuestas.guardar(clave, generacion, respuesta)
+    return respuesta, False
 
 # ===== RUTAS DEL GATEWAY =====
 
 @app.route("/", methods=["GET"])
 def index():
     """Página principal con información de la arquitectura de microservicios"""
-    servicios_status = verificar_salud_servicios()
-    
-    return jsonify({
-        "mensaje": "Gateway API - Arquitectura de Microservicios",
-        "arquitectura": "microservicios",
-        "gateway": {
-            "puerto": os.getenv('PORT', 5003),
-            "version": "1.0.0"
-        },
-        "microservicios": {
-            "usuario-service": {
-                "url": USUARIO_SERVICE_URL,
-                "descripcion": "Gestión de usuarios",
-                "endpoints": [
-                    "GET /usuarios - Obtener todos los usuarios",
-                    "GET /usuarios/{id} - Obtener usuario por ID",
-                    "POST /usuarios - Crear nuevo usuario",
-                    "PUT /usuarios/{id} - Actualizar usuario",
-                    "DELETE /usuarios/{id} - Eliminar usuario"
-                ]
-            },
-            "pedido-service": {
-                "url": PEDIDO_SERVICE_URL,
-                "descripcion": "Gestión de pedidos",
-                "endpoints": [
-                    "GET /pedidos - Obtener todos los pedidos",
-                    "GET /pedidos/{id} - Obtener pedido por ID",
-                    "POST /pedidos - Crear nuevo pedido",
-                    "PUT /pedidos/{id} - Actualizar pedido",
-                    "DELETE /pedidos/{id} - Eliminar pedido"
-                ]
-            }
-        },
-        "estado_servicios": servicios_status,
-        "autenticacion_requerida": AUTH_REQUIRED,
-        "autenticacion": {
-            "metodos": [
-                "API Key: Agregar header 'X-API-Key' con tu API key",
-                "JWT Token: Usar el token obtenido del endpoint /login"
-            ]
-        },
-        "diferencias_monolitico": {
-            "ventajas_microservicios": [
-                "Servicios independientes y escalables",
-                "Comunicación HTTP entre servicios",
-                "Despliegue independiente",
-                "Tecnologías diferentes por servicio",
-                "Falla aislada por servicio"
-            ],
-            "comunicacion": "HTTP REST entre microservicios"
-        }
-    })
+    return jsonify(informacion_gateway(verificar_salud_servicios()))
 
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check del gateway y todos los servicios"""
-    servicios_status = verificar_salud_servicios()
+    return jsonify(resumen_salud(verificar_salud_servicios()))
+
+@app.route("/pool", methods=["GET"])
+@requiere_autenticacion
+def estadisticas_pool():
+    """Estadísticas de los pools de conexiones hacia los microservicios"""
+    return jsonify({
+        "pools": {cliente.nombre: cliente.estadisticas() for cliente in clientes_http.values()},
+        "servicio": "gateway-service"
+    })
+
+@app.route("/cache/respuestas", methods=["GET"])
+@requiere_autenticacion
+def estadisticas_cache_respuestas():
+    """Estadísticas de la cache de respuestas de este worker"""
+    return jsonify({"cache_respuestas": cache_respuestas.estadisticas(), "servicio": "gateway-service"})
+
+@app.route("/cache/respuestas/invalidar", methods=["POST"])
+@requiere_autenticacion
+def invalidar_cache_respuestas():
+    """Invalidar las respuestas de los microservicios indicados (o de todos) tras escribir en ellos directamente"""
+    datos = request.get_json(silent=True)
+    servicios = datos.get("servicios", list(DEPENDENCIAS_CACHE)) if isinstance(datos, dict) else list(DEPENDENCIAS_CACHE)
     
-    all_healthy = all(
-        status.get('estado') == 'healthy' 
-        for status in servicios_status.values()
-    )
+    if not isinstance(servicios, list) or any(not isinstance(servicio, str) or servicio not in DEPENDENCIAS_CACHE for servicio in servicios):
+        return jsonify({
+            "error": f"El campo 'servicios' debe ser una lista con algunos de: {', '.join(DEPENDENCIAS_CACHE)}",
+            "servicio": "gateway-service"
+        }), 400
     
+    for servicio in servicios:
+        cache_respuestas.invalidar(servicio)
+    logs.info("Cache de respuestas invalidada", servicios=servicios)
     return jsonify({
-        "gateway": "healthy",
-        "timestamp": str(os.popen('date').read().strip()),
-        "microservicios": servicios_status,
-        "overall_status": "healthy" if all_healthy else "degraded"
+        "invalidados": servicios,
+        "servicio": "gateway-service"
     })
 
+@app.route("/metrics", methods=["GET"])
+def exponer_metricas_prometheus():
+    """Métricas en el formato de texto de Prometheus (de todos los workers)"""
+    valores = valores_metricas(metricas, metricas_procesos)
+    return Response(exponer_metricas(valores, DEFINICION_METRICAS), content_type=CONTENT_TYPE_METRICAS)
+
 @app.route("/login", methods=["POST"])
 def login():
     """Endpoint para autenticación centralizada"""
@@ -225,210 +283,159 @@ def login():
     username = data.get('username')
     password = data.get('password')
     
-    print(f"🔐 [GATEWAY] Intento de login para usuario: {username}")
-    
     if username == ADMIN_USER and password == ADMIN_PASSWORD:
         access_token = create_access_token(identity=username)
-        print(f"✅ [GATEWAY] Login exitoso para: {username}")
+        logs.info("Login exitoso", usuario=username)
         return jsonify({
             'access_token': access_token,
             'message': 'Login exitoso',
             'servicio': 'gateway-service'
         }), 200
     else:
-        print(f"❌ [GATEWAY] Login fallido para: {username}")
+        logs.warning("Login fallido", usuario=username)
         return jsonify({'error': 'Credenciales inválidas'}), 401
 
-# ===== PROXY A MICROSERVICIO DE USUARIOS =====
+# ===== PROXY A MICROSERVICIOS =====
+# Rutas de RUTAS_PROXY (compartido.py)
 
-@app.route("/usuarios", methods=["GET"])
-@requiere_autenticacion
-def proxy_obtener_usuarios():
-    """Proxy para obtener usuarios desde usuario-service"""
-    print("🔄 [GATEWAY] Proxy: Obteniendo usuarios desde usuario-service")
-    response = hacer_peticion_microservicio(USUARIO_SERVICE_URL, "/usuarios")
+def proxy_microservicio(servicio, **kwargs):
+    """Reenviar la petición al microservicio y devolver su respuesta sin parsearla.
     
-    if response and response.status_code == 200:
-        data = response.json()
-        data['gateway'] = True
-        data['microservicio_original'] = 'usuario-service'
-        return jsonify(data), 200
-    else:
-        return jsonify({
-            'error': 'Error comunicándose con usuario-service',
-            'gateway': True
-        }), 503
-
-@app.route("/usuarios/<int:id_usuario>", methods=["GET"])
-@requiere_autenticacion
-def proxy_obtener_usuario(id_usuario):
-    """Proxy para obtener usuario específico desde usuario-service"""
-    print(f"🔄 [GATEWAY] Proxy: Obteniendo usuario {id_usuario} desde usuario-service")
-    response = hacer_peticion_microservicio(USUARIO_SERVICE_URL, f"/usuarios/{id_usuario}")
+    El cuerpo de la petición y el de la respuesta viajan como bytes; los
+    metadatos del gateway se añaden como headers (X-Gateway, X-Upstream-Service).
+    """
+    endpoint = con_query_string(request.path)
+    logs.debug_muestreado("Proxy", metodo=request.method, endpoint=endpoint, destino=servicio)
     
-    if response:
-        if response.status_code == 200:
-            data = response.json()
-            data['gateway'] = True
-            data['microservicio_original'] = 'usuario-service'
-            return jsonify(data), 200
-        else:
-            return jsonify(response.json()), response.status_code
-    else:
-        return jsonify({
-            'error': 'Error comunicándose con usuario-service',
-            'gateway': True
-        }), 503
-
-@app.route("/usuarios", methods=["POST"])
-@requiere_autenticacion
-def proxy_crear_usuario():
-    """Proxy para crear usuario en usuario-service"""
-    data = request.get_json()
-    print(f"🔄 [GATEWAY] Proxy: Creando usuario en usuario-service")
-    response = hacer_peticion_microservicio(USUARIO_SERVICE_URL, "/usuarios", 'POST', data)
+    headers = {h: request.headers[h] for h in HEADERS_REENVIADOS if h in request.headers}
+    streaming = request.method == 'GET' and acepta_ndjson(request)
+    if request.endpoint in RUTAS_CACHEABLES and not streaming:
+        return proxy_cacheado(servicio, endpoint, headers.get('Accept'))
     
-    if response:
-        response_data = response.json()
-        response_data['gateway'] = True
-        response_data['microservicio_original'] = 'usuario-service'
-        return jsonify(response_data), response.status_code
-    else:
-        return jsonify({
-            'error': 'Error comunicándose con usuario-service',
-            'gateway': True
-        }), 503
-
-@app.route("/usuarios/<int:id_usuario>", methods=["PUT"])
-@requiere_autenticacion
-def proxy_actualizar_usuario(id_usuario):
-    """Proxy para actualizar usuario en usuario-service"""
-    data = request.get_json()
-    print(f"🔄 [GATEWAY] Proxy: Actualizando usuario {id_usuario} en usuario-service")
-    response = hacer_peticion_microservicio(USUARIO_SERVICE_URL, f"/usuarios/{id_usuario}", 'PUT', data)
+    response = hacer_peticion_microservicio(URLS_SERVICIOS[servicio], endpoint, request.method,
+                                            headers=headers, stream=streaming, body=request.get_data())
+    if request.method != 'GET':
+        cache_respuestas.invalidar(servicio)  # también si falló: la escritura pudo llegar a aplicarse
     
-    if response:
-        response_data = response.json()
-        response_data['gateway'] = True
-        response_data['microservicio_original'] = 'usuario-service'
-        return jsonify(response_data), response.status_code
-    else:
+    if response is None:
         return jsonify({
-            'error': 'Error comunicándose con usuario-service',
+            'error': f'Error comunicándose con {servicio}',
             'gateway': True
         }), 503
-
-@app.route("/usuarios/<int:id_usuario>", methods=["DELETE"])
-@requiere_autenticacion
-def proxy_eliminar_usuario(id_usuario):
-    """Proxy para eliminar usuario en usuario-service"""
-    print(f"🔄 [GATEWAY] Proxy: Eliminando usuario {id_usuario} en usuario-service")
-    response = hacer_peticion_microservicio(USUARIO_SERVICE_URL, f"/usuarios/{id_usuario}", 'DELETE')
     
-    if response:
-        response_data = response.json()
-        response_data['gateway'] = True
-        response_data['microservicio_original'] = 'usuario-service'
-        return jsonify(response_data), response.status_code
-    else:
+    headers_gateway = {'X-Gateway': 'true', 'X-Upstream-Service': servicio}
+    content_type = response.headers.get('Content-Type', 'application/json')
+    
+    if streaming:
+        def relay():
+            try:
+                for chunk in response.iter_content(chunk_size=None):
+                    yield chunk
+            finally:
+                response.close()
+        return Response(relay(), status=response.status_code, content_type=content_type, headers=headers_gateway)
+    
+    return Response(response.content, status=response.status_code, content_type=content_type, headers=headers_gateway)
+
+def proxy_cacheado(servicio, endpoint, accept):
+    """GET servido de la cache de respuestas, con ETag (304 si el cliente ya tiene esa versión)"""
+    respuesta, de_cache = consultar_con_cache(servicio, endpoint, g.get('identidad'), accept)
+    if respuesta is None:
         return jsonify({
-            'error': 'Error comunicándose con usuario-service',
+            'error': f'Error comunicándose con {servicio}',
             'gateway': True
         }), 503
+    
+    headers_gateway = {'X-Gateway': 'true', 'X-Upstream-Service': servicio, 'X-Cache': 'HIT' if de_cache else 'MISS'}
+    if respuesta.etag is not None:
+        headers_gateway['ETag'] = respuesta.etag
+        if etag_coincide(request.headers.get('If-None-Match'), respuesta.etag):
+            metricas.sumar("response_cache_not_modified_total")
+            return Response(status=304, headers=headers_gateway)
+    return Response(respuesta.cuerpo, status=respuesta.codigo, content_type=respuesta.content_type,
+                    headers=headers_gateway)
 
-# ===== PROXY A MICROSERVICIO DE PEDIDOS =====
+for nombre, regla, metodo, servicio in RUTAS_PROXY:
+    app.add_url_rule(regla, endpoint=nombre, view_func=requiere_autenticacion(proxy_microservicio),
+                     methods=[metodo], defaults={'servicio': servicio})
 
-@app.route("/pedidos", methods=["GET"])
-@requiere_autenticacion
-def proxy_obtener_pedidos():
-    """Proxy para obtener pedidos desde pedido-service"""
-    print("🔄 [GATEWAY] Proxy: Obteniendo pedidos desde pedido-service")
-    response = hacer_peticion_microservicio(PEDIDO_SERVICE_URL, "/pedidos")
-    
-    if response and response.status_code == 200:
-        data = response.json()
-        data['gateway'] = True
-        data['microservicio_original'] = 'pedido-service'
-        return jsonify(data), 200
-    else:
-        return jsonify({
-            'error': 'Error comunicándose con pedido-service',
-            'gateway': True
-        }), 503
+# ===== ENDPOINTS COMPUESTOS =====
 
-@app.route("/pedidos/<int:id_pedido>", methods=["GET"])
+@app.route("/trazas", methods=["GET"])
 @requiere_autenticacion
-def proxy_obtener_pedido(id_pedido):
-    """Proxy para obtener pedido específico desde pedido-service"""
-    print(f"🔄 [GATEWAY] Proxy: Obteniendo pedido {id_pedido} desde pedido-service")
-    response = hacer_peticion_microservicio(PEDIDO_SERVICE_URL, f"/pedidos/{id_pedido}")
-    
-    if response:
-        response_data = response.json()
-        response_data['gateway'] = True
-        response_data['microservicio_original'] = 'pedido-service'
-        return jsonify(response_data), response.status_code
-    else:
-        return jsonify({
-            'error': 'Error comunicándose con pedido-service',
-            'gateway': True
-        }), 503
+def trazas_lentas():
+    """Peticiones más lentas entre las trazas guardadas en memoria por este worker"""
+    limite = request.args.get('limit', 20, type=int)
+    return jsonify({"peticiones": trazas.peticiones_lentas(limite), "servicio": "gateway-service"})
 
-@app.route("/pedidos", methods=["POST"])
+@app.route("/trazas/<trace_id>", methods=["GET"])
 @requiere_autenticacion
-def proxy_crear_pedido():
-    """Proxy para crear pedido en pedido-service"""
-    data = request.get_json()
-    print(f"🔄 [GATEWAY] Proxy: Creando pedido en pedido-service")
-    response = hacer_peticion_microservicio(PEDIDO_SERVICE_URL, "/pedidos", 'POST', data)
+def obtener_traza(trace_id):
+    """Desglose de una traza con los spans del gateway y de los microservicios"""
+    trace_id = trace_id.lower()
+    if not trace_id_valido(trace_id):
+        return jsonify({'error': 'trace_id debe tener 32 dígitos hexadecimales'}), 400
     
-    if response:
-        response_data = response.json()
-        response_data['gateway'] = True
-        response_data['microservicio_original'] = 'pedido-service'
-        return jsonify(response_data), response.status_code
-    else:
-        return jsonify({
-            'error': 'Error comunicándose con pedido-service',
-            'gateway': True
-        }), 503
-
-@app.route("/pedidos/<int:id_pedido>", methods=["PUT"])
-@requiere_autenticacion
-def proxy_actualizar_pedido(id_pedido):
-    """Proxy para actualizar pedido en pedido-service"""
-    data = request.get_json()
-    print(f"🔄 [GATEWAY] Proxy: Actualizando pedido {id_pedido} en pedido-service")
-    response = hacer_peticion_microservicio(PEDIDO_SERVICE_URL, f"/pedidos/{id_pedido}", 'PUT', data)
+    identidad = g.get('identidad')  # los hilos del fan-out no tienen contexto de petición
     
-    if response:
-        response_data = response.json()
-        response_data['gateway'] = True
-        response_data['microservicio_original'] = 'pedido-service'
-        return jsonify(response_data), response.status_code
-    else:
-        return jsonify({
-            'error': 'Error comunicándose con pedido-service',
-            'gateway': True
-        }), 503
+    def spans_remotos(service_url):
+        response = hacer_peticion_microservicio(service_url, f"/trazas/{trace_id}", identidad=identidad)
+        if response is None or response.status_code != 200:
+            return []
+        return response.json().get("spans", [])
+    
+    remotos = ejecutar_en_paralelo(
+        [lambda url=url: spans_remotos(url) for url in (USUARIO_SERVICE_URL, PEDIDO_SERVICE_URL)]
+    )
+    spans = trazas.buscar(trace_id) + [span for lista in remotos for span in lista]
+    if not spans:
+        return jsonify({'error': 'Traza no encontrada', 'trace_id': trace_id}), 404
+    return jsonify(desglose_traza(trace_id, spans))
 
-@app.route("/pedidos/<int:id_pedido>", methods=["DELETE"])
+@app.route("/dashboard", methods=["GET"])
 @requiere_autenticacion
-def proxy_eliminar_pedido(id_pedido):
-    """Proxy para eliminar pedido en pedido-service"""
-    print(f"🔄 [GATEWAY] Proxy: Eliminando pedido {id_pedido} en pedido-service")
-    response = hacer_peticion_microservicio(PEDIDO_SERVICE_URL, f"/pedidos/{id_pedido}", 'DELETE')
+def dashboard():
+    """Usuarios y pedidos en una sola respuesta, consultando ambos servicios en paralelo.
     
-    if response:
-        response_data = response.json()
-        response_data['gateway'] = True
-        response_data['microservicio_original'] = 'pedido-service'
-        return jsonify(response_data), response.status_code
-    else:
-        return jsonify({
-            'error': 'Error comunicándose con pedido-service',
-            'gateway': True
-        }), 503
+    Las respuestas de los microservicios se insertan tal cual (sin parsearlas)
+    en el JSON compuesto. Los parámetros de la query string se reenvían a ambos.
+    Las partes salen de la cache de respuestas y, si el cliente ya tiene esa
+    versión (If-None-Match), se responde 304 sin componer nada.
+    """
+    partes = [
+        ("usuarios", con_query_string("/usuarios"), 'usuario-service'),
+        ("pedidos", con_query_string("/pedidos"), 'pedido-service')
+    ]
+    
+    identidad = g.get('identidad')  # los hilos del fan-out no tienen contexto de petición
+    
+    def consultar(endpoint, servicio):
+        inicio = time.perf_counter()
+        respuesta, _ = consultar_con_cache(servicio, endpoint, identidad)
+        return respuesta, round((time.perf_counter() - inicio) * 1000, 2)
+    
+    inicio = time.perf_counter()
+    resultados = ejecutar_en_paralelo(
+        [lambda endpoint=endpoint, servicio=servicio: consultar(endpoint, servicio) for _, endpoint, servicio in partes]
+    )
+    total_ms = round((time.perf_counter() - inicio) * 1000, 2)
+    
+    headers = {'X-Gateway': 'true'}
+    etag = etag_dashboard([respuesta for respuesta, _ in resultados])
+    if etag is not None:
+        headers['ETag'] = etag
+        if etag_coincide(request.headers.get('If-None-Match'), etag):
+            metricas.sumar("response_cache_not_modified_total")
+            return Response(status=304, headers=headers)
+    
+    cuerpo = componer_dashboard([
+        (clave, servicio,
+         respuesta.codigo if respuesta is not None else None,
+         respuesta.cuerpo if respuesta is not None else b'',
+         latencia)
+        for (clave, _, servicio), (respuesta, latencia) in zip(partes, resultados)
+    ], total_ms, logs)
+    return Response(cuerpo, status=200, content_type='application/json', headers=headers)
 
 @app.route("/db", methods=["GET"])
 def database_interface():
@@ -437,13 +444,13 @@ def database_interface():
 
 if __name__ == "__main__":
     port = int(os.getenv('PORT', 5003))
-    debug = os.getenv('DEBUG', 'True').lower() == 'true'
+    debug = os.getenv('DEBUG', 'False').lower() == 'true'
     host = os.getenv('HOST', 'localhost')
     
-    print(f"🚀 [GATEWAY] Iniciando Gateway API en {host}:{port}")
-    print(f"🔐 [GATEWAY] Autenticación requerida: {AUTH_REQUIRED}")
-    print(f"🔗 [GATEWAY] Conectando con microservicios:")
-    print(f"   - Usuario Service: {USUARIO_SERVICE_URL}")
-    print(f"   - Pedido Service: {PEDIDO_SERVICE_URL}")
+    logs.info("Iniciando Gateway API", host=host, puerto=port, autenticacion=AUTH_REQUIRED,
+              usuario_service=USUARIO_SERVICE_URL, pedido_service=PEDIDO_SERVICE_URL, modo_servidor=SERVER_MODE)
+    
+    if SERVER_MODE == 'production':
+        logs.warning("gunicorn no está instalado; se usa el servidor de desarrollo de Flask")
     
-    app.run(host=host, port=port, debug=debug)
+    app.run(host=host, port=port, debug=debug, threaded=True)
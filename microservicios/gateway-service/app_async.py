@@ -0,0 +1,659 @@
+"""Gateway API asíncrono (asyncio + aiohttp).
+
+Mismas rutas, autenticación y respuestas que app.py, pero las peticiones a los
+microservicios no bloquean un hilo: un solo proceso mantiene miles de peticiones
+en curso con un pool de conexiones keep-alive por microservicio.
+
+Se arranca con `python app_async.py` (o GATEWAY_MODE=async en start-microservicios.sh).
+"""
+from aiohttp import web
+from dotenv import load_dotenv
+from flask import Flask
+from flask_jwt_extended import create_access_token
+import aiohttp
+import asyncio
+import atexit
+import os
+import re
+import sys
+import time
+
+# Código compartido por los microservicios (microservicios/comun)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from comun.logs import Logs
+from comun.metricas import (
+    CONTENT_TYPE_METRICAS, Metricas, MetricasProcesos, series_cache, valores_metricas, exponer_metricas
+)
+from comun.autenticacion import Autenticacion, VerificadorJWT
+from comun.peticiones import acepta_ndjson
+from comun.servidor import lanzar_gunicorn
+from comun.salud import MonitorSalud
+from comun.trazas import Trazas
+from comun.resiliencia import (
+    HEADER_PLAZO, plazo_peticion, leer_plazo, Intentos, LlamadaRechazada, series_circuitos, series_pools
+)
+
+# Cargar variables de entorno
+load_dotenv('config.env')
+
+# Configuración, tabla de rutas, cache de respuestas y cuerpos de respuesta
+# compartidos con el gateway síncrono (app.py), sin crear nada de app.py
+from compartido import (
+    SERVICIO, SERVER_MODE, API_KEY, AUTH_REQUIRED, CACHE_JWT_MAX, SECRETO_INTERNO, TOKEN_INTERNO_TTL,
+    LOG_LEVEL, LOG_MUESTREO_DEBUG, LOG_COLA_MAX, METRICAS_DIR, METRICAS_INTERVALO,
+    TRAZAS_MUESTREO, TRAZAS_MAX_SPANS, TRAZAS_ARCHIVO, TRAZAS_ARCHIVO_MAX_MB, ADMIN_USER, ADMIN_PASSWORD,
+    USUARIO_SERVICE_URL, PEDIDO_SERVICE_URL, USUARIO_SERVICE_POOL_SIZE, PEDIDO_SERVICE_POOL_SIZE,
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HEALTH_INTERVALO, HEALTH_TIMEOUT,
+    configurar_jwt, DEFINICION_METRICAS, plazo_maximo, circuito_hacia, presupuesto_reintentos,
+    RUTAS_CACHEABLES, RespuestaMicroservicio, etag_coincide, crear_cache_respuestas, series_cache_respuestas,
+    DEPENDENCIAS_CACHE, informacion_gateway, resumen_salud, componer_dashboard, etag_dashboard,
+    trace_id_valido, desglose_traza, RUTAS_PROXY, URLS_SERVICIOS, HEADERS_REENVIADOS
+)
+
+# Con SERVER_MODE=production `python app_async.py` solo lanza gunicorn, antes de crear
+# logs, trazas o clientes HTTP: los crea cada worker al importar este módulo
+if __name__ == "__main__" and SERVER_MODE == 'production':
+    lanzar_gunicorn('app_async:app', '-k', 'aiohttp.GunicornWebWorker')
+
+# ===== LOGS =====
+# Logs estructurados del servicio (comun/logs.py)
+
+logs = Logs(SERVICIO, LOG_LEVEL, LOG_MUESTREO_DEBUG, LOG_COLA_MAX, sys.stdout)
+atexit.register(logs.detener)
+
+# ===== MÉTRICAS =====
+# Mismas métricas que app.py (compartido.py); los middlewares de abajo miden las peticiones
+
+metricas = Metricas(DEFINICION_METRICAS)
+metricas.registrar_colector('logs', lambda: [("log_events_dropped_total", (), logs.descartados)])
+metricas_procesos = MetricasProcesos(metricas, METRICAS_DIR, METRICAS_INTERVALO, logs) if METRICAS_DIR else None
+if metricas_procesos is not None:
+    metricas_procesos.iniciar()
+
+# ===== TRAZAS =====
+# Trazas distribuidas con W3C Trace Context (comun/trazas.py)
+
+trazas = Trazas(SERVICIO, TRAZAS_MUESTREO, TRAZAS_MAX_SPANS, TRAZAS_ARCHIVO, TRAZAS_ARCHIVO_MAX_MB * 1024 * 1024, logs)
+
+# ===== FUNCIONES DE AUTENTICACIÓN =====
+# Misma API key y mismos JWT que app.py (comun/autenticacion.py). La app de Flask
+# solo guarda la configuración de flask_jwt_extended para crear y verificar tokens.
+
+app_jwt = Flask(__name__)
+configurar_jwt(app_jwt)
+
+verificador_jwt = VerificadorJWT(app_jwt, CACHE_JWT_MAX, logs)
+metricas.registrar_colector('jwt', lambda: series_cache("jwt_cache", verificador_jwt.cache.estadisticas()))
+autenticacion = Autenticacion(SERVICIO, API_KEY, SECRETO_INTERNO, TOKEN_INTERNO_TTL, verificador_jwt, logs, llamadas_internas=False)
+
+def headers_llamada_interna(destino, identidad):
+    """Headers para llamar a otro microservicio en nombre de identidad"""
+    if not AUTH_REQUIRED:
+        return {}
+    return autenticacion.headers_llamada_interna(destino, identidad)
+
+def verificar_autenticacion(request):
+    """Verificar autenticación (API key o JWT) y guardar la identidad en request['identidad']"""
+    if not AUTH_REQUIRED:
+        return True
+
+    identidad = autenticacion.identidad_peticion(request.headers, request.path)
+    if identidad is None:
+        return False
+    request['identidad'] = identidad
+    return True
+
+def requiere_autenticacion(handler):
+    """Decorador para requerir autenticación en endpoints"""
+    async def decorated_handler(request):
+        with trazas.span("autenticacion"):
+            autenticado = verificar_autenticacion(request)
+        if not autenticado:
+            return web.json_response({
+                'error': 'No autorizado',
+                'mensaje': 'Se requiere autenticación válida (API Key o JWT Token)',
+                'codigo': 401,
+                'servicio': 'gateway-service'
+            }, status=401)
+        return await handler(request)
+    return decorated_handler
+
+# ===== FUNCIONES DE COMUNICACIÓN CON MICROSERVICIOS =====
+# Mismo plazo, circuit breaker y presupuesto de reintentos que app.py
+
+class ClienteHTTPAsync:
+    """Cliente HTTP asíncrono con pool de conexiones keep-alive hacia un microservicio.
+
+    Como ClienteHTTP de comun/resiliencia.py, cada llamada pasa por circuito y
+    presupuesto (comun.resiliencia.Intentos) y se mide en metricas y trazas.
+    """
+
+    def __init__(self, nombre, base_url, pool_size, connect_timeout, read_timeout, circuito, presupuesto, metricas,
+                 trazas):
+        self.nombre = nombre
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session = None
+        self.peticiones = 0
+        self.circuito = circuito
+        self.presupuesto = presupuesto
+        self.metricas = metricas
+        self.trazas = trazas
+
+    async def abrir(self):
+        """Crear la sesión (debe hacerse dentro del bucle de eventos)"""
+        conector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+        timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+        self.session = aiohttp.ClientSession(connector=conector, timeout=timeout)
+
+    async def cerrar(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def request(self, method, endpoint, **kwargs):
+        """Enviar una petición dentro del plazo y del circuito, reintentando los GET que fallan.
+
+        Lanza LlamadaRechazada sin enviar nada si el circuito está abierto o ya no
+        queda plazo; si no, la excepción o la respuesta (abierta) del último intento.
+        El timeout total de cada intento es lo que queda del plazo, lectura del cuerpo incluida.
+        """
+        headers = kwargs.pop('headers', None) or {}
+        intentos = Intentos(self.nombre, self.circuito, self.presupuesto, method)
+        while True:
+            restante, headers_intento = intentos.siguiente(headers)
+            if restante is not None:
+                kwargs['timeout'] = aiohttp.ClientTimeout(total=restante,
+                                                          sock_connect=min(self.connect_timeout, restante),
+                                                          sock_read=min(self.read_timeout, restante))
+            try:
+                response = await self.enviar(method, endpoint, headers=headers_intento, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                espera = intentos.fallo()
+                if espera is None:
+                    raise
+            else:
+                espera = intentos.respuesta(response.status)
+                if espera is None:
+                    return response
+                response.release()
+            await asyncio.sleep(espera)
+
+    async def enviar(self, method, endpoint, **kwargs):
+        """Un solo intento reutilizando conexiones del pool (la respuesta queda abierta)"""
+        self.peticiones += 1
+        inicio = time.perf_counter()
+        with self.trazas.span(f"{method} {self.nombre}", tipo='client', endpoint=endpoint) as span:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **self.trazas.headers()}
+            try:
+                response = await self.session.request(method, f"{self.base_url}{endpoint}", **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.metricas.registrar_llamada(self.nombre, inicio, error=e)
+                raise
+            self.metricas.registrar_llamada(self.nombre, inicio, codigo=response.status)
+            if span is not None:
+                span.atributos["estado"] = response.status
+        return response
+
+    def estadisticas(self):
+        """Conexiones en uso, inactivas y abiertas en el pool"""
+        conector = self.session.connector if self.session is not None else None
+        en_uso = len(getattr(conector, '_acquired', ()))
+        inactivas = sum(len(conexiones) for conexiones in getattr(conector, '_conns', {}).values())
+        return {
+            "url": self.base_url,
+            "pool_size": self.pool_size,
+            "en_uso": en_uso,
+            "inactivas": inactivas,
+            "conexiones_abiertas": en_uso + inactivas,
+            "peticiones": self.peticiones,
+            "timeout_conexion": self.connect_timeout,
+            "timeout_lectura": self.read_timeout,
+            "circuito": self.circuito.estado
+        }
+
+def cliente_http(nombre, base_url, pool_size):
+    """Cliente con pool de conexiones keep-alive, circuito y presupuesto de reintentos hacia un microservicio"""
+    return ClienteHTTPAsync(nombre, base_url, pool_size, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+                            circuito_hacia(nombre, metricas, logs), presupuesto_reintentos(), metricas, trazas)
+
+# Un cliente (y un pool) por microservicio, indexado por su URL base
+clientes_http = {
+    USUARIO_SERVICE_URL: cliente_http('usuario-service', USUARIO_SERVICE_URL, USUARIO_SERVICE_POOL_SIZE),
+    PEDIDO_SERVICE_URL: cliente_http('pedido-service', PEDIDO_SERVICE_URL, PEDIDO_SERVICE_POOL_SIZE)
+}
+
+metricas.registrar_colector('pools', lambda: series_pools(clientes_http.values()))
+metricas.registrar_colector('circuitos', lambda: series_circuitos(c.circuito for c in clientes_http.values()))
+
+async def hacer_peticion_microservicio(service_url, endpoint, method='GET', headers=None, body=None, identidad=None):
+    """Hacer petición a un microservicio en nombre de identidad; el cuerpo se envía tal cual.
+
+    Devuelve la respuesta sin leer (quien llama la lee o la reenvía en streaming y la libera).
+    """
+    try:
+        url = f"{service_url}{endpoint}"
+        cliente = clientes_http[service_url]
+
+        # Preparar headers
+        request_headers = {}
+        if headers:
+            request_headers.update(headers)
+
+        # Agregar autenticación si es requerida
+        request_headers.update(headers_llamada_interna(cliente.nombre, identidad))
+
+        response = await cliente.request(method, endpoint, data=body or None, headers=request_headers)
+        logs.debug_muestreado("Respuesta de microservicio", metodo=method, url=url, estado=response.status)
+        return response
+
+    except LlamadaRechazada as e:
+        logs.debug_muestreado("Llamada al microservicio rechazada", url=url, motivo=e.motivo)
+        return None
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logs.error("Error comunicándose con el microservicio", url=url, error=str(e))
+        return None
+
+# ===== CACHE DE RESPUESTAS =====
+# La de compartido.py, como en app.py: GET de /usuarios y /pedidos, invalidada por cada escritura
+
+cache_respuestas = crear_cache_respuestas()
+metricas.registrar_colector('cache_respuestas', lambda: series_cache_respuestas(cache_respuestas))
+
+async def consultar_con_cache(servicio, endpoint, identidad, accept=None):
+    """GET a un microservicio, de la cache si la respuesta guardada sigue al día (como en app.py).
+
+    Devuelve (RespuestaMicroservicio, de_cache), o (None, False) si el
+    microservicio no respondió. Solo se guardan las respuestas 200.
+    """
+    clave = (endpoint, accept, identidad)
+    respuesta = cache_respuestas.obtener(clave, servicio)
+    if respuesta is not None:
+        return respuesta, True
+
+    generacion = cache_respuestas.generacion(servicio)
+    response = await hacer_peticion_microservicio(URLS_SERVICIOS[servicio], endpoint,
+                                                  headers={'Accept': accept} if accept else None, identidad=identidad)
+    if response is None:
+        return None, False
+    try:
+        cuerpo = await response.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None, False
+    finally:
+        response.release()
+    respuesta = RespuestaMicroservicio(response.status, response.headers.get('Content-Type', 'application/json'), cuerpo)
+    if respuesta.codigo == 200:
+        cache_respuestas.guardar(clave, generacion, respuesta)
+    return respuesta, False
+
+def con_query_string(request, endpoint):
+    """Añadir al endpoint la query string original sin modificarla"""
+    query_string = request.rel_url.raw_query_string
+    return f"{endpoint}?{query_string}" if query_string else endpoint
+
+class MonitorSaludAsync:
+    """comun.salud.MonitorSalud con los sondeos en una tarea de asyncio en lugar de un hilo.
+
+    El estado, su formato y el ultimo_healthy de cada microservicio son los del
+    monitor envuelto; aquí solo cambia cómo se envía cada GET /health.
+    """
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+        self._tarea = None
+
+    async def iniciar(self):
+        """Primer sondeo y arranque de la tarea de monitorización"""
+        await self.sondear()
+        self._tarea = asyncio.create_task(self._bucle())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+
+    async def _bucle(self):
+        while True:
+            await asyncio.sleep(self.monitor.intervalo)
+            try:
+                await self.sondear()
+            except Exception:
+                logs.exception("Error en el monitor de salud")
+
+    async def sondear(self):
+        """Sondear todos los microservicios a la vez y publicar el nuevo estado"""
+        self.monitor.publicar(await asyncio.gather(
+            *(self._sondear_servicio(cliente) for cliente in self.monitor.clientes)
+        ))
+
+    async def _sondear_servicio(self, cliente):
+        inicio = time.perf_counter()
+        try:
+            timeout = aiohttp.ClientTimeout(sock_connect=cliente.connect_timeout, sock_read=self.monitor.timeout)
+            async with await cliente.enviar('GET', "/health", timeout=timeout) as response:
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return self.monitor.resultado(cliente, inicio, None)
+        return self.monitor.resultado(cliente, inicio, response.status)
+
+    def snapshot(self):
+        """Último estado conocido de cada microservicio"""
+        return self.monitor.estado
+
+monitor_salud = MonitorSaludAsync(MonitorSalud(list(clientes_http.values()), HEALTH_INTERVALO, HEALTH_TIMEOUT, logs))
+
+# ===== RUTAS DEL GATEWAY =====
+
+async def index(request):
+    """Página principal con información de la arquitectura de microservicios"""
+    return web.json_response(informacion_gateway(monitor_salud.snapshot()))
+
+async def health_check(request):
+    """Health check del gateway y todos los servicios"""
+    return web.json_response(resumen_salud(monitor_salud.snapshot()))
+
+@requiere_autenticacion
+async def estadisticas_pool(request):
+    """Estadísticas de los pools de conexiones hacia los microservicios"""
+    return web.json_response({
+        "pools": {cliente.nombre: cliente.estadisticas() for cliente in clientes_http.values()},
+        "servicio": "gateway-service"
+    })
+
+@requiere_autenticacion
+async def estadisticas_cache_respuestas(request):
+    """Estadísticas de la cache de respuestas de este worker"""
+    return web.json_response({"cache_respuestas": cache_respuestas.estadisticas(), "servicio": "gateway-service"})
+
+@requiere_autenticacion
+async def invalidar_cache_respuestas(request):
+    """Invalidar las respuestas de los microservicios indicados (o de todos) tras escribir en ellos directamente"""
+    try:
+        datos = await request.json() if request.can_read_body else {}
+    except ValueError:
+        datos = {}
+    servicios = datos.get("servicios", list(DEPENDENCIAS_CACHE)) if isinstance(datos, dict) else list(DEPENDENCIAS_CACHE)
+
+    if not isinstance(servicios, list) or any(not isinstance(servicio, str) or servicio not in DEPENDENCIAS_CACHE
+                                              for servicio in servicios):
+        return web.json_response({
+            "error": f"El campo 'servicios' debe ser una lista con algunos de: {', '.join(DEPENDENCIAS_CACHE)}",
+            "servicio": "gateway-service"
+        }, status=400)
+
+    for servicio in servicios:
+        cache_respuestas.invalidar(servicio)
+    logs.info("Cache de respuestas invalidada", servicios=servicios)
+    return web.json_response({
+        "invalidados": servicios,
+        "servicio": "gateway-service"
+    })
+
+async def exponer_metricas_prometheus(request):
+    """Métricas en el formato de texto de Prometheus (de todos los workers)"""
+    valores = valores_metricas(metricas, metricas_procesos)
+    return web.Response(body=exponer_metricas(valores, DEFINICION_METRICAS).encode('utf-8'),
+                        headers={'Content-Type': CONTENT_TYPE_METRICAS})
+
+async def login(request):
+    """Endpoint para autenticación centralizada"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return web.json_response({'error': 'El cuerpo debe ser JSON'}, status=400)
+    username = data.get('username')
+    password = data.get('password')
+
+    if username == ADMIN_USER and password == ADMIN_PASSWORD:
+        with app_jwt.app_context():
+            access_token = create_access_token(identity=username)
+        logs.info("Login exitoso", usuario=username)
+        return web.json_response({
+            'access_token': access_token,
+            'message': 'Login exitoso',
+            'servicio': 'gateway-service'
+        }, status=200)
+    else:
+        logs.warning("Login fallido", usuario=username)
+        return web.json_response({'error': 'Credenciales inválidas'}, status=401)
+
+# ===== PROXY A MICROSERVICIOS =====
+
+def regla_aiohttp(regla):
+    """Traducir una regla de Flask (/usuarios/<int:id>) a aiohttp (/usuarios/{id:\\d+})"""
+    return re.sub(r'<int:(\w+)>', r'{\1:\\d+}', regla)
+
+def crear_proxy(servicio):
+    """Handler que reenvía la petición al microservicio sin parsear cuerpos"""
+    service_url = URLS_SERVICIOS[servicio]
+
+    @requiere_autenticacion
+    async def proxy_microservicio(request):
+        endpoint = con_query_string(request, request.rel_url.raw_path)
+        logs.debug_muestreado("Proxy", metodo=request.method, endpoint=endpoint, destino=servicio)
+
+        headers = {h: request.headers[h] for h in HEADERS_REENVIADOS if h in request.headers}
+        streaming = request.method == 'GET' and acepta_ndjson(request)
+        if request.match_info.route.name in RUTAS_CACHEABLES and not streaming:
+            return await proxy_cacheado(request, servicio, endpoint, headers.get('Accept'))
+
+        response = await hacer_peticion_microservicio(service_url, endpoint, request.method,
+                                                      headers=headers, body=await request.read(),
+                                                      identidad=request.get('identidad'))
+        if request.method != 'GET':
+            cache_respuestas.invalidar(servicio)  # también si falló: la escritura pudo llegar a aplicarse
+
+        if response is None:
+            return web.json_response({
+                'error': f'Error comunicándose con {servicio}',
+                'gateway': True
+            }, status=503)
+
+        headers_gateway = {
+            'Content-Type': response.headers.get('Content-Type', 'application/json'),
+            'X-Gateway': 'true',
+            'X-Upstream-Service': servicio
+        }
+
+        try:
+            if streaming:
+                relay = web.StreamResponse(status=response.status, headers=headers_gateway)
+                await relay.prepare(request)
+                async for chunk in response.content.iter_any():
+                    await relay.write(chunk)
+                await relay.write_eof()
+                return relay
+
+            return web.Response(body=await response.read(), status=response.status, headers=headers_gateway)
+        finally:
+            response.release()
+
+    return proxy_microservicio
+
+async def proxy_cacheado(request, servicio, endpoint, accept):
+    """GET servido de la cache de respuestas, con ETag (304 si el cliente ya tiene esa versión)"""
+    respuesta, de_cache = await consultar_con_cache(servicio, endpoint, request.get('identidad'), accept)
+    if respuesta is None:
+        return web.json_response({
+            'error': f'Error comunicándose con {servicio}',
+            'gateway': True
+        }, status=503)
+
+    headers_gateway = {'X-Gateway': 'true', 'X-Upstream-Service': servicio, 'X-Cache': 'HIT' if de_cache else 'MISS'}
+    if respuesta.etag is not None:
+        headers_gateway['ETag'] = respuesta.etag
+        if etag_coincide(request.headers.get('If-None-Match'), respuesta.etag):
+            metricas.sumar("response_cache_not_modified_total")
+            return web.Response(status=304, headers=headers_gateway)
+    headers_gateway['Content-Type'] = respuesta.content_type
+    return web.Response(body=respuesta.cuerpo, status=respuesta.codigo, headers=headers_gateway)
+
+# ===== ENDPOINTS COMPUESTOS =====
+
+@requiere_autenticacion
+async def dashboard(request):
+    """Usuarios y pedidos en una sola respuesta, consultando ambos servicios a la vez (con la cache y ETag de app.py)"""
+    partes = [
+        ("usuarios", con_query_string(request, "/usuarios"), 'usuario-service'),
+        ("pedidos", con_query_string(request, "/pedidos"), 'pedido-service')
+    ]
+
+    async def consultar(clave, endpoint, servicio):
+        inicio = time.perf_counter()
+        respuesta, _ = await consultar_con_cache(servicio, endpoint, request.get('identidad'))
+        return clave, servicio, respuesta, round((time.perf_counter() - inicio) * 1000, 2)
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(consultar(*parte) for parte in partes))
+    total_ms = round((time.perf_counter() - inicio) * 1000, 2)
+
+    headers = {'X-Gateway': 'true'}
+    etag = etag_dashboard([respuesta for _, _, respuesta, _ in resultados])
+    if etag is not None:
+        headers['ETag'] = etag
+        if etag_coincide(request.headers.get('If-None-Match'), etag):
+            metricas.sumar("response_cache_not_modified_total")
+            return web.Response(status=304, headers=headers)
+
+    cuerpo = componer_dashboard([
+        (clave, servicio,
+         respuesta.codigo if respuesta is not None else None,
+         respuesta.cuerpo if respuesta is not None else b'',
+         latencia)
+        for clave, servicio, respuesta, latencia in resultados
+    ], total_ms, logs)
+    return web.Response(body=cuerpo, status=200, content_type='application/json', headers=headers)
+
+@requiere_autenticacion
+async def trazas_lentas(request):
+    """Peticiones más lentas entre las trazas guardadas en memoria por este worker"""
+    try:
+        limite = int(request.query.get('limit', 20))
+    except ValueError:
+        limite = 20
+    return web.json_response({"peticiones": trazas.peticiones_lentas(limite), "servicio": "gateway-service"})
+
+@requiere_autenticacion
+async def obtener_traza(request):
+    """Desglose de una traza con los spans del gateway y de los microservicios"""
+    trace_id = request.match_info['trace_id'].lower()
+    if not trace_id_valido(trace_id):
+        return web.json_response({'error': 'trace_id debe tener 32 dígitos hexadecimales'}, status=400)
+
+    async def spans_remotos(service_url):
+        response = await hacer_peticion_microservicio(service_url, f"/trazas/{trace_id}",
+                                                      identidad=request.get('identidad'))
+        if response is None:
+            return []
+        try:
+            return (await response.json()).get("spans", []) if response.status == 200 else []
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return []
+        finally:
+            response.release()
+
+    remotos = await asyncio.gather(*(spans_remotos(url) for url in (USUARIO_SERVICE_URL, PEDIDO_SERVICE_URL)))
+    spans = trazas.buscar(trace_id) + [span for lista in remotos for span in lista]
+    if not spans:
+        return web.json_response({'error': 'Traza no encontrada', 'trace_id': trace_id}, status=404)
+    return web.json_response(desglose_traza(trace_id, spans))
+
+RUTA_TEMPLATE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'index.html')
+
+async def database_interface(request):
+    """Interfaz web para gestionar la base de datos"""
+    return web.FileResponse(RUTA_TEMPLATE_DB, headers={'Content-Type': 'text/html; charset=utf-8'})
+
+# ===== APLICACIÓN =====
+
+@web.middleware
+async def medir_peticion(request, handler):
+    """Contar la petición y su latencia por método, ruta (la regla, no la URL) y código"""
+    inicio = time.perf_counter()
+    metricas.sumar("http_requests_in_flight")
+    estado = 500
+    try:
+        response = await handler(request)
+        estado = response.status
+        return response
+    except web.HTTPException as e:
+        estado = e.status
+        raise
+    finally:
+        metricas.sumar("http_requests_in_flight", valor=-1)
+        recurso = request.match_info.route.resource
+        regla = recurso.canonical if recurso is not None else 'desconocida'
+        etiquetas = (("method", request.method), ("route", regla), ("status", str(estado)))
+        metricas.sumar("http_requests_total", etiquetas)
+        metricas.observar("http_request_duration_seconds", etiquetas, time.perf_counter() - inicio)
+
+@web.middleware
+async def trazar_peticion(request, handler):
+    """Span de servidor de la petición (continúa la traza del header traceparent)"""
+    recurso = request.match_info.route.resource
+    regla = recurso.canonical if recurso is not None else 'desconocida'
+    span = trazas.iniciar_peticion(request.headers.get('traceparent'), f"{request.method} {regla}",
+                                   metodo=request.method, ruta=request.path)
+    try:
+        response = await handler(request)
+        if span.muestreado:
+            span.atributos["estado"] = response.status
+            if not response.prepared:
+                response.headers['traceparent'] = span.traceparent()
+        return response
+    except web.HTTPException as e:
+        span.atributos["estado"] = e.status
+        raise
+    finally:
+        trazas.terminar_peticion(span)
+
+@web.middleware
+async def aplicar_plazo(request, handler):
+    """Plazo de la petición: PLAZO_PETICION o menos si lo pide quien llama (los streams NDJSON no tienen)"""
+    plazo_peticion.set(leer_plazo(request.headers.get(HEADER_PLAZO), plazo_maximo(request)))
+    return await handler(request)
+
+async def al_iniciar(aplicacion):
+    for cliente in clientes_http.values():
+        await cliente.abrir()
+    await monitor_salud.iniciar()
+
+async def al_cerrar(aplicacion):
+    await monitor_salud.detener()
+    for cliente in clientes_http.values():
+        await cliente.cerrar()
+
+def crear_app():
+    """Crear la aplicación aiohttp con las mismas rutas que el gateway síncrono"""
+    aplicacion = web.Application(middlewares=[medir_peticion, trazar_peticion, aplicar_plazo])
+    aplicacion.router.add_get("/", index)
+    aplicacion.router.add_get("/health", health_check)
+    aplicacion.router.add_get("/pool", estadisticas_pool)
+    aplicacion.router.add_get("/cache/respuestas", estadisticas_cache_respuestas)
+    aplicacion.router.add_post("/cache/respuestas/invalidar", invalidar_cache_respuestas)
+    aplicacion.router.add_get("/metrics", exponer_metricas_prometheus)
+    aplicacion.router.add_post("/login", login)
+    for nombre, regla, metodo, servicio in RUTAS_PROXY:
+        aplicacion.router.add_route(metodo, regla_aiohttp(regla), crear_proxy(servicio), name=nombre)
+    aplicacion.router.add_get("/dashboard", dashboard)
+    aplicacion.router.add_get("/trazas", trazas_lentas)
+    aplicacion.router.add_get("/trazas/{trace_id}", obtener_traza)
+    aplicacion.router.add_get("/db", database_interface)
+    aplicacion.on_startup.append(al_iniciar)
+    aplicacion.on_cleanup.append(al_cerrar)
+    return aplicacion
+
+app = crear_app()
+
+if __name__ == "__main__":
+    port = int(os.getenv('PORT', 5003))
+    host = os.getenv('HOST', 'localhost')
+
+    logs.info("Iniciando Gateway API asíncrono", host=host, puerto=port, autenticacion=AUTH_REQUIRED,
+              usuario_service=USUARIO_SERVICE_URL, pedido_service=PEDIDO_SERVICE_URL, modo_servidor=SERVER_MODE)
+
+    if SERVER_MODE == 'production':
+        logs.warning("gunicorn no está instalado; se usa un único proceso de aiohttp")
+
+    web.run_app(app, host=host, port=port, backlog=int(os.getenv('BACKLOG', 2048)))
@@ -0,0 +1,471 @@
+"""Configuración y piezas del gateway que no dependen del framework.
+
+Las importan el gateway síncrono (app.py, Flask) y el asíncrono (app_async.py,
+aiohttp): variables de config.env, tabla de rutas del proxy, definición de las
+métricas, cache de respuestas y cuerpos de las respuestas propias del gateway.
+Importar este módulo no crea nada: ni logs, ni métricas, ni clientes HTTP, ni
+hilos. Cada app crea los suyos con las fábricas de aquí. Se importa después de
+load_dotenv('config.env').
+"""
+from collections import OrderedDict
+import os
+import hashlib
+import json
+import threading
+import time
+
+from flask_jwt_extended import JWTManager
+
+from comun.reloj import timestamp_actual
+from comun.metricas import DEFINICION_METRICAS as DEFINICION_METRICAS_COMUNES, series_cache
+from comun.peticiones import MIMETYPE_NDJSON
+from comun.resiliencia import Circuito, PresupuestoReintentos
+
+# ===== CONFIGURACIÓN =====
+
+SERVICIO = 'gateway-service'
+
+# Variables de configuración
+SERVER_MODE = os.getenv('SERVER_MODE', 'development').lower()
+API_KEY = os.getenv('API_KEY')
+AUTH_REQUIRED = os.getenv('AUTH_REQUIRED', 'False').lower() == 'true'
+CACHE_JWT_MAX = int(os.getenv('CACHE_JWT_MAX', 10000))
+SECRETO_INTERNO = os.getenv('SECRETO_INTERNO')
+TOKEN_INTERNO_TTL = int(os.getenv('TOKEN_INTERNO_TTL', 30))
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_MUESTREO_DEBUG = float(os.getenv('LOG_MUESTREO_DEBUG', 0.01))
+LOG_COLA_MAX = int(os.getenv('LOG_COLA_MAX', 10000))
+METRICAS_DIR = os.getenv('METRICAS_DIR')  # lo crea gunicorn.conf.py con varios workers
+METRICAS_INTERVALO = float(os.getenv('METRICAS_INTERVALO', 5))
+TRAZAS_MUESTREO = float(os.getenv('TRAZAS_MUESTREO', 0.1))
+TRAZAS_MAX_SPANS = int(os.getenv('TRAZAS_MAX_SPANS', 10000))
+TRAZAS_ARCHIVO = os.getenv('TRAZAS_ARCHIVO')
+TRAZAS_ARCHIVO_MAX_MB = float(os.getenv('TRAZAS_ARCHIVO_MAX_MB', 50))
+ADMIN_USER = os.getenv('ADMIN_USER', 'admin')
+ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin123')
+
+# URLs de los microservicios
+USUARIO_SERVICE_URL = os.getenv('USUARIO_SERVICE_URL', 'http://localhost:5004')
+PEDIDO_SERVICE_URL = os.getenv('PEDIDO_SERVICE_URL', 'http://localhost:5005')
+
+# Pool de conexiones hacia los microservicios
+USUARIO_SERVICE_POOL_SIZE = int(os.getenv('USUARIO_SERVICE_POOL_SIZE', 20))
+PEDIDO_SERVICE_POOL_SIZE = int(os.getenv('PEDIDO_SERVICE_POOL_SIZE', 20))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 2))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 10))
+
+# Plazo de cada petición, circuit breaker y reintentos hacia los microservicios
+PLAZO_PETICION = float(os.getenv('PLAZO_PETICION', 10))
+CIRCUITO_FALLOS = int(os.getenv('CIRCUITO_FALLOS', 5))
+CIRCUITO_ESPERA = float(os.getenv('CIRCUITO_ESPERA', 10))
+REINTENTOS_MAX = int(os.getenv('REINTENTOS_MAX', 2))
+REINTENTOS_PROPORCION = float(os.getenv('REINTENTOS_PROPORCION', 0.1))
+REINTENTOS_MINIMO_POR_SEGUNDO = float(os.getenv('REINTENTOS_MINIMO_POR_SEGUNDO', 5))
+REINTENTOS_ESPERA_BASE = float(os.getenv('REINTENTOS_ESPERA_BASE', 0.05))
+
+# Monitor de salud de los microservicios
+HEALTH_INTERVALO = float(os.getenv('HEALTH_INTERVALO', 5))
+HEALTH_TIMEOUT = float(os.getenv('HEALTH_TIMEOUT', 2))
+
+# Cache de respuestas de los GET (CACHE_RESPUESTAS_DIR lo crea gunicorn.conf.py con varios workers)
+CACHE_RESPUESTAS_MAX = int(os.getenv('CACHE_RESPUESTAS_MAX', 1000))
+CACHE_RESPUESTAS_TTL = float(os.getenv('CACHE_RESPUESTAS_TTL', 10))
+CACHE_RESPUESTAS_MAX_KB = int(os.getenv('CACHE_RESPUESTAS_MAX_KB', 256))
+CACHE_RESPUESTAS_DIR = os.getenv('CACHE_RESPUESTAS_DIR')
+
+# Hilos para peticiones en paralelo a varios microservicios
+FANOUT_WORKERS = int(os.getenv('FANOUT_WORKERS', 32))
+
+# ===== AUTENTICACIÓN =====
+# API key, llamadas internas firmadas y JWT: ver comun/autenticacion.py
+
+def configurar_jwt(app):
+    """Configurar los JWT de flask_jwt_extended en app (JWT_SECRET y SECRET_KEY de config.env)"""
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET', 'fallback_secret_key')
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'fallback_secret')
+    return JWTManager(app)
+
+# ===== MÉTRICAS =====
+# Métricas de Prometheus en GET /metrics (comun/metricas.py)
+
+# Tipo y descripción de cada métrica expuesta: las de comun y las de este servicio
+DEFINICION_METRICAS = {
+    **DEFINICION_METRICAS_COMUNES,
+    "jwt_cache_entries": ("gauge", "Tokens JWT verificados en la cache"),
+    "jwt_cache_hits_total": ("counter", "Tokens JWT encontrados en la cache"),
+    "jwt_cache_misses_total": ("counter", "Tokens JWT que hubo que verificar"),
+    "jwt_cache_evictions_total": ("counter", "Tokens JWT desalojados de la cache"),
+    "response_cache_entries": ("gauge", "Respuestas en la cache del gateway"),
+    "response_cache_hits_total": ("counter", "Respuestas servidas de la cache del gateway"),
+    "response_cache_misses_total": ("counter", "Respuestas que hubo que pedir a los microservicios"),
+    "response_cache_evictions_total": ("counter", "Respuestas desalojadas de la cache del gateway"),
+    "response_cache_invalidations_total": ("counter", "Invalidaciones de la cache del gateway por escrituras"),
+    "response_cache_not_modified_total": ("counter", "Respuestas 304 por un If-None-Match que coincide")
+}
+
+# ===== RESILIENCIA =====
+# Plazo de cada petición, circuit breaker y reintentos de las llamadas a los
+# microservicios (comun/resiliencia.py)
+
+def plazo_maximo(peticion):
+    """Plazo de la petición: PLAZO_PETICION o menos si lo pide quien llama (los streams NDJSON no tienen)"""
+    return 0 if MIMETYPE_NDJSON in peticion.headers.get('Accept', '') else PLAZO_PETICION
+
+def circuito_hacia(nombre, metricas, logs):
+    """Circuit breaker hacia un microservicio con CIRCUITO_FALLOS y CIRCUITO_ESPERA"""
+    return Circuito(nombre, CIRCUITO_FALLOS, CIRCUITO_ESPERA, metricas, logs)
+
+def presupuesto_reintentos():
+    """Presupuesto de reintentos hacia un microservicio con la configuración REINTENTOS_*"""
+    return PresupuestoReintentos(REINTENTOS_PROPORCION, REINTENTOS_MINIMO_POR_SEGUNDO, REINTENTOS_MAX,
+                                 REINTENTOS_ESPERA_BASE)
+
+# ===== CACHE DE RESPUESTAS =====
+# Los GET de /usuarios y /pedidos (también las dos partes de /dashboard) se sirven de
+# una cache LRU con TTL por ruta, query string, Accept e identidad. Cada escritura
+# que pasa por el gateway invalida las respuestas del microservicio escrito, y las
+# de pedido-service dependen también de usuario-service porque incluyen el nombre
+# del usuario. Lo que se escribe directamente en un microservicio se ve al caducar
+# la entrada (CACHE_RESPUESTAS_TTL). Cada respuesta lleva un ETag y un
+# If-None-Match que coincide recibe un 304 sin cuerpo.
+
+# Rutas del proxy cuyas respuestas se guardan
+RUTAS_CACHEABLES = frozenset(("proxy_obtener_usuarios", "proxy_obtener_usuario",
+                              "proxy_obtener_pedidos", "proxy_obtener_pedido"))
+
+# Microservicios cuyas escrituras invalidan las respuestas de cada uno
+DEPENDENCIAS_CACHE = {
+    "usuario-service": ("usuario-service",),
+    "pedido-service": ("pedido-service", "usuario-service")
+}
+
+class RespuestaMicroservicio:
+    """Respuesta ya leída de un microservicio (la que se guarda en la cache)"""
+    __slots__ = ('codigo', 'content_type', 'cuerpo', 'etag')
+    
+    def __init__(self, codigo, content_type, cuerpo):
+        self.codigo = codigo
+        self.content_type = content_type
+        self.cuerpo = cuerpo
+        self.etag = calcular_etag(cuerpo) if codigo == 200 else None
+
+def calcular_etag(*partes, debil=False):
+    """ETag del contenido (BLAKE2b de 128 bits); débil si solo garantiza el mismo significado"""
+    resumen = hashlib.blake2b(digest_size=16)
+    for parte in partes:
+        resumen.update(parte)
+    return f'{"W/" if debil else ""}"{resumen.hexdigest()}"'
+
+def etag_coincide(if_none_match, etag):
+    """El header If-None-Match incluye etag (comparación débil, la que se usa en los GET)"""
+    if not if_none_match or etag is None:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    etag = etag.removeprefix('W/')
+    return any(candidato.strip().removeprefix('W/') == etag for candidato in if_none_match.split(','))
+
+class GeneracionesCache:
+    """Generación de los datos de cada microservicio: cambia con cada escritura.
+    
+    Con directorio (varios workers) la generación es el tamaño de un fichero por
+    microservicio al que cada invalidación añade un byte (O_APPEND, atómico). Así
+    una escritura en un worker invalida la cache de todos y comprobarla es un
+    os.stat. Sin directorio es un contador en memoria.
+    """
+    
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self._locales = {}
+        self._lock = threading.Lock()
+    
+    def actual(self, servicio):
+        if self.directorio is None:
+            return self._locales.get(servicio, 0)
+        try:
+            return os.stat(os.path.join(self.directorio, servicio)).st_size
+        except FileNotFoundError:
+            return 0
+    
+    def invalidar(self, servicio):
+        if self.directorio is None:
+            with self._lock:
+                self._locales[servicio] = self._locales.get(servicio, 0) + 1
+            return
+        with open(os.path.join(self.directorio, servicio), 'ab') as archivo:
+            archivo.write(b'.')
+
+class CacheRespuestas:
+    """Cache LRU con TTL de respuestas 200: clave -> (expira_en, generaciones, respuesta)"""
+    
+    def __init__(self, max_entradas, ttl_segundos, max_bytes, generaciones):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.max_bytes = max_bytes
+        self.generaciones = generaciones
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidaciones = 0
+    
+    def generacion(self, servicio):
+        """Generaciones de las que dependen las respuestas de servicio.
+    
+        Se leen antes de llamar al microservicio: si una escritura termina durante
+        la llamada, la respuesta se guarda ya invalidada.
+        """
+        return tuple(self.generaciones.actual(dependencia) for dependencia in DEPENDENCIAS_CACHE[servicio])
+    
+    def obtener(self, clave, servicio):
+        """Respuesta guardada o None si no está, caducó o se escribió en el microservicio después"""
+        if self.max_entradas <= 0:
+            return None
+        generacion = self.generacion(servicio)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            if entrada[0] < time.monotonic() or entrada[1] != generacion:
+                del self._entradas[clave]
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            return entrada[2]
+    
+    def guardar(self, clave, generacion, respuesta):
+        """Guardar una respuesta desalojando la menos usada si se supera el límite"""
+        if self.max_entradas <= 0 or len(respuesta.cuerpo) > self.max_bytes:
+            return
+        with self._lock:
+            self._entradas[clave] = (time.monotonic() + self.ttl_segundos, generacion, respuesta)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidar(self, servicio):
+        """Invalidar en todos los workers las respuestas que dependen de servicio"""
+        self.generaciones.invalidar(servicio)
+        with self._lock:
+            self.invalidaciones += 1
+    
+    def estadisticas(self):
+        """Contadores de uso de la cache"""
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl_segundos,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidaciones": self.invalidaciones,
+                "hit_ratio": round(self.hits / consultas, 4) if consultas else 0.0
+            }
+
+def crear_cache_respuestas():
+    """Cache de respuestas con la configuración CACHE_RESPUESTAS_*"""
+    return CacheRespuestas(CACHE_RESPUESTAS_MAX, CACHE_RESPUESTAS_TTL, CACHE_RESPUESTAS_MAX_KB * 1024,
+                           GeneracionesCache(CACHE_RESPUESTAS_DIR))
+
+def series_cache_respuestas(cache_respuestas):
+    estadisticas = cache_respuestas.estadisticas()
+    return series_cache("response_cache", estadisticas) + [
+        ("response_cache_invalidations_total", (), estadisticas["invalidaciones"])
+    ]
+
+# ===== RESPUESTAS DEL GATEWAY =====
+# Cuerpos independientes del framework: los comparten el gateway síncrono (Flask)
+# y el asíncrono (app_async.py).
+
+def informacion_gateway(servicios_status):
+    """Información de la arquitectura de microservicios"""
+    return {
+        "mensaje": "Gateway API - Arquitectura de Microservicios",
+        "arquitectura": "microservicios",
+        "gateway": {
+            "puerto": os.getenv('PORT', 5003),
+            "version": "1.0.0"
+        },
+        "microservicios": {
+            "usuario-service": {
+                "url": USUARIO_SERVICE_URL,
+                "descripcion": "Gestión de usuarios",
+                "endpoints": [
+                    "GET /usuarios - Obtener usuarios (limit, after_id, fields, nombre, email)",
+                    "GET /usuarios/{id} - Obtener usuario por ID",
+                    "POST /usuarios - Crear nuevo usuario",
+                    "PUT /usuarios/{id} - Actualizar usuario",
+                    "DELETE /usuarios/{id} - Eliminar usuario",
+                    "POST|PATCH|DELETE /usuarios/bulk - Operaciones en lote (array JSON o NDJSON, todo o nada)"
+                ]
+            },
+            "pedido-service": {
+                "url": PEDIDO_SERVICE_URL,
+                "descripcion": "Gestión de pedidos",
+                "endpoints": [
+                    "GET /pedidos - Obtener pedidos (limit, after_id, fields, estado, usuario_id, producto)",
+                    "GET /pedidos/{id} - Obtener pedido por ID",
+                    "GET /pedidos/stats - Estadísticas por estado, usuario_id y producto (agrupar, top)",
+                    "POST /pedidos - Crear nuevo pedido",
+                    "PUT /pedidos/{id} - Actualizar pedido",
+                    "DELETE /pedidos/{id} - Eliminar pedido",
+                    "POST|PATCH|DELETE /pedidos/bulk - Operaciones en lote (array JSON o NDJSON, todo o nada)"
+                ]
+            }
+        },
+        "estado_servicios": servicios_status,
+        "autenticacion_requerida": AUTH_REQUIRED,
+        "autenticacion": {
+            "metodos": [
+                "API Key: Agregar header 'X-API-Key' con tu API key",
+                "JWT Token: Usar el token obtenido del endpoint /login"
+            ]
+        },
+        "diferencias_monolitico": {
+            "ventajas_microservicios": [
+                "Servicios independientes y escalables",
+                "Comunicación HTTP entre servicios",
+                "Despliegue independiente",
+                "Tecnologías diferentes por servicio",
+                "Falla aislada por servicio"
+            ],
+            "comunicacion": "HTTP REST entre microservicios"
+        }
+    }
+
+def resumen_salud(servicios_status):
+    """Salud del gateway y de todos los microservicios"""
+    all_healthy = all(
+        status.get('estado') == 'healthy' 
+        for status in servicios_status.values()
+    )
+    
+    return {
+        "gateway": "healthy",
+        "timestamp": timestamp_actual(),
+        "microservicios": servicios_status,
+        "overall_status": "healthy" if all_healthy else "degraded"
+    }
+
+def componer_dashboard(resultados, total_ms, logs):
+    """Componer el cuerpo de /dashboard insertando tal cual las respuestas de los microservicios.
+    
+    resultados: lista de (clave, servicio, codigo_http o None, contenido, latencia_ms).
+    """
+    fragmentos = []
+    latencias = {}
+    completo = True
+    for clave, servicio, codigo, contenido, latencia in resultados:
+        latencias[servicio] = latencia
+        if codigo == 200:
+            fragmentos.append(f'"{clave}":'.encode('utf-8') + contenido)
+        else:
+            completo = False
+            error = {'error': f'Error comunicándose con {servicio}', 'codigo': codigo}
+            fragmentos.append(f'"{clave}":{json.dumps(error)}'.encode('utf-8'))
+    
+    metadatos = json.dumps({"completo": completo, "latencias_ms": latencias, "total_ms": total_ms})
+    logs.debug_muestreado("Dashboard compuesto", total_ms=total_ms, latencias_ms=latencias)
+    return b'{' + b','.join(fragmentos) + b',' + metadatos[1:].encode('utf-8')
+
+def etag_dashboard(respuestas):
+    """ETag de /dashboard a partir de los de sus partes (None si a alguna le falta).
+    
+    Es débil porque el cuerpo incluye las latencias, que cambian en cada petición.
+    """
+    etags = [respuesta.etag if respuesta is not None else None for respuesta in respuestas]
+    if None in etags:
+        return None
+    return calcular_etag(*(etag.encode('utf-8') for etag in etags), debil=True)
+
+ANCHO_DIAGRAMA_TRAZA = 60
+
+def trace_id_valido(trace_id):
+    """32 dígitos hexadecimales, como en traceparent"""
+    return len(trace_id) == 32 and all(c in '0123456789abcdef' for c in trace_id)
+
+def desglose_traza(trace_id, spans):
+    """Árbol de los spans de una traza (de todos los servicios) con su desfase y su tiempo propio.
+    
+    diagrama es una línea de texto por span con una barra proporcional a su
+    inicio y duración dentro de la traza (estilo flame chart).
+    """
+    spans = sorted({span["span_id"]: span for span in spans}.values(), key=lambda span: span["inicio_us"])
+    ids = {span["span_id"] for span in spans}
+    hijos = {}
+    for span in spans:
+        hijos.setdefault(span["parent_id"] if span["parent_id"] in ids else None, []).append(span)
+    
+    inicio = spans[0]["inicio_us"]
+    total_ms = max(span["inicio_us"] / 1000 + span["duracion_ms"] for span in spans) - inicio / 1000
+    filas, diagrama = [], []
+    pendientes = [(span, 0) for span in reversed(hijos[None])]
+    while pendientes:
+        span, profundidad = pendientes.pop()
+        desfase_ms = (span["inicio_us"] - inicio) / 1000
+        # Los hijos concurrentes pueden sumar más que el padre
+        propio_ms = max(0.0, span["duracion_ms"] - sum(h["duracion_ms"] for h in hijos.get(span["span_id"], [])))
+        filas.append({
+            "servicio": span["servicio"],
+            "nombre": span["nombre"],
+            "tipo": span["tipo"],
+            "span_id": span["span_id"],
+            "parent_id": span["parent_id"],
+            "profundidad": profundidad,
+            "desfase_ms": round(desfase_ms, 3),
+            "duracion_ms": span["duracion_ms"],
+            "propio_ms": round(propio_ms, 3),
+            "atributos": span["atributos"]
+        })
+        columna = int(desfase_ms / total_ms * ANCHO_DIAGRAMA_TRAZA) if total_ms else 0
+        barra = max(1, round(span["duracion_ms"] / total_ms * ANCHO_DIAGRAMA_TRAZA)) if total_ms else 1
+        diagrama.append(f"{(' ' * columna + '█' * barra)[:ANCHO_DIAGRAMA_TRAZA]:<{ANCHO_DIAGRAMA_TRAZA}} "
+                        f"{'  ' * profundidad}{span['servicio']} {span['nombre']} {span['duracion_ms']:.2f} ms")
+        pendientes.extend((hijo, profundidad + 1) for hijo in reversed(hijos.get(span["span_id"], [])))
+    
+    return {
+        "trace_id": trace_id,
+        "duracion_ms": round(total_ms, 3),
+        "servicios": sorted({span["servicio"] for span in spans}),
+        "spans": filas,
+        "diagrama": diagrama
+    }
+
+# ===== PROXY A MICROSERVICIOS =====
+
+# Tabla de rutas del proxy: (endpoint, regla, método, microservicio).
+# El gateway expone las mismas rutas que los microservicios.
+RUTAS_PROXY = [
+    ("proxy_obtener_usuarios", "/usuarios", "GET", "usuario-service"),
+    ("proxy_obtener_usuario", "/usuarios/<int:id_usuario>", "GET", "usuario-service"),
+    ("proxy_crear_usuario", "/usuarios", "POST", "usuario-service"),
+    ("proxy_actualizar_usuario", "/usuarios/<int:id_usuario>", "PUT", "usuario-service"),
+    ("proxy_eliminar_usuario", "/usuarios/<int:id_usuario>", "DELETE", "usuario-service"),
+    ("proxy_crear_usuarios_lote", "/usuarios/bulk", "POST", "usuario-service"),
+    ("proxy_actualizar_usuarios_lote", "/usuarios/bulk", "PATCH", "usuario-service"),
+    ("proxy_eliminar_usuarios_lote", "/usuarios/bulk", "DELETE", "usuario-service"),
+    ("proxy_obtener_pedidos", "/pedidos", "GET", "pedido-service"),
+    ("proxy_obtener_pedido", "/pedidos/<int:id_pedido>", "GET", "pedido-service"),
+    ("proxy_estadisticas_pedidos", "/pedidos/stats", "GET", "pedido-service"),
+    ("proxy_crear_pedido", "/pedidos", "POST", "pedido-service"),
+    ("proxy_actualizar_pedido", "/pedidos/<int:id_pedido>", "PUT", "pedido-service"),
+    ("proxy_eliminar_pedido", "/pedidos/<int:id_pedido>", "DELETE", "pedido-service"),
+    ("proxy_crear_pedidos_lote", "/pedidos/bulk", "POST", "pedido-service"),
+    ("proxy_actualizar_pedidos_lote", "/pedidos/bulk", "PATCH", "pedido-service"),
+    ("proxy_eliminar_pedidos_lote", "/pedidos/bulk", "DELETE", "pedido-service"),
+]
+
+URLS_SERVICIOS = {
+    "usuario-service": USUARIO_SERVICE_URL,
+    "pedido-service": PEDIDO_SERVICE_URL
+}
+
+# Headers del cliente que se reenvían al microservicio
+HEADERS_REENVIADOS = ('Content-Type', 'Accept')
@@ -0,0 +1,48 @@
+# Configuración de gunicorn compartida por los microservicios.
+# Se carga desde el directorio de cada servicio (python app.py con SERVER_MODE=production
+# o start-microservicios.sh) y lee el config.env de ese servicio.
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from dotenv import load_dotenv
+
+load_dotenv('config.env')
+
+bind = f"{os.getenv('HOST', 'localhost')}:{os.getenv('PORT', 5000)}"
+
+# Procesos prefork con un pool de hilos cada uno
+worker_class = 'gthread'
+workers = int(os.getenv('WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('THREADS', 8))
+
+# Cola de conexiones pendientes del socket de escucha
+backlog = int(os.getenv('BACKLOG', 2048))
+
+# Recarga y apagado ordenado: kill -HUP <pid> recarga los workers sin cortar peticiones.
+# Con DB_BACKEND=memoria y PERSISTENCIA el worker nuevo espera a que el antiguo salga
+# (hasta GRACEFUL_TIMEOUT) antes de cargar el WAL, así que WORKER_TIMEOUT debe ser mayor.
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', 30))
+timeout = int(os.getenv('WORKER_TIMEOUT', 60))
+keepalive = int(os.getenv('KEEPALIVE', 5))
+
+accesslog = '-'
+errorlog = '-'
+
+# Directorios temporales compartidos por los workers: METRICAS_DIR, donde cada worker
+# vuelca sus métricas para que /metrics agregue las de todos, y CACHE_RESPUESTAS_DIR,
+# donde el gateway marca cada escritura para invalidar la cache de respuestas de todos.
+# Se crean al arrancar el master (los workers los heredan; una recarga con HUP los
+# conserva) y se borran al salir.
+DIRECTORIOS_COMPARTIDOS = {'METRICAS_DIR': 'metricas', 'CACHE_RESPUESTAS_DIR': 'cache-respuestas'}
+
+for variable, prefijo in DIRECTORIOS_COMPARTIDOS.items():
+    if not os.getenv(variable):
+        os.environ[variable] = tempfile.mkdtemp(prefix=f"{prefijo}-{os.getenv('PORT', 5000)}-")
+        os.environ[f'{variable}_TEMPORAL'] = '1'
+
+def on_exit(server):
+    for variable in DIRECTORIOS_COMPARTIDOS:
+        if os.getenv(f'{variable}_TEMPORAL') == '1':
+            shutil.rmtree(os.environ[variable], ignore_errors=True)
@@ -1,13 +1,49 @@
-from flask import Flask, jsonify, request
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
+from flask import Flask, jsonify, request, g, has_request_context, Response, stream_with_context
+from flask_jwt_extended import JWTManager, jwt_required, create_access_token
 from dotenv import load_dotenv
 from functools import wraps
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from collections.abc import Mapping
 import os
+import sys
+import atexit
+import heapq
+import math
+import threading
+import time
 import requests
 
+# Código compartido por los microservicios (microservicios/comun)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from comun.reloj import ahora_ms, formatear_fecha, timestamp_actual
+from comun.logs import Logs
+from comun.metricas import (
+    DEFINICION_METRICAS as DEFINICION_METRICAS_COMUNES, CONTENT_TYPE_METRICAS, Metricas, MetricasProcesos,
+    series_cache, valores_metricas, exponer_metricas, medir_peticiones
+)
+from comun.autenticacion import Autenticacion, VerificadorJWT
+from comun.peticiones import (
+    MIMETYPE_NDJSON, leer_parametros_listado, acepta_ndjson, linea_ndjson, proyectar,
+    leer_lote, ids_del_lote, errores_no_encontrados
+)
+from comun.servidor import lanzar_gunicorn
+from comun.salud import MonitorSalud
+from comun.persistencia import Persistencia, conectar_sqlite, fila_a_diccionario
+from comun.trazas import Trazas, operaciones_trazadas, trazar_peticiones
+from comun.resiliencia import (
+    limitar_plazo, Circuito, PresupuestoReintentos, LlamadaRechazada, ClienteHTTP, series_circuitos, series_pools
+)
+
 # Cargar variables de entorno
 load_dotenv('config.env')
 
+# Con SERVER_MODE=production `python app.py` solo lanza gunicorn, antes de crear la base de
+# datos, los logs, las trazas o las métricas: los crea cada worker al importar este módulo
+SERVER_MODE = os.getenv('SERVER_MODE', 'development').lower()
+if __name__ == "__main__" and SERVER_MODE == 'production':
+    lanzar_gunicorn('app:app')
+
 app = Flask(__name__)
 
 # Configuración de JWT
@@ -18,122 +54,844 @@ jwt = JWTManager(app)
 # Variables de configuración
 API_KEY = os.getenv('API_KEY')
 AUTH_REQUIRED = os.getenv('AUTH_REQUIRED', 'False').lower() == 'true'
+CACHE_JWT_MAX = int(os.getenv('CACHE_JWT_MAX', 10000))
+SECRETO_INTERNO = os.getenv('SECRETO_INTERNO')
+TOKEN_INTERNO_TTL = int(os.getenv('TOKEN_INTERNO_TTL', 30))
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_MUESTREO_DEBUG = float(os.getenv('LOG_MUESTREO_DEBUG', 0.01))
+LOG_COLA_MAX = int(os.getenv('LOG_COLA_MAX', 10000))
+METRICAS_DIR = os.getenv('METRICAS_DIR')  # lo crea gunicorn.conf.py con varios workers
+METRICAS_INTERVALO = float(os.getenv('METRICAS_INTERVALO', 5))
+TRAZAS_MUESTREO = float(os.getenv('TRAZAS_MUESTREO', 0.1))
+TRAZAS_MAX_SPANS = int(os.getenv('TRAZAS_MAX_SPANS', 10000))
+TRAZAS_ARCHIVO = os.getenv('TRAZAS_ARCHIVO')
+TRAZAS_ARCHIVO_MAX_MB = float(os.getenv('TRAZAS_ARCHIVO_MAX_MB', 50))
 USUARIO_SERVICE_URL = os.getenv('USUARIO_SERVICE_URL', 'http://localhost:5004')
+MAX_IDS_POR_LOTE = int(os.getenv('MAX_IDS_POR_LOTE', 500))
+LIMITE_PAGINA_DEFECTO = int(os.getenv('LIMITE_PAGINA_DEFECTO', 100))
+LIMITE_PAGINA_MAX = int(os.getenv('LIMITE_PAGINA_MAX', 1000))
+MAX_ELEMENTOS_LOTE = int(os.getenv('MAX_ELEMENTOS_LOTE', 100000))
+USUARIO_SERVICE_POOL_SIZE = int(os.getenv('USUARIO_SERVICE_POOL_SIZE', 10))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 2))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 5))
+CIRCUITO_FALLOS = int(os.getenv('CIRCUITO_FALLOS', 5))
+CIRCUITO_ESPERA = float(os.getenv('CIRCUITO_ESPERA', 10))
+REINTENTOS_MAX = int(os.getenv('REINTENTOS_MAX', 2))
+REINTENTOS_PROPORCION = float(os.getenv('REINTENTOS_PROPORCION', 0.1))
+REINTENTOS_MINIMO_POR_SEGUNDO = float(os.getenv('REINTENTOS_MINIMO_POR_SEGUNDO', 5))
+REINTENTOS_ESPERA_BASE = float(os.getenv('REINTENTOS_ESPERA_BASE', 0.05))
+HEALTH_INTERVALO = float(os.getenv('HEALTH_INTERVALO', 5))
+HEALTH_TIMEOUT = float(os.getenv('HEALTH_TIMEOUT', 2))
+CACHE_USUARIOS_MAX = int(os.getenv('CACHE_USUARIOS_MAX', 10000))
+CACHE_USUARIOS_TTL = float(os.getenv('CACHE_USUARIOS_TTL', 60))
+CACHE_USUARIOS_OBSOLETO = float(os.getenv('CACHE_USUARIOS_OBSOLETO', 3600))
+DB_BACKEND = os.getenv('DB_BACKEND', 'memoria').lower()
+DB_PATH = os.getenv('DB_PATH', 'data/pedidos.db')
+PERSISTENCIA = os.getenv('PERSISTENCIA', 'False').lower() == 'true'
+PERSISTENCIA_DIR = os.getenv('PERSISTENCIA_DIR', 'data')
+WAL_FSYNC = os.getenv('WAL_FSYNC', 'grupo').lower()
+SNAPSHOT_CADA = int(os.getenv('SNAPSHOT_CADA', 10000))
+
+# ===== LOGS =====
+# Logs estructurados del servicio (comun/logs.py)
+
+SERVICIO = 'pedido-service'
+
+logs = Logs(SERVICIO, LOG_LEVEL, LOG_MUESTREO_DEBUG, LOG_COLA_MAX, sys.stdout)
+atexit.register(logs.detener)
+
+# Campos que se pueden modificar con PUT (el resto los gestiona la base de datos)
+CAMPOS_EDITABLES_PEDIDO = ("usuario_id", "producto", "cantidad", "precio", "estado")
+
+# Filtros admitidos en GET /pedidos y su tipo
+FILTROS_PEDIDO = {"estado": str, "usuario_id": int, "producto": str}
+
+# Dimensiones por las que se agrupan las estadísticas de GET /pedidos/stats
+AGRUPACIONES_PEDIDO = ("estado", "usuario_id", "producto")
+
+# Tipos aceptados en los campos de un pedido (POST y PUT)
+TIPOS_CAMPOS_PEDIDO = {"usuario_id": int, "producto": str, "cantidad": int, "precio": (int, float), "estado": str}
+
+def precio_valido(precio):
+    """El precio es finito y tiene como mucho dos decimales (se guarda en céntimos exactos).
+    
+    json.loads acepta NaN e Infinity; y un precio como 12.345 se redondearía
+    a céntimos sin avisar, así que ambos se rechazan.
+    """
+    return math.isfinite(precio) and round(precio, 2) == precio
+
+def validar_campos_pedido(datos):
+    """Mensaje de error para el cliente si algún campo tiene un tipo no válido, o None"""
+    for campo, tipo in TIPOS_CAMPOS_PEDIDO.items():
+        valor = datos.get(campo)
+        if campo in datos and (not isinstance(valor, tipo) or isinstance(valor, bool)):
+            return f"Tipo inválido para el campo '{campo}'"
+    if "precio" in datos and not precio_valido(datos["precio"]):
+        return "El campo 'precio' debe ser un número finito con como mucho 2 decimales"
+    return None
+
+def validar_pedido_nuevo(datos):
+    """Mensaje de error para el cliente si los datos no sirven para crear un pedido, o None"""
+    if not datos or not isinstance(datos, dict):
+        return "Datos del pedido requeridos"
+    if not datos.get("usuario_id"):
+        return "El campo 'usuario_id' es requerido"
+    if not datos.get("producto"):
+        return "El campo 'producto' es requerido"
+    return validar_campos_pedido(datos)
+
+# ===== MÉTRICAS =====
+# Métricas de Prometheus en GET /metrics (comun/metricas.py)
+
+# Tipo y descripción de cada métrica expuesta: las de comun y las de este servicio
+DEFINICION_METRICAS = {
+    **DEFINICION_METRICAS_COMUNES,
+    "jwt_cache_entries": ("gauge", "Tokens JWT verificados en la cache"),
+    "jwt_cache_hits_total": ("counter", "Tokens JWT encontrados en la cache"),
+    "jwt_cache_misses_total": ("counter", "Tokens JWT que hubo que verificar"),
+    "jwt_cache_evictions_total": ("counter", "Tokens JWT desalojados de la cache"),
+    "db_table_rows": ("gauge", "Registros en la tabla"),
+    "user_cache_entries": ("gauge", "Usuarios en la cache local"),
+    "user_cache_hits_total": ("counter", "Usuarios encontrados en la cache local"),
+    "user_cache_misses_total": ("counter", "Usuarios que hubo que pedir a usuario-service"),
+    "user_cache_evictions_total": ("counter", "Usuarios desalojados de la cache local"),
+    "user_cache_invalidations_total": ("counter", "Usuarios invalidados en la cache local"),
+    "user_cache_stale_served_total": ("counter", "Usuarios caducados servidos porque usuario-service no respondió")
+}
+
+metricas = Metricas(DEFINICION_METRICAS)
+metricas.registrar_colector('logs', lambda: [("log_events_dropped_total", (), logs.descartados)])
+metricas_procesos = MetricasProcesos(metricas, METRICAS_DIR, METRICAS_INTERVALO, logs) if METRICAS_DIR else None
+if metricas_procesos is not None:
+    metricas_procesos.iniciar()
+medir_peticiones(app, metricas)
+
+# ===== TRAZAS =====
+# Trazas distribuidas con W3C Trace Context (comun/trazas.py)
+
+trazas = Trazas(SERVICIO, TRAZAS_MUESTREO, TRAZAS_MAX_SPANS, TRAZAS_ARCHIVO, TRAZAS_ARCHIVO_MAX_MB * 1024 * 1024, logs)
+trazar_peticiones(app, trazas)
+
+# ===== RESILIENCIA =====
+# Plazo de cada petición, circuit breaker y reintentos de las llamadas a otros
+# microservicios (comun/resiliencia.py): el plazo es el que le queda a quien llama
+
+limitar_plazo(app)
+
+# ===== PAGINACIÓN Y FILTROS =====
+# limit, after_id, fields y filtros se leen con comun/peticiones.py, igual que el
+# NDJSON de los listados en streaming.
+
+def leer_parametros_estadisticas():
+    """Leer agrupar (dimensiones separadas por comas) y top de la query string.
+    
+    Lanza ValueError con un mensaje para el cliente si algún parámetro no es válido.
+    """
+    args = request.args
+    agrupaciones = [c.strip() for c in args.get('agrupar', '').split(',') if c.strip()] or list(AGRUPACIONES_PEDIDO)
+    desconocidas = [c for c in agrupaciones if c not in AGRUPACIONES_PEDIDO]
+    if desconocidas:
+        raise ValueError(f"No se puede agrupar por {desconocidas}; opciones: {list(AGRUPACIONES_PEDIDO)}")
+    try:
+        top = int(args['top']) if args.get('top') else LIMITE_PAGINA_DEFECTO
+    except ValueError:
+        raise ValueError("El parámetro 'top' debe ser un entero")
+    if top < 1 or top > LIMITE_PAGINA_MAX:
+        raise ValueError(f"El parámetro 'top' debe estar entre 1 y {LIMITE_PAGINA_MAX}")
+    return agrupaciones, top
+
+# ===== OPERACIONES EN LOTE =====
+# Lectura y validación de los lotes en comun/peticiones.py: todo o nada, con un
+# resultado o un error por elemento.
+
+def respuesta_lote_rechazado(errores, codigo=400):
+    """Respuesta de un lote que no se aplicó, con el error de cada elemento que falló"""
+    errores.sort(key=lambda error: error["indice"])
+    return jsonify({
+        "error": f"El lote no se aplicó: {len(errores)} elementos con errores",
+        "errores": errores,
+        "aplicado": False,
+        "servicio": "pedido-service"
+    }), codigo
+
+def respuesta_lote(registros, mensaje, codigo=200):
+    """Respuesta de un lote aplicado: el ID resultante de cada elemento, en el orden del lote"""
+    return jsonify({
+        "resultados": [{"indice": indice, "id": registro["id"]} for indice, registro in enumerate(registros)],
+        "total": len(registros),
+        "aplicado": True,
+        "mensaje": mensaje,
+        "servicio": "pedido-service"
+    }), codigo
+
+# ===== BASE DE DATOS =====
+# Backends intercambiables con la misma interfaz, elegidos con DB_BACKEND:
+# - memoria: diccionarios dentro del proceso (un solo worker)
+# - sqlite: fichero SQLite en modo WAL compartido por todos los workers
+
+# Pedidos iniciales para demostración
+PEDIDOS_INICIALES = [
+    {"usuario_id": 1, "producto": "Laptop", "cantidad": 1, "precio": 1200.00, "estado": "pendiente"},
+    {"usuario_id": 2, "producto": "Mouse", "cantidad": 2, "precio": 25.50, "estado": "pendiente"},
+    {"usuario_id": 3, "producto": "Teclado", "cantidad": 1, "precio": 75.00, "estado": "completado"}
+]
+
+class Pedido(Mapping):
+    """Pedido del backend en memoria con representación compacta.
+    
+    Usa __slots__ en lugar de un diccionario por registro, guarda el precio en
+    céntimos enteros, el producto y el estado internados (una sola cadena por
+    valor distinto) y las fechas como milisegundos enteros. Se lee como un
+    diccionario de solo lectura (pedido["precio"], pedido.get(), dict(pedido)),
+    igual que las filas del backend SQLite, y no se modifica una vez publicado.
+    """
+    
+    __slots__ = ("id", "usuario_id", "producto", "cantidad", "precio_centimos", "estado",
+                 "fecha_creacion", "fecha_actualizacion")
+    CAMPOS = ("id", "usuario_id", "producto", "cantidad", "precio", "estado",
+              "fecha_creacion", "fecha_actualizacion")
+    
+    def __init__(self, id, usuario_id, producto, cantidad, precio, estado, fecha_creacion, fecha_actualizacion=None):
+        self.id = id
+        self.usuario_id = usuario_id
+        self.producto = sys.intern(producto)
+        self.cantidad = cantidad
+        self.precio_centimos = round(precio * 100)
+        self.estado = sys.intern(estado)
+        self.fecha_creacion = fecha_creacion
+        self.fecha_actualizacion = fecha_actualizacion  # None hasta la primera actualización
+    
+    @classmethod
+    def desde_diccionario(cls, datos):
+        return cls(**datos)
+    
+    def __getitem__(self, campo):
+        if campo == "precio":
+            return self.precio_centimos / 100
+        if campo not in Pedido.CAMPOS or (campo == "fecha_actualizacion" and self.fecha_actualizacion is None):
+            raise KeyError(campo)
+        return getattr(self, campo)
+    
+    def __iter__(self):
+        return iter(Pedido.CAMPOS if self.fecha_actualizacion is not None else Pedido.CAMPOS[:-1])
+    
+    def __len__(self):
+        return len(Pedido.CAMPOS) - (self.fecha_actualizacion is None)
+    
+    def __repr__(self):
+        return repr(self.a_diccionario())
+    
+    def a_diccionario(self):
+        """Copia como diccionario, sin pasar por __getitem__ campo a campo"""
+        datos = {"id": self.id, "usuario_id": self.usuario_id, "producto": self.producto, "cantidad": self.cantidad,
+                 "precio": self.precio_centimos / 100, "estado": self.estado, "fecha_creacion": self.fecha_creacion}
+        if self.fecha_actualizacion is not None:
+            datos["fecha_actualizacion"] = self.fecha_actualizacion
+        return datos
+
+class PedidoDBBase:
+    """Interfaz común de los backends de pedidos.
+    
+    Cada backend implementa obtener_todos, obtener_por_id, obtener_por_usuario,
+    listar, crear_pedido, actualizar_pedido, eliminar_pedido, contar_pedidos,
+    estadisticas y las versiones en lote crear_pedidos, actualizar_pedidos y
+    eliminar_pedidos (todo o nada); los pedidos se devuelven como diccionarios.
+    """
+    
+    def _crear_pedidos_iniciales(self):
+        """Crear pedidos iniciales para demostración"""
+        for pedido_data in PEDIDOS_INICIALES:
+            self.crear_pedido(pedido_data)
+    
+    def iterar_lotes(self, tamano_lote, after_id=None, filtros=None):
+        """Generador de lotes de hasta tamano_lote registros, ordenados por ID.
+        
+        Cada lote se obtiene con listar() a partir del último ID entregado, así
+        que la iteración tolera inserciones y borrados concurrentes.
+        """
+        while True:
+            lote, hay_mas = self.listar(tamano_lote, after_id, filtros)
+            if lote:
+                yield lote
+            if not hay_mas:
+                return
+            after_id = lote[-1]["id"]
 
-# Base de datos en memoria para pedidos
-class PedidoDB:
+class EstadisticasPedidos:
+    """Agregados de los pedidos en memoria, mantenidos de forma incremental.
+    
+    Para el total y para cada valor de estado, usuario_id y producto se guarda
+    una tupla (pedidos, unidades, ingresos en céntimos) que PedidoDB actualiza
+    al crear, actualizar y eliminar (con su lock de escritura tomado), así que
+    consultar no recorre los pedidos. Las tuplas se reemplazan enteras y las
+    lecturas copian cada diccionario (dict.copy() es atómico), sin locks.
+    """
+    
     def __init__(self):
-        self.pedidos = []
-        self.next_id = 1
-        # Agregar algunos pedidos iniciales
+        self.total = (0, 0, 0)
+        self.grupos = {campo: {} for campo in AGRUPACIONES_PEDIDO}
+    
+    def sumar(self, pedido, signo=1):
+        """Añadir el pedido a los agregados (o quitarlo con signo=-1)"""
+        unidades = signo * pedido.cantidad
+        ingresos = unidades * pedido.precio_centimos
+        pedidos_total, unidades_total, ingresos_total = self.total
+        self.total = (pedidos_total + signo, unidades_total + unidades, ingresos_total + ingresos)
+        for campo, grupos in self.grupos.items():
+            clave = getattr(pedido, campo)
+            pedidos_grupo, unidades_grupo, ingresos_grupo = grupos.get(clave, (0, 0, 0))
+            if pedidos_grupo + signo == 0:
+                del grupos[clave]
+            else:
+                grupos[clave] = (pedidos_grupo + signo, unidades_grupo + unidades, ingresos_grupo + ingresos)
+    
+    def restar(self, pedido):
+        self.sumar(pedido, -1)
+    
+    def consultar(self, agrupaciones, top):
+        """Total y, por cada agrupación, los top grupos con más ingresos como (clave, pedidos, unidades, ingresos)"""
+        resultado = {"total": self.total}
+        for campo in agrupaciones:
+            grupos = self.grupos[campo].copy()
+            resultado[campo] = heapq.nlargest(
+                top, ((clave, *valores) for clave, valores in grupos.items()),
+                key=lambda grupo: (grupo[3], grupo[1]))
+        return resultado
+
+# Base de datos en memoria para pedidos (indexada por ID y por usuario)
+@operaciones_trazadas(trazas)
+class PedidoDB(PedidoDBBase):
+    """Pedidos en memoria, seguros con el servidor multihilo.
+    
+    Los registros publicados no se modifican nunca (copy-on-write): una
+    actualización crea un Pedido nuevo y lo publica con una sola
+    asignación, así que las lecturas no toman locks ni ven registros a medias.
+    Las listas de IDs solo crecen por el final o se reemplazan enteras. Las
+    escrituras se serializan con un lock y los IDs salen de un contador atómico
+    dentro de él, por lo que las listas de IDs siempre quedan ordenadas. Con
+    persistencia cada escritura se apunta en el WAL antes de publicarla y se
+    confirma en disco antes de devolverla; si el fsync falla se deshace (ver
+    _confirmar). Las operaciones en lote comprueban todos los IDs antes
+    de modificar nada y se apuntan como una sola entrada del WAL (todo o nada);
+    los lectores sí pueden ver un lote a medio aplicar.
+    """
+    
+    def __init__(self, persistencia=None):
+        self.pedidos = {}  # id -> pedido, en orden de creación
+        self.pedidos_por_usuario = {}  # usuario_id -> IDs crecientes de sus pedidos (puede contener obsoletos)
+        self._vivos_por_usuario = {}  # usuario_id -> número de pedidos actuales
+        self.ids_ordenados = []  # IDs crecientes para paginar con bisect (puede contener eliminados)
+        self._siguiente_id = 1  # asignador de IDs (solo se usa con el lock de escritura)
+        self._lock_escritura = threading.Lock()
+        self._estadisticas = EstadisticasPedidos()
+        self._persistencia = persistencia
+        self._no_durables = deque()  # (lsn, [(id, pedido anterior o None), ...]) de escrituras aún sin fsync
+        guardado = persistencia.cargar() if persistencia is not None else None
+        if guardado is not None:
+            registros, self._siguiente_id = guardado
+            self._publicar_tabla({i: Pedido.desde_diccionario(registro) for i, registro in registros.items()})
+        else:
+            # Agregar algunos pedidos iniciales
+            self._crear_pedidos_iniciales()
+    
+    def _publicar_tabla(self, pedidos):
+        """Reemplazar la tabla entera y reconstruir índices y estadísticas (al cargar o al deshacer)"""
+        self.pedidos = pedidos
+        self.ids_ordenados = list(pedidos)
+        self.pedidos_por_usuario = {}
+        self._vivos_por_usuario = {}
+        self._estadisticas = EstadisticasPedidos()
+        for pedido in pedidos.values():
+            self._indexar_por_usuario(pedido)
+            self._estadisticas.sumar(pedido)
+    
+    def _escribir(self, operaciones):
+        """Apuntar en el WAL y publicar escrituras [(operacion, pedido), ...] (con el lock de escritura tomado).
+        
+        Se publican solo después de apuntarlas, así que si el WAL falla no cambia
+        nada. Hasta que llegan a disco se guardan los registros anteriores para
+        poder deshacerlas. Devuelve el LSN (None sin persistencia).
+        """
+        lsn = None
+        if self._persistencia is not None and operaciones:
+            if len(operaciones) == 1:
+                lsn = self._persistencia.registrar(*operaciones[0])
+            else:
+                lsn = self._persistencia.registrar_lote(operaciones)
+            durable = self._persistencia.lsn_durable()
+            while self._no_durables and self._no_durables[0][0] <= durable:
+                self._no_durables.popleft()
+            self._no_durables.append((lsn, [(pedido.id, self.pedidos.get(pedido.id)) for _, pedido in operaciones]))
+        for operacion, pedido in operaciones:
+            if operacion == "crear":
+                self._insertar(pedido)
+            elif operacion == "actualizar":
+                self._sustituir(self.pedidos[pedido.id], pedido)
+            else:
+                self._quitar(pedido)
+        if lsn is not None and self._persistencia.necesita_snapshot():
+            self._persistencia.iniciar_snapshot(list(self.pedidos.values()), self._siguiente_id)
+        return lsn
+    
+    def _confirmar(self, lsn):
+        """Esperar a que la escritura esté en disco, ya sin el lock para que los fsync se agrupen.
+        
+        Si el fsync falla el WAL queda inutilizable y las escrituras que no
+        llegaron a disco (esta y las de las peticiones que esperan con ella) se
+        deshacen antes de propagar el error, para no servir datos que se
+        perderían al reiniciar.
+        """
+        if lsn is None:
+            return
+        try:
+            self._persistencia.esperar(lsn)
+        except OSError:
+            with self._lock_escritura:
+                self._deshacer_no_durables()
+            raise
+    
+    def _deshacer_no_durables(self):
+        """Volver a los registros anteriores a las escrituras sin fsync (con el lock de escritura tomado)"""
+        durable = self._persistencia.lsn_durable()
+        if not self._no_durables or self._no_durables[-1][0] <= durable:
+            return
+        pedidos = dict(self.pedidos)
+        while self._no_durables and self._no_durables[-1][0] > durable:
+            _, anteriores = self._no_durables.pop()
+            for pedido_id, anterior in reversed(anteriores):
+                if anterior is None:
+                    pedidos.pop(pedido_id, None)
+                else:
+                    pedidos[pedido_id] = anterior
+        self._no_durables.clear()
+        # Los pedidos eliminados que se restauran vuelven a su posición por ID
+        self._publicar_tabla(dict(sorted(pedidos.items())))
+        logs.warning("Escrituras deshechas por un error del WAL", lsn_durable=durable, pedidos=len(pedidos))
+    
+    def _indexar_por_usuario(self, pedido):
+        usuario_id = pedido.usuario_id
+        ids = self.pedidos_por_usuario.get(usuario_id)
+        if ids is None:
+            self.pedidos_por_usuario[usuario_id] = [pedido.id]
+        elif ids[-1] < pedido.id:
+            ids.append(pedido.id)
+        else:
+            # Pedido antiguo que cambia de usuario: lista nueva para no mover los IDs bajo los
+            # lectores (si vuelve a un usuario anterior su ID obsoleto sigue en la lista)
+            posicion = bisect_left(ids, pedido.id)
+            if posicion == len(ids) or ids[posicion] != pedido.id:
+                self.pedidos_por_usuario[usuario_id] = ids[:posicion] + [pedido.id] + ids[posicion:]
+        self._vivos_por_usuario[usuario_id] = self._vivos_por_usuario.get(usuario_id, 0) + 1
+    
+    def _desindexar_por_usuario(self, pedido):
+        # El ID queda obsoleto en la lista del usuario; se compacta cuando la mitad ya lo son
+        usuario_id = pedido.usuario_id
+        vivos = self._vivos_por_usuario.get(usuario_id, 0) - 1
+        if vivos <= 0:
+            self._vivos_por_usuario.pop(usuario_id, None)
+            self.pedidos_por_usuario.pop(usuario_id, None)
+            return
+        self._vivos_por_usuario[usuario_id] = vivos
+        ids = self.pedidos_por_usuario[usuario_id]
+        if len(ids) > 2 * vivos + 64:
+            self.pedidos_por_usuario[usuario_id] = [i for i in ids if self._es_del_usuario(i, usuario_id)]
+    
+    def _es_del_usuario(self, pedido_id, usuario_id):
+        pedido = self.pedidos.get(pedido_id)
+        return pedido is not None and pedido.usuario_id == usuario_id
+    
+    def obtener_todos(self):
+        """Obtener todos los pedidos (foto consistente: dict.copy() es atómico)"""
+        return list(self.pedidos.copy().values())
+    
+    def obtener_por_id(self, pedido_id):
+        """Obtener pedido por ID"""
+        return self.pedidos.get(pedido_id)
+    
+    def obtener_por_usuario(self, usuario_id):
+        """Obtener pedidos por usuario"""
+        pedidos = (self.pedidos.get(i) for i in self.pedidos_por_usuario.get(usuario_id, ()))
+        return [p for p in pedidos if p is not None and p.usuario_id == usuario_id]
+    
+    def listar(self, limit, after_id=None, filtros=None):
+        """Página de pedidos ordenada por ID, sin copiar la tabla completa.
+        
+        Devuelve (pedidos, hay_mas). Con filtro por usuario_id se recorre solo
+        el índice secundario de ese usuario (el filtro se vuelve a comprobar en
+        cada registro porque el índice puede contener IDs obsoletos). Los filtros
+        se comparan con los atributos del Pedido (campos de FILTROS_PEDIDO).
+        """
+        if filtros and "usuario_id" in filtros:
+            ids = self.pedidos_por_usuario.get(filtros["usuario_id"], ())
+        else:
+            ids = self.ids_ordenados
+        inicio = bisect_right(ids, after_id) if after_id is not None else 0
+        pagina = []
+        for posicion in range(inicio, len(ids)):
+            pedido = self.pedidos.get(ids[posicion])
+            if pedido is None:
+                continue
+            if filtros and any(getattr(pedido, campo) != valor for campo, valor in filtros.items()):
+                continue
+            if len(pagina) == limit:
+                return pagina, True
+            pagina.append(pedido)
+        return pagina, False
+    
+    @staticmethod
+    def _nuevo_pedido(datos_pedido):
+        """Pedido sin ID a partir de los datos de la petición"""
+        return Pedido(
+            None,
+            datos_pedido.get("usuario_id"),
+            datos_pedido.get("producto", ""),
+            datos_pedido.get("cantidad", 1),
+            datos_pedido.get("precio", 0.00),
+            datos_pedido.get("estado", "pendiente"),
+            ahora_ms()
+        )
+    
+    def _asignar_id(self, nuevo_pedido):
+        """Dar ID a un pedido nuevo antes de apuntarlo (con el lock de escritura tomado)"""
+        nuevo_pedido.id = self._siguiente_id
+        self._siguiente_id += 1
+    
+    def _insertar(self, nuevo_pedido):
+        """Publicar un pedido nuevo (con el lock de escritura tomado)"""
+        self.pedidos[nuevo_pedido.id] = nuevo_pedido
+        self.ids_ordenados.append(nuevo_pedido.id)
+        self._indexar_por_usuario(nuevo_pedido)
+        self._estadisticas.sumar(nuevo_pedido)
+    
+    @staticmethod
+    def _actualizado(pedido, datos_actualizados):
+        """Copia actualizada del pedido, todavía sin publicar"""
+        # Solo los campos editables proporcionados
+        cambios = {campo: valor for campo, valor in datos_actualizados.items() if campo in CAMPOS_EDITABLES_PEDIDO}
+        return Pedido.desde_diccionario({**pedido, **cambios, "fecha_actualizacion": ahora_ms()})
+    
+    def _sustituir(self, pedido, actualizado):
+        """Publicar la copia actualizada de un pedido (con el lock de escritura tomado)"""
+        self.pedidos[pedido.id] = actualizado
+        if actualizado.usuario_id != pedido.usuario_id:
+            self._desindexar_por_usuario(pedido)
+            self._indexar_por_usuario(actualizado)
+        self._estadisticas.restar(pedido)
+        self._estadisticas.sumar(actualizado)
+    
+    def _quitar(self, pedido):
+        """Eliminar un pedido existente (con el lock de escritura tomado)"""
+        del self.pedidos[pedido.id]
+        self._desindexar_por_usuario(pedido)
+        self._estadisticas.restar(pedido)
+        # Compactar la lista de IDs cuando la mitad ya son eliminados (los lectores
+        # que estén recorriendo la lista anterior la siguen usando sin problema)
+        if len(self.ids_ordenados) > 2 * len(self.pedidos) + 64:
+            self.ids_ordenados = [i for i in self.ids_ordenados if i in self.pedidos]
+    
+    def crear_pedido(self, datos_pedido):
+        """Crear nuevo pedido"""
+        nuevo_pedido = self._nuevo_pedido(datos_pedido)
+        with self._lock_escritura:
+            self._asignar_id(nuevo_pedido)
+            lsn = self._escribir([("crear", nuevo_pedido)])
+        self._confirmar(lsn)
+        return nuevo_pedido
+    
+    def actualizar_pedido(self, pedido_id, datos_actualizados):
+        """Actualizar pedido existente (publica una copia nueva del registro)"""
+        with self._lock_escritura:
+            pedido = self.pedidos.get(pedido_id)
+            if pedido is None:
+                return None
+            actualizado = self._actualizado(pedido, datos_actualizados)
+            lsn = self._escribir([("actualizar", actualizado)])
+        self._confirmar(lsn)
+        return actualizado
+    
+    def eliminar_pedido(self, pedido_id):
+        """Eliminar pedido"""
+        with self._lock_escritura:
+            pedido = self.pedidos.get(pedido_id)
+            if pedido is None:
+                return None
+            lsn = self._escribir([("eliminar", pedido)])
+        self._confirmar(lsn)
+        return pedido
+    
+    def crear_pedidos(self, lista_datos):
+        """Crear varios pedidos de una vez (un solo lock y una sola entrada en el WAL)"""
+        nuevos = [self._nuevo_pedido(datos_pedido) for datos_pedido in lista_datos]
+        with self._lock_escritura:
+            for nuevo_pedido in nuevos:
+                self._asignar_id(nuevo_pedido)
+            lsn = self._escribir([("crear", pedido) for pedido in nuevos])
+        self._confirmar(lsn)
+        return nuevos
+    
+    def actualizar_pedidos(self, cambios_por_id):
+        """Actualizar varios pedidos [(pedido_id, datos), ...]: todos o ninguno.
+        
+        Devuelve (actualizados, ids_no_encontrados); si falta algún ID no se
+        modifica nada.
+        """
+        with self._lock_escritura:
+            no_encontrados = [pedido_id for pedido_id, _ in cambios_por_id if pedido_id not in self.pedidos]
+            if no_encontrados:
+                return [], no_encontrados
+            actualizados = [self._actualizado(self.pedidos[pedido_id], datos) for pedido_id, datos in cambios_por_id]
+            lsn = self._escribir([("actualizar", pedido) for pedido in actualizados])
+        self._confirmar(lsn)
+        return actualizados, []
+    
+    def eliminar_pedidos(self, pedido_ids):
+        """Eliminar varios pedidos: todos o ninguno. Devuelve (eliminados, ids_no_encontrados)"""
+        pedido_ids = list(dict.fromkeys(pedido_ids))
+        with self._lock_escritura:
+            pedidos = [self.pedidos.get(pedido_id) for pedido_id in pedido_ids]
+            no_encontrados = [pedido_id for pedido_id, pedido in zip(pedido_ids, pedidos) if pedido is None]
+            if no_encontrados:
+                return [], no_encontrados
+            lsn = self._escribir([("eliminar", pedido) for pedido in pedidos])
+        self._confirmar(lsn)
+        return pedidos, []
+    
+    def contar_pedidos(self):
+        """Contar total de pedidos"""
+        return len(self.pedidos)
+    
+    def estadisticas(self, agrupaciones, top):
+        """Agregados mantenidos de forma incremental (ver EstadisticasPedidos.consultar)"""
+        return self._estadisticas.consultar(agrupaciones, top)
+
+# Base de datos SQLite para pedidos, compartida por varios procesos
+@operaciones_trazadas(trazas)
+class PedidoDBSQLite(PedidoDBBase):
+    """Pedidos en un fichero SQLite en modo WAL.
+    
+    Los lectores no bloquean al escritor y los workers de gunicorn comparten
+    los datos. Cada hilo usa su propia conexión; las sentencias son fijas y
+    parametrizadas, así que sqlite3 las reutiliza preparadas desde su cache.
+    Los IDs los asigna SQLite (AUTOINCREMENT) y no colisionan entre procesos.
+    """
+    
+    COLUMNAS = ("id", "usuario_id", "producto", "cantidad", "precio", "estado",
+                "fecha_creacion", "fecha_actualizacion")
+    
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS pedidos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER,
+            producto TEXT,
+            cantidad INTEGER,
+            precio REAL,
+            estado TEXT,
+            fecha_creacion INTEGER NOT NULL,
+            fecha_actualizacion INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS pedidos_usuario_id ON pedidos (usuario_id);
+    """
+    
+    SQL_AGREGADOS = ("COUNT(*) AS pedidos, COALESCE(SUM(cantidad), 0) AS unidades, "
+                     "COALESCE(SUM(cantidad * CAST(ROUND(precio * 100) AS INTEGER)), 0) AS ingresos")
+    
+    SQL_INSERTAR = ("INSERT INTO pedidos (usuario_id, producto, cantidad, precio, estado, fecha_creacion) "
+                    "VALUES (?, ?, ?, ?, ?, ?) RETURNING *")
+    # Cada campo editable lleva un indicador: solo se modifica si viene en la petición
+    SQL_ACTUALIZAR = ("UPDATE pedidos SET "
+                      + ", ".join(f"{campo} = CASE WHEN ? THEN ? ELSE {campo} END" for campo in CAMPOS_EDITABLES_PEDIDO)
+                      + ", fecha_actualizacion = ? WHERE id = ? RETURNING *")
+    
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        conexion = self._conexion()
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.executescript(self.ESQUEMA)
         self._crear_pedidos_iniciales()
     
+    def _conexion(self):
+        """Conexión del hilo actual (sqlite3 no comparte conexiones entre hilos)"""
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = self._local.conexion = conectar_sqlite(self.ruta, fila_a_diccionario)
+        return conexion
+    
     def _crear_pedidos_iniciales(self):
-        """Crear pedidos iniciales para demostración"""
-        pedidos_iniciales = [
-            {"usuario_id": 1, "producto": "Laptop", "cantidad": 1, "precio": 1200.00, "estado": "pendiente"},
-            {"usuario_id": 2, "producto": "Mouse", "cantidad": 2, "precio": 25.50, "estado": "pendiente"},
-            {"usuario_id": 3, "producto": "Teclado", "cantidad": 1, "precio": 75.00, "estado": "completado"}
-        ]
+        """Crear pedidos iniciales solo la primera vez que se crea la base de datos.
         
-        for pedido_data in pedidos_iniciales:
-            self.crear_pedido(pedido_data)
+        BEGIN IMMEDIATE serializa a los workers que arrancan a la vez.
+        """
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            if conexion.execute("SELECT 1 FROM sqlite_sequence WHERE name = 'pedidos'").fetchone() is None:
+                for pedido_data in PEDIDOS_INICIALES:
+                    self.crear_pedido(pedido_data)
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
     
     def obtener_todos(self):
         """Obtener todos los pedidos"""
-        return self.pedidos.copy()
+        return self._conexion().execute("SELECT * FROM pedidos ORDER BY id").fetchall()
     
     def obtener_por_id(self, pedido_id):
         """Obtener pedido por ID"""
-        for pedido in self.pedidos:
-            if pedido["id"] == pedido_id:
-                return pedido
-        return None
+        return self._conexion().execute("SELECT * FROM pedidos WHERE id = ?", (pedido_id,)).fetchone()
     
     def obtener_por_usuario(self, usuario_id):
         """Obtener pedidos por usuario"""
-        return [pedido for pedido in self.pedidos if pedido["usuario_id"] == usuario_id]
+        return self._conexion().execute(
+            "SELECT * FROM pedidos WHERE usuario_id = ? ORDER BY id", (usuario_id,)).fetchall()
+    
+    def listar(self, limit, after_id=None, filtros=None):
+        """Página de pedidos ordenada por ID (se pide un registro extra para saber si hay más).
+        
+        Con filtro por usuario_id SQLite recorre el índice de ese usuario.
+        """
+        condiciones = ["id > ?"]
+        parametros = [after_id if after_id is not None else 0]
+        for campo, valor in (filtros or {}).items():
+            if campo not in self.COLUMNAS:
+                raise ValueError(f"Campo de filtro desconocido: {campo}")
+            condiciones.append(f"{campo} = ?")
+            parametros.append(valor)
+        parametros.append(limit + 1)
+        pagina = self._conexion().execute(
+            f"SELECT * FROM pedidos WHERE {' AND '.join(condiciones)} ORDER BY id LIMIT ?", parametros
+        ).fetchall()
+        return pagina[:limit], len(pagina) > limit
     
     def crear_pedido(self, datos_pedido):
         """Crear nuevo pedido"""
-        nuevo_pedido = {
-            "id": self.next_id,
-            "usuario_id": datos_pedido.get("usuario_id"),
-            "producto": datos_pedido.get("producto", ""),
-            "cantidad": datos_pedido.get("cantidad", 1),
-            "precio": datos_pedido.get("precio", 0.00),
-            "estado": datos_pedido.get("estado", "pendiente"),
-            "fecha_creacion": str(os.popen('date').read().strip())
-        }
-        self.pedidos.append(nuevo_pedido)
-        self.next_id += 1
-        return nuevo_pedido
+        return self._conexion().execute(self.SQL_INSERTAR, (
+            datos_pedido.get("usuario_id"),
+            datos_pedido.get("producto", ""),
+            datos_pedido.get("cantidad", 1),
+            datos_pedido.get("precio", 0.00),
+            datos_pedido.get("estado", "pendiente"),
+            ahora_ms()
+        )).fetchone()
     
     def actualizar_pedido(self, pedido_id, datos_actualizados):
         """Actualizar pedido existente"""
-        for i, pedido in enumerate(self.pedidos):
-            if pedido["id"] == pedido_id:
-                # Actualizar solo los campos proporcionados
-                for campo, valor in datos_actualizados.items():
-                    if campo in pedido:
-                        pedido[campo] = valor
-                pedido["fecha_actualizacion"] = str(os.popen('date').read().strip())
-                return pedido
-        return None
+        parametros = []
+        for campo in CAMPOS_EDITABLES_PEDIDO:
+            parametros += [campo in datos_actualizados, datos_actualizados.get(campo)]
+        return self._conexion().execute(self.SQL_ACTUALIZAR, parametros + [ahora_ms(), pedido_id]).fetchone()
     
     def eliminar_pedido(self, pedido_id):
         """Eliminar pedido"""
-        for i, pedido in enumerate(self.pedidos):
-            if pedido["id"] == pedido_id:
-                return self.pedidos.pop(i)
-        return None
+        return self._conexion().execute("DELETE FROM pedidos WHERE id = ? RETURNING *", (pedido_id,)).fetchone()
     
     def contar_pedidos(self):
         """Contar total de pedidos"""
-        return len(self.pedidos)
+        return self._conexion().execute("SELECT COUNT(*) AS total FROM pedidos").fetchone()["total"]
+    
+    def _aplicar_en_transaccion(self, operacion, argumentos):
+        """Aplicar operacion(*args) a cada tupla de argumentos en una sola transacción.
+        
+        Devuelve (resultados, ids_no_encontrados): si alguna operación no
+        encuentra su registro se deshace la transacción entera.
+        """
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            resultados = [operacion(*args) for args in argumentos]
+            no_encontrados = [args[0] for args, resultado in zip(argumentos, resultados) if resultado is None]
+            conexion.execute("ROLLBACK" if no_encontrados else "COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+        return ([] if no_encontrados else resultados), no_encontrados
+    
+    def crear_pedidos(self, lista_datos):
+        """Crear varios pedidos en una sola transacción"""
+        return self._aplicar_en_transaccion(self.crear_pedido, [(datos,) for datos in lista_datos])[0]
+    
+    def actualizar_pedidos(self, cambios_por_id):
+        """Actualizar varios pedidos [(pedido_id, datos), ...] en una transacción: todos o ninguno"""
+        return self._aplicar_en_transaccion(self.actualizar_pedido, cambios_por_id)
+    
+    def eliminar_pedidos(self, pedido_ids):
+        """Eliminar varios pedidos en una transacción: todos o ninguno"""
+        return self._aplicar_en_transaccion(self.eliminar_pedido, [(pedido_id,) for pedido_id in dict.fromkeys(pedido_ids)])
+    
+    def estadisticas(self, agrupaciones, top):
+        """Agregados calculados por SQLite en cada consulta (los datos cambian desde otros workers).
+        
+        Mismo formato que EstadisticasPedidos.consultar, con los ingresos en céntimos.
+        """
+        conexion = self._conexion()
+        total = conexion.execute(f"SELECT {self.SQL_AGREGADOS} FROM pedidos").fetchone()
+        resultado = {"total": (total["pedidos"], total["unidades"], total["ingresos"])}
+        for campo in agrupaciones:
+            if campo not in AGRUPACIONES_PEDIDO:
+                raise ValueError(f"Agrupación desconocida: {campo}")
+            filas = conexion.execute(
+                f"SELECT {campo} AS clave, {self.SQL_AGREGADOS} FROM pedidos GROUP BY {campo} "
+                "ORDER BY ingresos DESC, pedidos DESC LIMIT ?", (top,)
+            ).fetchall()
+            resultado[campo] = [(f["clave"], f["pedidos"], f["unidades"], f["ingresos"]) for f in filas]
+        return resultado
+
+def serializar_pedido(pedido, campos=None):
+    """Copia del pedido lista para JSON, con las fechas en ISO-8601"""
+    datos = proyectar(pedido, campos) if campos else dict(pedido)
+    for campo in ("fecha_creacion", "fecha_actualizacion"):
+        if campo in datos:
+            datos[campo] = formatear_fecha(datos[campo])
+    return datos
+
+def crear_base_datos():
+    """Crear el backend de base de datos configurado en DB_BACKEND"""
+    if DB_BACKEND == 'sqlite':
+        logs.info("Base de datos SQLite (WAL)", ruta=DB_PATH)
+        return PedidoDBSQLite(DB_PATH)
+    if PERSISTENCIA:
+        logs.info("Persistencia activada", directorio=PERSISTENCIA_DIR, fsync=WAL_FSYNC, snapshot_cada=SNAPSHOT_CADA)
+        return PedidoDB(Persistencia(PERSISTENCIA_DIR, 'pedidos', WAL_FSYNC != 'escritura', SNAPSHOT_CADA, logs))
+    return PedidoDB()
 
 # Instancia global de la base de datos
-db_pedidos = PedidoDB()
+db_pedidos = crear_base_datos()
 
 # ===== FUNCIONES DE AUTENTICACIÓN =====
+# API key, llamadas internas firmadas y JWT: ver comun/autenticacion.py
 
-def verificar_api_key():
-    """Verificar API key en headers"""
+verificador_jwt = VerificadorJWT(app, CACHE_JWT_MAX, logs)
+metricas.registrar_colector('jwt', lambda: series_cache("jwt_cache", verificador_jwt.cache.estadisticas()))
+autenticacion = Autenticacion(SERVICIO, API_KEY, SECRETO_INTERNO, TOKEN_INTERNO_TTL, verificador_jwt, logs)
+
+def headers_llamada_interna(destino, identidad=None):
+    """Headers para llamar a otro microservicio en nombre de la identidad de la petición actual"""
     if not AUTH_REQUIRED:
-        return True
-    
-    api_key = request.headers.get('X-API-Key')
-    return api_key == API_KEY
+        return {}
+    if identidad is None and has_request_context():
+        identidad = g.get('identidad')
+    return autenticacion.headers_llamada_interna(destino, identidad)
 
 def verificar_autenticacion():
-    """Verificar autenticación (API key o JWT)"""
+    """Verificar autenticación (llamada interna, API key o JWT) y guardar la identidad en g.identidad"""
     if not AUTH_REQUIRED:
         return True
     
-    # Verificar API key
-    if verificar_api_key():
-        print("✅ [PEDIDO-SERVICE] Autenticación exitosa con API Key")
-        return True
-    
-    # Verificar JWT token
-    try:
-        from flask_jwt_extended import verify_jwt_in_request
-        verify_jwt_in_request()
-        identity = get_jwt_identity()
-        if identity:
-            print(f"✅ [PEDIDO-SERVICE] Autenticación exitosa con JWT para usuario: {identity}")
-            return True
-    except Exception as e:
-        print(f"❌ [PEDIDO-SERVICE] Error en autenticación JWT: {e}")
-    
-    print("❌ [PEDIDO-SERVICE] Autenticación fallida")
-    return False
+    identidad = autenticacion.identidad_peticion(request.headers, request.path)
+    if identidad is None:
+        return False
+    g.identidad = identidad
+    return True
 
 def requiere_autenticacion(f):
     """Decorador para requerir autenticación en endpoints"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not verificar_autenticacion():
+        with trazas.span("autenticacion"):
+            autenticado = verificar_autenticacion()
+        if not autenticado:
             return jsonify({
                 'error': 'No autorizado',
                 'mensaje': 'Se requiere autenticación válida (API Key o JWT Token)',
@@ -143,32 +901,300 @@ def requiere_autenticacion(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# ===== CACHE LOCAL DE USUARIOS =====
+
+class CacheUsuarios:
+    """Cache LRU en memoria con expiración por entrada para usuarios remotos.
+    
+    Un usuario caducado se conserva obsoleto_segundos más por si usuario-service
+    no responde (obtener_obsoleto); las invalidaciones sí lo eliminan.
+    """
+    
+    def __init__(self, max_entradas, ttl_segundos, compartidas=None, obsoleto_segundos=0):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.compartidas = compartidas  # InvalidacionesCompartidas con varios workers
+        self.obsoleto_segundos = obsoleto_segundos
+        self._entradas = OrderedDict()  # usuario_id -> (expira_en, usuario)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidaciones = 0
+        self.obsoletos_servidos = 0
+    
+    def obtener(self, usuario_id):
+        """Obtener usuario de la cache o None si no está o expiró"""
+        with self._lock:
+            entrada = self._entradas.get(usuario_id)
+            if entrada is None:
+                self.misses += 1
+                return None
+            ahora = time.monotonic()
+            if entrada[0] < ahora:
+                if entrada[0] + self.obsoleto_segundos < ahora:
+                    del self._entradas[usuario_id]
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(usuario_id)
+            self.hits += 1
+            return entrada[1]
+    
+    def obtener_obsoleto(self, usuario_id):
+        """Último usuario guardado aunque haya caducado (hace menos de obsoleto_segundos), o None"""
+        with self._lock:
+            entrada = self._entradas.get(usuario_id)
+            if entrada is None or entrada[0] + self.obsoleto_segundos < time.monotonic():
+                return None
+            self.obsoletos_servidos += 1
+            return entrada[1]
+    
+    def guardar(self, usuario_id, usuario):
+        """Guardar usuario desalojando el menos usado si se supera el límite"""
+        if self.max_entradas <= 0:
+            return
+        with self._lock:
+            self._entradas[usuario_id] = (time.monotonic() + self.ttl_segundos, usuario)
+            self._entradas.move_to_end(usuario_id)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidar(self, usuario_ids=None):
+        """Invalidar los usuarios indicados (o toda la cache si no se indican) en todos los workers"""
+        if self.compartidas is not None:
+            self.compartidas.publicar(usuario_ids)
+        return self._invalidar_local(usuario_ids)
+    
+    def sincronizar(self):
+        """Aplicar las invalidaciones publicadas por otros workers desde la última consulta"""
+        if self.compartidas is None:
+            return
+        usuario_ids = self.compartidas.pendientes()
+        if usuario_ids is None or usuario_ids:
+            self._invalidar_local(usuario_ids)
+    
+    def _invalidar_local(self, usuario_ids):
+        with self._lock:
+            if usuario_ids is None:
+                eliminados = len(self._entradas)
+                self._entradas.clear()
+            else:
+                eliminados = sum(1 for i in usuario_ids if self._entradas.pop(i, None) is not None)
+            self.invalidaciones += eliminados
+            return eliminados
+    
+    def estadisticas(self):
+        """Contadores de uso de la cache"""
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl_segundos,
+                "obsoleto_segundos": self.obsoleto_segundos,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidaciones": self.invalidaciones,
+                "obsoletos_servidos": self.obsoletos_servidos,
+                "hit_ratio": round(self.hits / consultas, 4) if consultas else 0.0
+            }
+
+class InvalidacionesCompartidas:
+    """Invalidaciones de la cache de usuarios compartidas entre workers mediante SQLite.
+    
+    usuario-service avisa a un solo worker; ese worker apunta la invalidación en
+    la base de datos compartida y el resto la aplica en su siguiente consulta.
+    Las entradas más antiguas que lo que dura un usuario en la cache (TTL más el
+    tiempo que se conserva caducado) ya no hacen falta y se purgan.
+    """
+    
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS invalidaciones_usuarios (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER,
+            fecha INTEGER NOT NULL
+        );
+    """
+    
+    def __init__(self, ruta, ttl_segundos):
+        self.ruta = ruta
+        self.ttl_ms = int(ttl_segundos * 1000)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        conexion = self._conexion()
+        conexion.executescript(self.ESQUEMA)
+        self._ultima = conexion.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidaciones_usuarios").fetchone()[0]
+    
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = self._local.conexion = conectar_sqlite(self.ruta, None)
+        return conexion
+    
+    def publicar(self, usuario_ids):
+        """Apuntar una invalidación (usuario_id NULL significa toda la cache)"""
+        ahora = ahora_ms()
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            conexion.executemany("INSERT INTO invalidaciones_usuarios (usuario_id, fecha) VALUES (?, ?)",
+                                 [(i, ahora) for i in (usuario_ids if usuario_ids is not None else [None])])
+            conexion.execute("DELETE FROM invalidaciones_usuarios WHERE fecha < ?", (ahora - self.ttl_ms,))
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+    
+    def pendientes(self):
+        """IDs invalidados desde la última consulta (None si hay que vaciar toda la cache)"""
+        with self._lock:
+            filas = self._conexion().execute(
+                "SELECT seq, usuario_id FROM invalidaciones_usuarios WHERE seq > ? ORDER BY seq", (self._ultima,)
+            ).fetchall()
+            if not filas:
+                return []
+            self._ultima = filas[-1][0]
+        usuario_ids = [usuario_id for _, usuario_id in filas]
+        return None if None in usuario_ids else usuario_ids
+
+# Instancia global de la cache de usuarios (con SQLite las invalidaciones llegan a todos los workers)
+cache_usuarios = CacheUsuarios(
+    CACHE_USUARIOS_MAX, CACHE_USUARIOS_TTL,
+    InvalidacionesCompartidas(DB_PATH, CACHE_USUARIOS_TTL + CACHE_USUARIOS_OBSOLETO) if DB_BACKEND == 'sqlite' else None,
+    CACHE_USUARIOS_OBSOLETO
+)
+
+def series_cache_usuarios():
+    estadisticas = cache_usuarios.estadisticas()
+    return series_cache("user_cache", estadisticas) + [
+        ("user_cache_invalidations_total", (), estadisticas["invalidaciones"]),
+        ("user_cache_stale_served_total", (), estadisticas["obsoletos_servidos"])
+    ]
+
+metricas.registrar_colector('cache_usuarios', series_cache_usuarios)
+
 # ===== COMUNICACIÓN CON OTROS MICROSERVICIOS =====
 
-def obtener_usuario_desde_servicio(usuario_id):
-    """Obtener información de usuario desde el microservicio de usuarios"""
+# Cliente con pool de conexiones, circuito y presupuesto de reintentos hacia usuario-service
+cliente_usuarios = ClienteHTTP(
+    'usuario-service', USUARIO_SERVICE_URL, USUARIO_SERVICE_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+    Circuito('usuario-service', CIRCUITO_FALLOS, CIRCUITO_ESPERA, metricas, logs),
+    PresupuestoReintentos(REINTENTOS_PROPORCION, REINTENTOS_MINIMO_POR_SEGUNDO, REINTENTOS_MAX, REINTENTOS_ESPERA_BASE),
+    metricas, trazas
+)
+
+metricas.registrar_colector('pools', lambda: series_pools([cliente_usuarios]))
+metricas.registrar_colector('circuitos', lambda: series_circuitos([cliente_usuarios.circuito]))
+
+class UsuarioServiceNoDisponible(Exception):
+    """usuario-service no respondió y no se admite la copia caducada de la cache"""
+
+def usuario_obsoleto(usuario_id, obsoleto):
+    """Copia caducada del usuario cuando usuario-service no responde (con obsoleto=False, la excepción)"""
+    if not obsoleto:
+        raise UsuarioServiceNoDisponible()
+    return cache_usuarios.obtener_obsoleto(usuario_id)
+
+def respuesta_usuario_service_no_disponible():
+    return jsonify({
+        "error": "usuario-service no está disponible para comprobar el usuario",
+        "mensaje": "Inténtalo de nuevo en unos segundos",
+        "servicio": "pedido-service"
+    }), 503
+
+def obtener_usuario_desde_servicio(usuario_id, obsoleto=True):
+    """Obtener información de usuario desde el microservicio de usuarios.
+    
+    Si usuario-service no responde (o el circuito está abierto) se devuelve la
+    última copia del usuario en la cache aunque haya caducado. Las escrituras
+    pasan obsoleto=False para no aceptar pedidos de un usuario que pudo
+    eliminarse mientras tanto: entonces se lanza UsuarioServiceNoDisponible.
+    """
+    cache_usuarios.sincronizar()
+    usuario = cache_usuarios.obtener(usuario_id)
+    if usuario is not None:
+        return usuario
+    
     try:
-        headers = {}
-        if AUTH_REQUIRED and API_KEY:
-            headers['X-API-Key'] = API_KEY
-        
-        response = requests.get(
-            f"{USUARIO_SERVICE_URL}/usuarios/{usuario_id}",
-            headers=headers,
-            timeout=5
-        )
+        response = cliente_usuarios.request('GET', f"/usuarios/{usuario_id}",
+                                            headers=headers_llamada_interna('usuario-service'))
         
         if response.status_code == 200:
             data = response.json()
-            print(f"✅ [PEDIDO-SERVICE] Usuario obtenido desde usuario-service: {data}")
-            return data.get('usuario')
+            logs.debug_muestreado("Usuario obtenido de usuario-service", usuario_id=usuario_id)
+            usuario = data.get('usuario')
+            if usuario:
+                cache_usuarios.guardar(usuario_id, usuario)
+            return usuario
         else:
-            print(f"❌ [PEDIDO-SERVICE] Error obteniendo usuario: {response.status_code}")
-            return None
+            logs.warning("Error obteniendo usuario de usuario-service", usuario_id=usuario_id, estado=response.status_code)
+            return usuario_obsoleto(usuario_id, obsoleto) if response.status_code >= 500 else None
             
+    except LlamadaRechazada as e:
+        logs.debug_muestreado("Llamada a usuario-service rechazada", usuario_id=usuario_id, motivo=e.motivo)
+        return usuario_obsoleto(usuario_id, obsoleto)
     except requests.exceptions.RequestException as e:
-        print(f"❌ [PEDIDO-SERVICE] Error de comunicación con usuario-service: {e}")
-        return None
+        logs.error("Error de comunicación con usuario-service", error=str(e))
+        return usuario_obsoleto(usuario_id, obsoleto)
+
+def obtener_usuarios_desde_servicio(usuario_ids, obsoleto=True):
+    """Obtener varios usuarios con una sola petición por lote a usuario-service.
+    
+    Devuelve un diccionario {usuario_id: usuario}; los usuarios que no existen
+    o que no se pudieron obtener simplemente no aparecen en el resultado. Los de
+    un lote que falló se toman de la cache aunque hayan caducado, salvo con
+    obsoleto=False (escrituras), que lanza UsuarioServiceNoDisponible.
+    """
+    cache_usuarios.sincronizar()
+    usuarios = {}
+    ids_unicos = []
+    for usuario_id in dict.fromkeys(usuario_ids):
+        usuario = cache_usuarios.obtener(usuario_id)
+        if usuario is not None:
+            usuarios[usuario_id] = usuario
+        else:
+            ids_unicos.append(usuario_id)
+    if not ids_unicos:
+        return usuarios
+    
+    headers = headers_llamada_interna('usuario-service')
+    fallidos = []
+    for inicio in range(0, len(ids_unicos), MAX_IDS_POR_LOTE):
+        lote = ids_unicos[inicio:inicio + MAX_IDS_POR_LOTE]
+        try:
+            response = cliente_usuarios.request(
+                'GET', "/usuarios",
+                params={'ids': ','.join(str(i) for i in lote)},
+                headers=headers
+            )
+            
+            if response.status_code == 200:
+                for usuario in response.json().get('usuarios', []):
+                    usuarios[usuario['id']] = usuario
+                    cache_usuarios.guardar(usuario['id'], usuario)
+            else:
+                logs.warning("Error obteniendo lote de usuarios de usuario-service", estado=response.status_code)
+                if response.status_code >= 500:
+                    fallidos.extend(lote)
+                
+        except LlamadaRechazada as e:
+            logs.debug_muestreado("Llamada a usuario-service rechazada", motivo=e.motivo, usuarios=len(lote))
+            fallidos.extend(lote)
+        except requests.exceptions.RequestException as e:
+            logs.error("Error de comunicación con usuario-service", error=str(e))
+            fallidos.extend(lote)
+    
+    for usuario_id in fallidos:
+        usuario = usuario_obsoleto(usuario_id, obsoleto)
+        if usuario is not None:
+            usuarios[usuario_id] = usuario
+    
+    logs.debug_muestreado("Lote de usuarios obtenido de usuario-service", consultados=len(ids_unicos), disponibles=len(usuarios))
+    return usuarios
+
+monitor_salud = MonitorSalud([cliente_usuarios], HEALTH_INTERVALO, HEALTH_TIMEOUT, logs)
 
 # ===== RUTAS DEL MICROSERVICIO DE PEDIDOS =====
 
@@ -185,14 +1211,29 @@ def index():
         },
         "endpoints": {
             "pedidos": [
-                "GET /pedidos - Obtener todos los pedidos",
+                "GET /pedidos - Obtener pedidos (limit, after_id, fields, estado, usuario_id, producto)",
+                "GET /pedidos con 'Accept: application/x-ndjson' - Colección completa en streaming",
                 "GET /pedidos/{id} - Obtener pedido por ID",
+                "GET /pedidos/stats - Pedidos, unidades e ingresos por estado, usuario_id y producto (agrupar, top)",
                 "POST /pedidos - Crear nuevo pedido",
                 "PUT /pedidos/{id} - Actualizar pedido",
-                "DELETE /pedidos/{id} - Eliminar pedido"
+                "DELETE /pedidos/{id} - Eliminar pedido",
+                "POST /pedidos/bulk - Crear varios pedidos (array JSON o NDJSON, todos o ninguno)",
+                "PATCH /pedidos/bulk - Actualizar varios pedidos (un objeto con 'id' por elemento)",
+                "DELETE /pedidos/bulk - Eliminar varios pedidos (IDs)"
+            ],
+            "cache": [
+                "GET /cache/usuarios - Estadísticas de la cache de usuarios",
+                "POST /cache/usuarios/invalidar - Invalidar usuarios de la cache"
+            ],
+            "pool": [
+                "GET /pool - Estadísticas del pool de conexiones hacia usuario-service"
             ],
             "health": [
-                "GET /health - Estado del servicio"
+                "GET /health - Estado del servicio",
+                "GET /metrics - Métricas para Prometheus",
+                "GET /trazas - Peticiones más lentas trazadas (limit)",
+                "GET /trazas/{trace_id} - Spans de una traza"
             ]
         },
         "autenticacion_requerida": AUTH_REQUIRED
@@ -201,84 +1242,195 @@ def index():
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check del servicio"""
-    # Verificar conectividad con usuario-service
-    usuario_service_status = "disconnected"
-    try:
-        response = requests.get(f"{USUARIO_SERVICE_URL}/health", timeout=3)
-        if response.status_code == 200:
-            usuario_service_status = "connected"
-    except:
-        pass
+    # Conectividad con usuario-service según el último sondeo del monitor
+    dependencias = monitor_salud.snapshot()
     
     return jsonify({
         "servicio": "pedido-service",
         "estado": "healthy",
-        "timestamp": str(os.popen('date').read().strip()),
+        "timestamp": timestamp_actual(),
         "dependencias": {
-            "usuario-service": usuario_service_status
-        }
+            nombre: "connected" if estado['estado'] == 'healthy' else "disconnected"
+            for nombre, estado in dependencias.items()
+        },
+        "dependencias_detalle": dependencias
+    })
+
+@app.route("/trazas", methods=["GET"])
+@requiere_autenticacion
+def trazas_lentas():
+    """Peticiones más lentas entre las trazas guardadas en memoria por este worker"""
+    limite = request.args.get('limit', 20, type=int)
+    return jsonify({"peticiones": trazas.peticiones_lentas(limite), "servicio": "pedido-service"})
+
+@app.route("/trazas/<trace_id>", methods=["GET"])
+@requiere_autenticacion
+def obtener_traza(trace_id):
+    """Spans de una traza registrados por este servicio (todos los workers si hay TRAZAS_ARCHIVO)"""
+    return jsonify({"trace_id": trace_id, "spans": trazas.buscar(trace_id.lower()), "servicio": "pedido-service"})
+
+@app.route("/metrics", methods=["GET"])
+def exponer_metricas_prometheus():
+    """Métricas en el formato de texto de Prometheus (de todos los workers)"""
+    valores = valores_metricas(metricas, metricas_procesos)
+    # La tabla se cuenta aquí y no en cada worker: con SQLite la comparten todos
+    valores[("db_table_rows", (("table", "pedidos"),))] = db_pedidos.contar_pedidos()
+    return Response(exponer_metricas(valores, DEFINICION_METRICAS), content_type=CONTENT_TYPE_METRICAS)
+
+@app.route("/cache/usuarios", methods=["GET"])
+@requiere_autenticacion
+def estadisticas_cache_usuarios():
+    """Estadísticas de la cache local de usuarios"""
+    return jsonify({
+        "cache_usuarios": cache_usuarios.estadisticas(),
+        "servicio": "pedido-service"
+    })
+
+@app.route("/pool", methods=["GET"])
+@requiere_autenticacion
+def estadisticas_pool():
+    """Estadísticas del pool de conexiones hacia usuario-service"""
+    return jsonify({
+        "pools": {cliente_usuarios.nombre: cliente_usuarios.estadisticas()},
+        "servicio": "pedido-service"
+    })
+
+@app.route("/cache/usuarios/invalidar", methods=["POST"])
+@requiere_autenticacion
+def invalidar_cache_usuarios():
+    """Invalidar usuarios de la cache (lo llama usuario-service al actualizar o eliminar)"""
+    datos = request.get_json(silent=True) or {}
+    usuario_ids = datos.get("ids")
+    
+    if usuario_ids is not None and not isinstance(usuario_ids, list):
+        return jsonify({
+            "error": "El campo 'ids' debe ser una lista",
+            "servicio": "pedido-service"
+        }), 400
+    
+    eliminados = cache_usuarios.invalidar(usuario_ids)
+    logs.info("Cache de usuarios invalidada", usuarios=len(usuario_ids) if usuario_ids is not None else "todos", eliminados=eliminados)
+    return jsonify({
+        "invalidados": eliminados,
+        "servicio": "pedido-service"
     })
 
 @app.route("/pedidos", methods=["GET"])
 @requiere_autenticacion
 def obtener_pedidos():
-    """Obtener todos los pedidos con información del usuario"""
-    pedidos = db_pedidos.obtener_todos()
+    """Obtener pedidos paginados con información del usuario"""
+    streaming = acepta_ndjson(request)
+    try:
+        limit, after_id, filtros, campos = leer_parametros_listado(request, FILTROS_PEDIDO, LIMITE_PAGINA_DEFECTO, LIMITE_PAGINA_MAX, streaming)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "servicio": "pedido-service"
+        }), 400
+    
+    # Solo se consulta usuario-service si la proyección incluye datos del usuario
+    necesita_usuario = campos is None or "usuario" in campos or "servicio_usuario" in campos
+    
+    if streaming:
+        logs.debug_muestreado("Listado de pedidos en streaming NDJSON")
+        return Response(stream_with_context(generar_pedidos_ndjson(limit, after_id, filtros, campos, necesita_usuario)),
+                        mimetype=MIMETYPE_NDJSON)
+    
+    pedidos, hay_mas = db_pedidos.listar(limit, after_id, filtros)
     total = db_pedidos.contar_pedidos()
-    print(f"📋 [PEDIDO-SERVICE] Obteniendo todos los pedidos ({total} pedidos)")
+    logs.debug_muestreado("Listado de pedidos", devueltos=len(pedidos), total=total)
     
-    pedidos_con_usuario = []
-    for p in pedidos:
-        # Comunicación con el microservicio de usuarios
-        usuario = obtener_usuario_desde_servicio(p["usuario_id"])
-        nombre_usuario = usuario["nombre"] if usuario else "Usuario no encontrado"
-        
-        pedidos_con_usuario.append({
-            "id": p["id"],
-            "producto": p["producto"],
-            "cantidad": p.get("cantidad", 1),
-            "precio": p.get("precio", 0.00),
-            "estado": p.get("estado", "pendiente"),
-            "usuario_id": p["usuario_id"],
-            "usuario": nombre_usuario,
-            "fecha_creacion": p.get("fecha_creacion", ""),
-            "servicio_usuario": "usuario-service" if usuario else "error"
-        })
+    # Una sola petición a usuario-service para los usuarios distintos de la página
+    usuarios = obtener_usuarios_desde_servicio(p["usuario_id"] for p in pedidos) if necesita_usuario else {}
     
     return jsonify({
-        "pedidos": pedidos_con_usuario,
-        "total": len(pedidos_con_usuario),
+        "pedidos": [pedido_con_usuario(p, usuarios.get(p["usuario_id"]), campos) for p in pedidos],
+        "total": total,
+        "paginacion": {
+            "limit": limit,
+            "after_id": after_id,
+            "siguiente_after_id": pedidos[-1]["id"] if hay_mas else None
+        },
         "servicio": "pedido-service",
         "comunicacion_microservicios": True
     })
 
-@app.route("/pedidos", methods=["POST"])
+def pedido_con_usuario(p, usuario, campos=None):
+    """Pedido del listado enriquecido con el nombre de su usuario"""
+    return proyectar({
+        "id": p["id"],
+        "producto": p["producto"],
+        "cantidad": p.get("cantidad", 1),
+        "precio": p.get("precio", 0.00),
+        "estado": p.get("estado", "pendiente"),
+        "usuario_id": p["usuario_id"],
+        "usuario": usuario["nombre"] if usuario else "Usuario no encontrado",
+        "fecha_creacion": formatear_fecha(p.get("fecha_creacion")),
+        "servicio_usuario": "usuario-service" if usuario else "error"
+    }, campos)
+
+def generar_pedidos_ndjson(limit, after_id, filtros, campos, necesita_usuario):
+    """Generador NDJSON que recorre los pedidos por lotes con una búsqueda de usuarios por lote"""
+    pendientes = limit
+    for lote in db_pedidos.iterar_lotes(MAX_IDS_POR_LOTE, after_id, filtros):
+        if pendientes is not None:
+            lote = lote[:pendientes]
+            pendientes -= len(lote)
+        usuarios = obtener_usuarios_desde_servicio(p["usuario_id"] for p in lote) if necesita_usuario else {}
+        yield ''.join(linea_ndjson(pedido_con_usuario(p, usuarios.get(p["usuario_id"]), campos)) for p in lote)
+        if pendientes == 0:
+            return
+
+def formatear_agregado(pedidos, unidades, ingresos_centimos):
+    return {"pedidos": pedidos, "unidades": unidades, "ingresos": ingresos_centimos / 100}
+
+@app.route("/pedidos/stats", methods=["GET"])
 @requiere_autenticacion
-def crear_pedido():
-    """Crear nuevo pedido"""
-    datos_pedido = request.get_json()
+def estadisticas_pedidos():
+    """Número de pedidos, unidades e ingresos (cantidad * precio), en total y por estado, usuario_id y producto.
     
-    # Validaciones básicas
-    if not datos_pedido:
+    Cada agrupación devuelve sus top grupos con más ingresos. Con el backend en
+    memoria los agregados se mantienen al escribir y no se recorren los pedidos.
+    """
+    try:
+        agrupaciones, top = leer_parametros_estadisticas()
+    except ValueError as e:
         return jsonify({
-            "error": "Datos del pedido requeridos",
+            "error": str(e),
             "servicio": "pedido-service"
         }), 400
     
-    if not datos_pedido.get("usuario_id"):
-        return jsonify({
-            "error": "El campo 'usuario_id' es requerido",
-            "servicio": "pedido-service"
-        }), 400
+    inicio = time.perf_counter()
+    estadisticas = db_pedidos.estadisticas(agrupaciones, top)
+    respuesta = {"total": formatear_agregado(*estadisticas["total"])}
+    for campo in agrupaciones:
+        respuesta[f"por_{campo}"] = [
+            {campo: clave, **formatear_agregado(*valores)} for clave, *valores in estadisticas[campo]
+        ]
+    respuesta["top"] = top
+    respuesta["tiempo_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    respuesta["servicio"] = "pedido-service"
+    return jsonify(respuesta)
+
+@app.route("/pedidos", methods=["POST"])
+@requiere_autenticacion
+def crear_pedido():
+    """Crear nuevo pedido"""
+    datos_pedido = request.get_json()
     
-    if not datos_pedido.get("producto"):
+    # Validaciones básicas
+    error = validar_pedido_nuevo(datos_pedido)
+    if error:
         return jsonify({
-            "error": "El campo 'producto' es requerido",
+            "error": error,
             "servicio": "pedido-service"
         }), 400
     
-    # Validar que el usuario existe en el microservicio de usuarios
-    usuario = obtener_usuario_desde_servicio(datos_pedido['usuario_id'])
+    # Validar que el usuario existe en el microservicio de usuarios (sin copias caducadas)
+    try:
+        usuario = obtener_usuario_desde_servicio(datos_pedido['usuario_id'], obsoleto=False)
+    except UsuarioServiceNoDisponible:
+        return respuesta_usuario_service_no_disponible()
     if not usuario:
         return jsonify({
             "error": "Usuario no encontrado",
@@ -288,9 +1440,9 @@ def crear_pedido():
         }), 400
     
     nuevo_pedido = db_pedidos.crear_pedido(datos_pedido)
-    print(f"➕ [PEDIDO-SERVICE] Nuevo pedido creado: {nuevo_pedido}")
+    logs.info("Pedido creado", pedido_id=nuevo_pedido["id"], usuario_id=nuevo_pedido["usuario_id"])
     return jsonify({
-        "pedido": nuevo_pedido,
+        "pedido": serializar_pedido(nuevo_pedido),
         "mensaje": "Pedido creado exitosamente",
         "servicio": "pedido-service"
     }), 201
@@ -307,9 +1459,19 @@ def actualizar_pedido(id_pedido):
             "servicio": "pedido-service"
         }), 400
     
+    error_tipos = validar_campos_pedido(datos_actualizados)
+    if error_tipos:
+        return jsonify({
+            "error": error_tipos,
+            "servicio": "pedido-service"
+        }), 400
+    
     # Si se actualiza usuario_id, validar que el usuario existe
     if 'usuario_id' in datos_actualizados:
-        usuario = obtener_usuario_desde_servicio(datos_actualizados['usuario_id'])
+        try:
+            usuario = obtener_usuario_desde_servicio(datos_actualizados['usuario_id'], obsoleto=False)
+        except UsuarioServiceNoDisponible:
+            return respuesta_usuario_service_no_disponible()
         if not usuario:
             return jsonify({
                 "error": "Usuario no encontrado",
@@ -320,14 +1482,14 @@ def actualizar_pedido(id_pedido):
     pedido_actualizado = db_pedidos.actualizar_pedido(id_pedido, datos_actualizados)
     
     if pedido_actualizado:
-        print(f"✏️ [PEDIDO-SERVICE] Pedido {id_pedido} actualizado: {pedido_actualizado}")
+        logs.info("Pedido actualizado", pedido_id=id_pedido)
         return jsonify({
-            "pedido": pedido_actualizado,
+            "pedido": serializar_pedido(pedido_actualizado),
             "mensaje": "Pedido actualizado exitosamente",
             "servicio": "pedido-service"
         }), 200
     else:
-        print(f"❌ [PEDIDO-SERVICE] Pedido con ID {id_pedido} no encontrado para actualizar")
+        logs.info("Pedido no encontrado para actualizar", pedido_id=id_pedido)
         return jsonify({
             "error": "Pedido no encontrado",
             "id_buscado": id_pedido,
@@ -341,14 +1503,14 @@ def eliminar_pedido(id_pedido):
     pedido_eliminado = db_pedidos.eliminar_pedido(id_pedido)
     
     if pedido_eliminado:
-        print(f"🗑️ [PEDIDO-SERVICE] Pedido {id_pedido} eliminado: {pedido_eliminado}")
+        logs.info("Pedido eliminado", pedido_id=id_pedido)
         return jsonify({
-            "pedido_eliminado": pedido_eliminado,
+            "pedido_eliminado": serializar_pedido(pedido_eliminado),
             "mensaje": "Pedido eliminado exitosamente",
             "servicio": "pedido-service"
         }), 200
     else:
-        print(f"❌ [PEDIDO-SERVICE] Pedido con ID {id_pedido} no encontrado para eliminar")
+        logs.info("Pedido no encontrado para eliminar", pedido_id=id_pedido)
         return jsonify({
             "error": "Pedido no encontrado",
             "id_buscado": id_pedido,
@@ -359,7 +1521,6 @@ def eliminar_pedido(id_pedido):
 @requiere_autenticacion
 def obtener_pedido(id_pedido):
     """Obtener pedido por ID con información del usuario"""
-    print(f"🔍 [PEDIDO-SERVICE] Buscando pedido con ID: {id_pedido}")
     pedido = db_pedidos.obtener_por_id(id_pedido)
     
     if pedido:
@@ -375,29 +1536,128 @@ def obtener_pedido(id_pedido):
             "estado": pedido.get("estado", "pendiente"),
             "usuario_id": pedido["usuario_id"],
             "usuario": nombre_usuario,
-            "fecha_creacion": pedido.get("fecha_creacion", ""),
+            "fecha_creacion": formatear_fecha(pedido.get("fecha_creacion")),
             "servicio": "pedido-service",
             "comunicacion_microservicios": True,
             "servicio_usuario": "usuario-service" if usuario else "error"
         }
         
-        print(f"✅ [PEDIDO-SERVICE] Pedido encontrado: {resultado}")
+        logs.debug_muestreado("Pedido encontrado", pedido_id=id_pedido)
         return jsonify(resultado)
     
-    print(f"❌ [PEDIDO-SERVICE] Pedido con ID {id_pedido} no encontrado")
+    logs.debug_muestreado("Pedido no encontrado", pedido_id=id_pedido)
     return jsonify({
         "error": "Pedido no encontrado",
         "id_buscado": id_pedido,
         "servicio": "pedido-service"
     }), 404
 
+def validar_usuarios_del_lote(elementos, errores):
+    """Comprobar con una sola búsqueda deduplicada que existen los usuario_id del lote.
+    
+    Lanza UsuarioServiceNoDisponible si usuario-service no responde.
+    """
+    usuarios = obtener_usuarios_desde_servicio(
+        (datos["usuario_id"] for datos in elementos if isinstance(datos, dict) and "usuario_id" in datos),
+        obsoleto=False)
+    for indice, datos in enumerate(elementos):
+        if isinstance(datos, dict) and "usuario_id" in datos and datos["usuario_id"] not in usuarios:
+            errores.append({"indice": indice, "error": f"Usuario {datos['usuario_id']} no encontrado"})
+
+@app.route("/pedidos/bulk", methods=["POST"])
+@requiere_autenticacion
+def crear_pedidos_lote():
+    """Crear varios pedidos (array JSON o NDJSON): se crean todos o ninguno"""
+    try:
+        elementos, errores = leer_lote(request, MAX_ELEMENTOS_LOTE)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "servicio": "pedido-service"
+        }), 400
+    
+    for indice, datos_pedido in enumerate(elementos):
+        error = validar_pedido_nuevo(datos_pedido) if datos_pedido is not None else None
+        if error:
+            errores.append({"indice": indice, "error": error})
+            elementos[indice] = None
+    try:
+        validar_usuarios_del_lote(elementos, errores)
+    except UsuarioServiceNoDisponible:
+        return respuesta_usuario_service_no_disponible()
+    if errores:
+        return respuesta_lote_rechazado(errores)
+    
+    nuevos_pedidos = db_pedidos.crear_pedidos(elementos)
+    logs.info("Pedidos creados en lote", total=len(nuevos_pedidos))
+    return respuesta_lote(nuevos_pedidos, "Pedidos creados exitosamente", 201)
+
+@app.route("/pedidos/bulk", methods=["PATCH"])
+@requiere_autenticacion
+def actualizar_pedidos_lote():
+    """Actualizar varios pedidos ({"id": 1, "estado": ...} por elemento): se actualizan todos o ninguno"""
+    try:
+        elementos, errores = leer_lote(request, MAX_ELEMENTOS_LOTE)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "servicio": "pedido-service"
+        }), 400
+    
+    ids = ids_del_lote(elementos, errores)
+    for indice, datos_actualizados in enumerate(elementos):
+        error = validar_campos_pedido(datos_actualizados) if isinstance(datos_actualizados, dict) else None
+        if error:
+            errores.append({"indice": indice, "error": error})
+            elementos[indice] = None
+    try:
+        validar_usuarios_del_lote(elementos, errores)
+    except UsuarioServiceNoDisponible:
+        return respuesta_usuario_service_no_disponible()
+    if errores:
+        return respuesta_lote_rechazado(errores)
+    
+    pedidos_actualizados, no_encontrados = db_pedidos.actualizar_pedidos(list(zip(ids, elementos)))
+    if no_encontrados:
+        logs.info("Lote no aplicado", no_encontrados=len(no_encontrados))
+        return respuesta_lote_rechazado(errores_no_encontrados(ids, no_encontrados, "Pedido no encontrado"), 404)
+    
+    logs.info("Pedidos actualizados en lote", total=len(pedidos_actualizados))
+    return respuesta_lote(pedidos_actualizados, "Pedidos actualizados exitosamente")
+
+@app.route("/pedidos/bulk", methods=["DELETE"])
+@requiere_autenticacion
+def eliminar_pedidos_lote():
+    """Eliminar varios pedidos (IDs o {"id": 1} por elemento): se eliminan todos o ninguno"""
+    try:
+        elementos, errores = leer_lote(request, MAX_ELEMENTOS_LOTE)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "servicio": "pedido-service"
+        }), 400
+    
+    ids = ids_del_lote(elementos, errores, admite_numeros=True)
+    if errores:
+        return respuesta_lote_rechazado(errores)
+    
+    pedidos_eliminados, no_encontrados = db_pedidos.eliminar_pedidos(ids)
+    if no_encontrados:
+        logs.info("Lote no aplicado", no_encontrados=len(no_encontrados))
+        return respuesta_lote_rechazado(errores_no_encontrados(ids, no_encontrados, "Pedido no encontrado"), 404)
+    
+    logs.info("Pedidos eliminados en lote", total=len(pedidos_eliminados))
+    return respuesta_lote(pedidos_eliminados, "Pedidos eliminados exitosamente")
+
 if __name__ == "__main__":
     port = int(os.getenv('PORT', 5005))
-    debug = os.getenv('DEBUG', 'True').lower() == 'true'
+    debug = os.getenv('DEBUG', 'False').lower() == 'true'
     host = os.getenv('HOST', 'localhost')
     
-    print(f"🚀 [PEDIDO-SERVICE] Iniciando microservicio en {host}:{port}")
-    print(f"🔐 [PEDIDO-SERVICE] Autenticación requerida: {AUTH_REQUIRED}")
-    print(f"🔗 [PEDIDO-SERVICE] Conectando con usuario-service en: {USUARIO_SERVICE_URL}")
+    logs.info("Iniciando microservicio", host=host, puerto=port, autenticacion=AUTH_REQUIRED,
+              usuario_service=USUARIO_SERVICE_URL, modo_servidor=SERVER_MODE)
+    
+    if SERVER_MODE == 'production':
+        logs.warning("gunicorn no está instalado; se usa el servidor de desarrollo de Flask")
     
-    app.run(host=host, port=port, debug=debug)
+    app.run(host=host, port=port, debug=debug, threaded=True)
@@ -0,0 +1,73 @@
+"""Fixtures de las pruebas de comportamiento de los microservicios.
+
+Los app.py se cargan dentro del proceso con bench/servicios.py (backend en
+memoria, sin persistencia ni trazas) y usuario-service y pedido-service se
+sirven en puertos locales para que las llamadas entre ellos (consulta de
+usuarios, invalidación de cache) viajen por HTTP de verdad, firmadas con el
+mismo SECRETO_INTERNO. Se ejecutan desde la raíz del repositorio:
+    python -m pytest -q microservicios/tests
+"""
+import os
+import socket
+import sys
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+MICROSERVICIOS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for ruta in (MICROSERVICIOS, os.path.join(MICROSERVICIOS, 'bench')):
+    if ruta not in sys.path:
+        sys.path.insert(0, ruta)
+
+from servicios import cargar_app
+
+SECRETO_INTERNO = "secreto-de-las-pruebas"
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class Servicio:
+    """Módulo app.py de un microservicio servido en un puerto local, con su cliente de pruebas"""
+
+    def __init__(self, app, puerto):
+        self.app = app
+        self.url = f"http://127.0.0.1:{puerto}"
+        self.servidor = make_server('127.0.0.1', puerto, app.app, threaded=True)
+        threading.Thread(target=self.servidor.serve_forever, name=f"servidor-{puerto}", daemon=True).start()
+        self.cliente = app.app.test_client()
+
+    def headers(self, **extra):
+        """Headers de un cliente externo autenticado con la API key del servicio"""
+        return {'X-API-Key': self.app.API_KEY, **extra}
+
+    def detener(self):
+        self.servidor.shutdown()
+
+@pytest.fixture(scope='session')
+def servicios():
+    """(usuario-service, pedido-service) con autenticación y llamadas internas firmadas"""
+    directorio_inicial = os.getcwd()
+    puerto_usuarios, puerto_pedidos = puerto_libre(), puerto_libre()
+    entorno = {
+        "AUTH_REQUIRED": "True",
+        "SECRETO_INTERNO": SECRETO_INTERNO,
+        "USUARIO_SERVICE_URL": f"http://127.0.0.1:{puerto_usuarios}",
+        "PEDIDO_SERVICE_URL": f"http://127.0.0.1:{puerto_pedidos}",
+    }
+    usuarios = Servicio(cargar_app('usuario-service', **entorno), puerto_usuarios)
+    pedidos = Servicio(cargar_app('pedido-service', **entorno), puerto_pedidos)
+    os.chdir(directorio_inicial)
+    yield usuarios, pedidos
+    usuarios.detener()
+    pedidos.detener()
+
+@pytest.fixture(scope='session')
+def usuarios(servicios):
+    return servicios[0]
+
+@pytest.fixture(scope='session')
+def pedidos(servicios):
+    return servicios[1]
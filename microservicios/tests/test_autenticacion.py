@@ -0,0 +1,61 @@
+"""Llamadas internas firmadas con HMAC (X-Auth-Interna) entre microservicios"""
+import pytest
+
+from comun.autenticacion import HEADER_AUTH_INTERNA, Autenticacion
+
+from conftest import SECRETO_INTERNO
+
+def autenticacion(servicio, secreto=SECRETO_INTERNO, ttl=30, llamadas_internas=True, logs=None):
+    return Autenticacion(servicio, "clave", secreto, ttl, None, logs, llamadas_internas)
+
+def llamar_invalidacion(pedidos, headers):
+    return pedidos.cliente.post("/cache/usuarios/invalidar", headers=headers, json={"ids": []})
+
+def test_acepta_la_llamada_firmada_para_el_destino(pedidos):
+    headers = autenticacion('usuario-service').headers_llamada_interna('pedido-service')
+    assert llamar_invalidacion(pedidos, headers).status_code == 200
+
+def manipulada():
+    valor = autenticacion('usuario-service').firmar_llamada_interna('usuario-service', 'pedido-service')
+    return valor[:-1] + ('0' if valor[-1] != '0' else '1')
+
+def otra_identidad():
+    # Cambiar la identidad de una firma válida (escalar privilegios) invalida la firma
+    expira, _, firma = autenticacion('usuario-service').firmar_llamada_interna('usuario-service', 'pedido-service').split('.')
+    return f"{expira}.YWRtaW4.{firma}"  # "admin" en base64url
+
+@pytest.mark.parametrize("valor", [
+    pytest.param(manipulada, id="firma manipulada"),
+    pytest.param(otra_identidad, id="identidad cambiada"),
+    pytest.param(lambda: autenticacion('usuario-service').firmar_llamada_interna('usuario-service', 'usuario-service'),
+                 id="firmada para otro destino"),
+    pytest.param(lambda: autenticacion('usuario-service', secreto="otro-secreto").firmar_llamada_interna(
+        'usuario-service', 'pedido-service'), id="otro secreto"),
+    pytest.param(lambda: autenticacion('usuario-service', ttl=-10).firmar_llamada_interna(
+        'usuario-service', 'pedido-service'), id="caducada"),
+    pytest.param(lambda: "no-es-una-firma", id="basura"),
+])
+def test_rechaza_llamadas_internas_no_validas(pedidos, valor):
+    response = llamar_invalidacion(pedidos, {HEADER_AUTH_INTERNA: valor()})
+    assert response.status_code == 401
+
+def test_una_firma_no_valida_no_se_salva_con_la_api_key(pedidos):
+    # Si llega X-Auth-Interna se comprueba ese header y no se prueba con el resto
+    response = llamar_invalidacion(pedidos, pedidos.headers(**{HEADER_AUTH_INTERNA: manipulada()}))
+    assert response.status_code == 401
+
+def test_motivo_del_rechazo(usuarios):
+    destino = autenticacion('pedido-service', logs=usuarios.app.logs)
+    with pytest.raises(ValueError, match="no válida"):
+        destino.identidad_llamada_interna(manipulada())
+    with pytest.raises(ValueError, match="caducada"):
+        destino.identidad_llamada_interna(
+            autenticacion('usuario-service', ttl=-10).firmar_llamada_interna('usuario-service', 'pedido-service'))
+    valida = autenticacion('usuario-service').firmar_llamada_interna('admin', 'pedido-service')
+    assert destino.identidad_llamada_interna(valida) == 'admin'
+
+def test_el_gateway_ignora_las_llamadas_internas(usuarios):
+    # Un token interno filtrado no sirve para entrar por el gateway
+    gateway = autenticacion('gateway-service', llamadas_internas=False, logs=usuarios.app.logs)
+    valida = autenticacion('usuario-service').firmar_llamada_interna('admin', 'gateway-service')
+    assert gateway.identidad_peticion({HEADER_AUTH_INTERNA: valida}, "/usuarios") is None
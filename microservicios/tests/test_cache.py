@@ -0,0 +1,98 @@
+"""Invalidación de las caches entre microservicios y entre workers.
+
+Dos instancias del gateway comparten CACHE_RESPUESTAS_DIR como si fueran dos
+workers de gunicorn delante de los usuario-service y pedido-service de conftest.py.
+"""
+import os
+
+import pytest
+
+from servicios import cargar_app
+
+@pytest.fixture(scope='module')
+def gateways(servicios, tmp_path_factory):
+    usuarios, pedidos = servicios
+    directorio_inicial = os.getcwd()
+    entorno = {"USUARIO_SERVICE_URL": usuarios.url, "PEDIDO_SERVICE_URL": pedidos.url,
+               "CACHE_RESPUESTAS_DIR": str(tmp_path_factory.mktemp("cache_respuestas"))}
+    workers = [cargar_app('gateway-service', **entorno) for _ in range(2)]
+    os.chdir(directorio_inicial)
+    return [(worker.app.test_client(), {'X-API-Key': worker.API_KEY}) for worker in workers]
+
+def crear_usuario_con_pedido(usuarios, pedidos, nombre):
+    usuario = usuarios.cliente.post("/usuarios", headers=usuarios.headers(), json={"nombre": nombre})
+    usuario_id = usuario.get_json()["usuario"]["id"]
+    pedido = pedidos.cliente.post("/pedidos", headers=pedidos.headers(), json={
+        "usuario_id": usuario_id, "producto": "Libro", "cantidad": 1, "precio": 15.0
+    })
+    assert pedido.status_code == 201
+    return usuario_id, pedido.get_json()["pedido"]["id"]
+
+def test_actualizar_usuario_invalida_pedidos_en_todos_los_workers(usuarios, pedidos, gateways):
+    (cliente_a, headers_a), (cliente_b, headers_b) = gateways
+    usuario_id, pedido_id = crear_usuario_con_pedido(usuarios, pedidos, "Original")
+    assert cliente_a.get(f"/pedidos/{pedido_id}", headers=headers_a).headers['X-Cache'] == 'MISS'
+    response = cliente_a.get(f"/pedidos/{pedido_id}", headers=headers_a)
+    assert response.headers['X-Cache'] == 'HIT'
+    assert response.get_json()["usuario"] == "Original"
+
+    response = cliente_b.put(f"/usuarios/{usuario_id}", headers=headers_b, json={"nombre": "Renombrado"})
+    assert response.status_code == 200
+
+    # El otro worker del gateway descarta su respuesta (generación compartida) y
+    # pedido-service su copia del usuario (aviso firmado de usuario-service)
+    response = cliente_a.get(f"/pedidos/{pedido_id}", headers=headers_a)
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()["usuario"] == "Renombrado"
+
+def test_escribir_en_pedidos_no_invalida_usuarios(usuarios, pedidos, gateways):
+    (cliente_a, headers_a), (cliente_b, headers_b) = gateways
+    usuario_id, pedido_id = crear_usuario_con_pedido(usuarios, pedidos, "Estable")
+    cliente_a.get(f"/usuarios/{usuario_id}", headers=headers_a)
+    cliente_a.get(f"/pedidos/{pedido_id}", headers=headers_a)
+
+    response = cliente_b.put(f"/pedidos/{pedido_id}", headers=headers_b, json={"estado": "completado"})
+    assert response.status_code == 200
+
+    assert cliente_a.get(f"/usuarios/{usuario_id}", headers=headers_a).headers['X-Cache'] == 'HIT'
+    response = cliente_a.get(f"/pedidos/{pedido_id}", headers=headers_a)
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()["estado"] == "completado"
+
+def test_usuario_eliminado_no_admite_pedidos_aunque_estuviera_en_cache(usuarios, pedidos):
+    usuario_id, _ = crear_usuario_con_pedido(usuarios, pedidos, "Se va")
+    assert pedidos.app.cache_usuarios.obtener(usuario_id) is not None
+
+    assert usuarios.cliente.delete(f"/usuarios/{usuario_id}", headers=usuarios.headers()).status_code == 200
+
+    assert pedidos.app.cache_usuarios.obtener(usuario_id) is None
+    response = pedidos.cliente.post("/pedidos", headers=pedidos.headers(), json={
+        "usuario_id": usuario_id, "producto": "Libro", "cantidad": 1, "precio": 15.0
+    })
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Usuario no encontrado"
+
+def test_lote_de_usuarios_invalida_todos_sus_ids(usuarios, pedidos):
+    ids = [crear_usuario_con_pedido(usuarios, pedidos, f"lote-{i}")[0] for i in range(3)]
+    response = usuarios.cliente.patch("/usuarios/bulk", headers=usuarios.headers(),
+                                      json=[{"id": i, "email": f"{i}@example.com"} for i in ids[:2]])
+    assert response.status_code == 200
+    assert [pedidos.app.cache_usuarios.obtener(i) is None for i in ids] == [True, True, False]
+
+def test_invalidaciones_compartidas_entre_workers_de_pedido_service(pedidos, tmp_path):
+    app = pedidos.app
+    ruta = str(tmp_path / "pedidos.db")
+    worker_a, worker_b = (app.CacheUsuarios(100, 60, app.InvalidacionesCompartidas(ruta, 60)) for _ in range(2))
+    for cache in (worker_a, worker_b):
+        cache.guardar(1, {"id": 1})
+        cache.guardar(2, {"id": 2})
+
+    # usuario-service avisa a un solo worker; el otro lo aplica en su siguiente consulta
+    worker_a.invalidar([1])
+    worker_b.sincronizar()
+    assert worker_b.obtener(1) is None
+    assert worker_b.obtener(2) == {"id": 2}
+
+    worker_a.invalidar(None)
+    worker_b.sincronizar()
+    assert worker_b.obtener(2) is None
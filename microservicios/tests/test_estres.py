@@ -0,0 +1,23 @@
+"""Prueba de estrés multihilo de las tablas en memoria (bench/estres_db.py) como test"""
+import sys
+
+import pytest
+
+from estres_db import CREADORES, estresar
+
+POR_HILO = 1000
+
+@pytest.fixture
+def cambio_de_hilo_minimo():
+    """Cambiar de hilo lo más a menudo posible para provocar carreras"""
+    anterior = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(anterior)
+
+@pytest.mark.parametrize("servicio", ["usuario-service", "pedido-service"])
+def test_sin_ids_perdidos_ni_duplicados(servicios, servicio, cambio_de_hilo_minimo):
+    app = servicios[0].app if servicio == "usuario-service" else servicios[1].app
+    creados, fallos = estresar(app, servicio, POR_HILO)
+    assert fallos == []
+    assert creados == CREADORES * POR_HILO
@@ -0,0 +1,62 @@
+"""Operaciones en lote: se aplican todas o ninguna"""
+
+def test_crear_lote_con_un_elemento_invalido_no_crea_ninguno(usuarios):
+    total = usuarios.app.db_usuarios.contar_usuarios()
+    response = usuarios.cliente.post("/usuarios/bulk", headers=usuarios.headers(), json=[
+        {"nombre": "Uno"}, {"email": "sin-nombre@example.com"}, {"nombre": "Tres"}, "no es un objeto"
+    ])
+    assert response.status_code == 400
+    datos = response.get_json()
+    assert datos["aplicado"] is False
+    assert [error["indice"] for error in datos["errores"]] == [1, 3]
+    assert usuarios.app.db_usuarios.contar_usuarios() == total
+
+def test_crear_lote_valido_devuelve_ids_en_orden(usuarios):
+    total = usuarios.app.db_usuarios.contar_usuarios()
+    response = usuarios.cliente.post("/usuarios/bulk", headers=usuarios.headers(),
+                                     json=[{"nombre": f"lote-{i}"} for i in range(5)])
+    assert response.status_code == 201
+    datos = response.get_json()
+    assert datos["aplicado"] is True
+    ids = [resultado["id"] for resultado in datos["resultados"]]
+    assert ids == list(range(ids[0], ids[0] + 5))
+    assert [usuarios.app.db_usuarios.obtener_por_id(i)["nombre"] for i in ids] == [f"lote-{i}" for i in range(5)]
+    assert usuarios.app.db_usuarios.contar_usuarios() == total + 5
+
+def test_actualizar_lote_con_un_id_inexistente_no_actualiza_ninguno(usuarios):
+    db = usuarios.app.db_usuarios
+    creado = db.crear_usuario({"nombre": "sin cambios"})
+    response = usuarios.cliente.patch("/usuarios/bulk", headers=usuarios.headers(), json=[
+        {"id": creado["id"], "nombre": "cambiado"}, {"id": 999999, "nombre": "fantasma"}
+    ])
+    assert response.status_code == 404
+    datos = response.get_json()
+    assert datos["aplicado"] is False
+    assert datos["errores"] == [{"indice": 1, "error": "Usuario no encontrado"}]
+    assert db.obtener_por_id(creado["id"])["nombre"] == "sin cambios"
+
+def test_eliminar_lote_con_un_id_inexistente_no_elimina_ninguno(usuarios):
+    db = usuarios.app.db_usuarios
+    ids = [registro["id"] for registro in db.crear_usuarios([{"nombre": "a"}, {"nombre": "b"}])]
+    response = usuarios.cliente.delete("/usuarios/bulk", headers=usuarios.headers(), json=ids + [999999])
+    assert response.status_code == 404
+    assert response.get_json()["aplicado"] is False
+    assert all(db.obtener_por_id(i) is not None for i in ids)
+
+    response = usuarios.cliente.delete("/usuarios/bulk", headers=usuarios.headers(), json=ids)
+    assert response.status_code == 200
+    assert all(db.obtener_por_id(i) is None for i in ids)
+
+def test_lote_de_pedidos_con_un_usuario_inexistente_no_crea_ninguno(pedidos):
+    # Los usuario_id se comprueban con una llamada interna real a usuario-service
+    total = pedidos.app.db_pedidos.contar_pedidos()
+    response = pedidos.cliente.post("/pedidos/bulk", headers=pedidos.headers(), json=[
+        {"usuario_id": 1, "producto": "Lápiz", "cantidad": 1, "precio": 0.5},
+        {"usuario_id": 999999, "producto": "Goma", "cantidad": 1, "precio": 0.3},
+        {"usuario_id": 1, "producto": "Regla", "cantidad": 1, "precio": 1.234},
+    ])
+    assert response.status_code == 400
+    datos = response.get_json()
+    assert datos["aplicado"] is False
+    assert [error["indice"] for error in datos["errores"]] == [1, 2]
+    assert pedidos.app.db_pedidos.contar_pedidos() == total
@@ -0,0 +1,94 @@
+"""Recuperación de UsuarioDB y PedidoDB desde el WAL y el snapshot (comun/persistencia.py)"""
+import os
+import time
+
+def abrir(modulo, clase, directorio, nombre, snapshot_cada=0):
+    """Tabla con persistencia en directorio (snapshot_cada=0: sin snapshots automáticos)"""
+    return clase(modulo.Persistencia(str(directorio), nombre, True, snapshot_cada, modulo.logs))
+
+def contenido(db):
+    return {registro["id"]: dict(registro) for registro in db.obtener_todos()}
+
+def esperar_snapshot(persistencia):
+    limite = time.monotonic() + 5
+    while persistencia._snapshot_en_curso or os.path.exists(persistencia.ruta_wal_anterior):
+        assert time.monotonic() < limite, "el snapshot en segundo plano no terminó"
+        time.sleep(0.01)
+
+def test_reaplica_el_wal_al_arrancar(usuarios, tmp_path):
+    app = usuarios.app
+    db = abrir(app, app.UsuarioDB, tmp_path, 'usuarios')
+    creado = db.crear_usuario({"nombre": "Ana", "email": "ana@example.com", "telefono": "1"})
+    db.actualizar_usuario(1, {"email": "ever@nuevo.example.com"})
+    db.eliminar_usuario(2)
+    lote = db.crear_usuarios([{"nombre": f"lote-{i}"} for i in range(3)])
+    db.eliminar_usuarios([lote[0]["id"]])
+    antes = contenido(db)
+    db._persistencia.cerrar()
+    assert not os.path.exists(tmp_path / "usuarios.snapshot.json")
+    assert os.path.getsize(tmp_path / "usuarios.wal") > 0
+
+    db = abrir(app, app.UsuarioDB, tmp_path, 'usuarios')
+    assert contenido(db) == antes
+    assert db.obtener_por_id(2) is None
+    assert db.obtener_por_id(creado["id"])["nombre"] == "Ana"
+    # Los IDs eliminados no se reutilizan
+    assert db.crear_usuario({"nombre": "Luis"})["id"] == lote[-1]["id"] + 1
+    db._persistencia.cerrar()
+
+    # El arranque compactó el WAL en un snapshot
+    assert os.path.exists(tmp_path / "usuarios.snapshot.json")
+
+def test_snapshot_mas_cola_del_wal(usuarios, tmp_path):
+    app = usuarios.app
+    db = abrir(app, app.UsuarioDB, tmp_path, 'usuarios', snapshot_cada=5)
+    for i in range(6):
+        db.crear_usuario({"nombre": f"antes-{i}"})
+    esperar_snapshot(db._persistencia)
+    assert os.path.exists(tmp_path / "usuarios.snapshot.json")
+    db.actualizar_usuario(1, {"nombre": "después del snapshot"})
+    db.eliminar_usuario(3)  # 5 escrituras desde el anterior: empieza otro snapshot
+    antes = contenido(db)
+    db._persistencia.cerrar()
+    # cerrar() espera al snapshot en curso antes de soltar el directorio
+    assert not os.path.exists(tmp_path / "usuarios.wal.anterior")
+
+    db = abrir(app, app.UsuarioDB, tmp_path, 'usuarios')
+    assert contenido(db) == antes
+    assert db.obtener_por_id(1)["nombre"] == "después del snapshot"
+    db._persistencia.cerrar()
+
+def test_descarta_la_ultima_linea_incompleta(usuarios, tmp_path):
+    app = usuarios.app
+    db = abrir(app, app.UsuarioDB, tmp_path, 'usuarios')
+    db.crear_usuario({"nombre": "completo"})
+    antes = contenido(db)
+    db._persistencia.cerrar()
+    # Caída a mitad de escribir un lote: la línea se descarta entera
+    with open(tmp_path / "usuarios.wal", 'ab') as wal:
+        wal.write(b'{"lsn":99,"op":"lote","operaciones":[{"op":"crear","registro":{"id":')
+
+    db = abrir(app, app.UsuarioDB, tmp_path, 'usuarios')
+    assert contenido(db) == antes
+    assert os.path.getsize(tmp_path / "usuarios.wal") == 0
+    db._persistencia.cerrar()
+
+def test_pedidos_recuperan_indices_y_estadisticas(pedidos, tmp_path):
+    app = pedidos.app
+    db = abrir(app, app.PedidoDB, tmp_path, 'pedidos')
+    nuevos = db.crear_pedidos([
+        {"usuario_id": 2, "producto": "Monitor", "cantidad": 2, "precio": 199.99},
+        {"usuario_id": 2, "producto": "Cable", "cantidad": 3, "precio": 4.05},
+    ])
+    db.actualizar_pedido(1, {"estado": "completado"})
+    db.eliminar_pedido(nuevos[1]["id"])
+    antes = contenido(db)
+    estadisticas = db.estadisticas(["estado", "usuario_id"], 10)
+    db._persistencia.cerrar()
+
+    db = abrir(app, app.PedidoDB, tmp_path, 'pedidos')
+    assert contenido(db) == antes
+    assert db.obtener_por_id(nuevos[0]["id"])["precio"] == 199.99
+    assert [p["id"] for p in db.obtener_por_usuario(2)] == [2, nuevos[0]["id"]]
+    assert db.estadisticas(["estado", "usuario_id"], 10) == estadisticas
+    db._persistencia.cerrar()
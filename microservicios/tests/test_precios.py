@@ -0,0 +1,47 @@
+"""Validación del precio de los pedidos: finito y con como mucho dos decimales"""
+import pytest
+
+PRECIOS_NO_VALIDOS = {
+    "tres decimales": "12.345",
+    "NaN": "NaN",
+    "infinito": "Infinity",
+    "menos infinito": "-Infinity",
+    "cadena": '"10"',
+    "booleano": "true",
+    "nulo": "null",
+}
+
+def publicar(pedidos, metodo, ruta, cuerpo):
+    return pedidos.cliente.open(ruta, method=metodo, data=cuerpo,
+                                headers=pedidos.headers(**{'Content-Type': 'application/json'}))
+
+@pytest.mark.parametrize("precio", PRECIOS_NO_VALIDOS.values(), ids=PRECIOS_NO_VALIDOS.keys())
+def test_crear_rechaza_precios_no_validos(pedidos, precio):
+    total = pedidos.app.db_pedidos.contar_pedidos()
+    response = publicar(pedidos, 'POST', "/pedidos",
+                        f'{{"usuario_id": 1, "producto": "Caja", "cantidad": 1, "precio": {precio}}}')
+    assert response.status_code == 400
+    assert "precio" in response.get_json()["error"]
+    assert pedidos.app.db_pedidos.contar_pedidos() == total
+
+@pytest.mark.parametrize("precio", PRECIOS_NO_VALIDOS.values(), ids=PRECIOS_NO_VALIDOS.keys())
+def test_actualizar_rechaza_precios_no_validos(pedidos, precio):
+    response = publicar(pedidos, 'PUT', "/pedidos/2", f'{{"precio": {precio}}}')
+    assert response.status_code == 400
+    assert pedidos.app.db_pedidos.obtener_por_id(2)["precio"] == 25.5
+
+@pytest.mark.parametrize("precio", [19.99, 0.1, 7, 1e6])
+def test_precios_validos_se_guardan_exactos(pedidos, precio):
+    response = pedidos.cliente.post("/pedidos", headers=pedidos.headers(), json={
+        "usuario_id": 1, "producto": "Caja", "cantidad": 3, "precio": precio
+    })
+    assert response.status_code == 201
+    pedido = pedidos.app.db_pedidos.obtener_por_id(response.get_json()["pedido"]["id"])
+    assert pedido["precio"] == precio
+    assert pedido.precio_centimos == round(precio * 100)
+
+def test_lote_con_un_precio_no_valido_no_se_aplica(pedidos):
+    response = publicar(pedidos, 'PATCH', "/pedidos/bulk", '[{"id": 1, "precio": 10.0}, {"id": 2, "precio": NaN}]')
+    assert response.status_code == 400
+    assert [error["indice"] for error in response.get_json()["errores"]] == [1]
+    assert pedidos.app.db_pedidos.obtener_por_id(1)["precio"] == 1200.0
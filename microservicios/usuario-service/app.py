@@ -1,12 +1,44 @@
-from flask import Flask, jsonify, request
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
+from flask import Flask, jsonify, request, g, has_request_context, Response, stream_with_context
+from flask_jwt_extended import JWTManager, jwt_required, create_access_token
 from dotenv import load_dotenv
 from functools import wraps
+from bisect import bisect_right
+from collections import deque
+from collections.abc import Mapping
 import os
+import sys
+import atexit
+import threading
+import time
+import requests
+
+# Código compartido por los microservicios (microservicios/comun)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from comun.reloj import ahora_ms, formatear_fecha, timestamp_actual
+from comun.logs import Logs
+from comun.metricas import (
+    DEFINICION_METRICAS as DEFINICION_METRICAS_COMUNES, CONTENT_TYPE_METRICAS, Metricas, MetricasProcesos,
+    series_cache, valores_metricas, exponer_metricas, medir_peticiones
+)
+from comun.autenticacion import Autenticacion, VerificadorJWT
+from comun.peticiones import (
+    MIMETYPE_NDJSON, leer_parametros_listado, acepta_ndjson, linea_ndjson, proyectar,
+    leer_lote, ids_del_lote, errores_no_encontrados
+)
+from comun.servidor import lanzar_gunicorn
+from comun.persistencia import Persistencia, conectar_sqlite, fila_a_diccionario
+from comun.trazas import Trazas, operaciones_trazadas, trazar_peticiones
+from comun.resiliencia import HEADER_PLAZO, tiempo_restante, limitar_plazo, Circuito, rechazo_llamada, series_circuitos
 
 # Cargar variables de entorno
 load_dotenv('config.env')
 
+# Con SERVER_MODE=production `python app.py` solo lanza gunicorn, antes de crear la base de
+# datos, los logs, las trazas o las métricas: los crea cada worker al importar este módulo
+SERVER_MODE = os.getenv('SERVER_MODE', 'development').lower()
+if __name__ == "__main__" and SERVER_MODE == 'production':
+    lanzar_gunicorn('app:app')
+
 app = Flask(__name__)
 
 # Configuración de JWT
@@ -17,115 +49,635 @@ jwt = JWTManager(app)
 # Variables de configuración
 API_KEY = os.getenv('API_KEY')
 AUTH_REQUIRED = os.getenv('AUTH_REQUIRED', 'False').lower() == 'true'
+CACHE_JWT_MAX = int(os.getenv('CACHE_JWT_MAX', 10000))
+SECRETO_INTERNO = os.getenv('SECRETO_INTERNO')
+TOKEN_INTERNO_TTL = int(os.getenv('TOKEN_INTERNO_TTL', 30))
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_MUESTREO_DEBUG = float(os.getenv('LOG_MUESTREO_DEBUG', 0.01))
+LOG_COLA_MAX = int(os.getenv('LOG_COLA_MAX', 10000))
+METRICAS_DIR = os.getenv('METRICAS_DIR')  # lo crea gunicorn.conf.py con varios workers
+METRICAS_INTERVALO = float(os.getenv('METRICAS_INTERVALO', 5))
+TRAZAS_MUESTREO = float(os.getenv('TRAZAS_MUESTREO', 0.1))
+TRAZAS_MAX_SPANS = int(os.getenv('TRAZAS_MAX_SPANS', 10000))
+TRAZAS_ARCHIVO = os.getenv('TRAZAS_ARCHIVO')
+TRAZAS_ARCHIVO_MAX_MB = float(os.getenv('TRAZAS_ARCHIVO_MAX_MB', 50))
+MAX_IDS_POR_LOTE = int(os.getenv('MAX_IDS_POR_LOTE', 500))
+LIMITE_PAGINA_DEFECTO = int(os.getenv('LIMITE_PAGINA_DEFECTO', 100))
+LIMITE_PAGINA_MAX = int(os.getenv('LIMITE_PAGINA_MAX', 1000))
+MAX_ELEMENTOS_LOTE = int(os.getenv('MAX_ELEMENTOS_LOTE', 100000))
+PEDIDO_SERVICE_URL = os.getenv('PEDIDO_SERVICE_URL', 'http://localhost:5005')
+CIRCUITO_FALLOS = int(os.getenv('CIRCUITO_FALLOS', 5))
+CIRCUITO_ESPERA = float(os.getenv('CIRCUITO_ESPERA', 10))
+DB_BACKEND = os.getenv('DB_BACKEND', 'memoria').lower()
+DB_PATH = os.getenv('DB_PATH', 'data/usuarios.db')
+PERSISTENCIA = os.getenv('PERSISTENCIA', 'False').lower() == 'true'
+PERSISTENCIA_DIR = os.getenv('PERSISTENCIA_DIR', 'data')
+WAL_FSYNC = os.getenv('WAL_FSYNC', 'grupo').lower()
+SNAPSHOT_CADA = int(os.getenv('SNAPSHOT_CADA', 10000))
 
-# Base de datos en memoria para usuarios
-class UsuarioDB:
-    def __init__(self):
-        self.usuarios = []
-        self.next_id = 1
-        # Agregar algunos usuarios iniciales
-        self._crear_usuarios_iniciales()
+# ===== LOGS =====
+# Logs estructurados del servicio (comun/logs.py)
+
+SERVICIO = 'usuario-service'
+
+logs = Logs(SERVICIO, LOG_LEVEL, LOG_MUESTREO_DEBUG, LOG_COLA_MAX, sys.stdout)
+atexit.register(logs.detener)
+
+# Campos que se pueden modificar con PUT (el resto los gestiona la base de datos)
+CAMPOS_EDITABLES_USUARIO = ("nombre", "email", "telefono")
+
+# Filtros admitidos en GET /usuarios y su tipo
+FILTROS_USUARIO = {"nombre": str, "email": str}
+
+# ===== MÉTRICAS =====
+# Métricas de Prometheus en GET /metrics (comun/metricas.py)
+
+# Tipo y descripción de cada métrica expuesta: las de comun y las de este servicio
+DEFINICION_METRICAS = {
+    **DEFINICION_METRICAS_COMUNES,
+    "jwt_cache_entries": ("gauge", "Tokens JWT verificados en la cache"),
+    "jwt_cache_hits_total": ("counter", "Tokens JWT encontrados en la cache"),
+    "jwt_cache_misses_total": ("counter", "Tokens JWT que hubo que verificar"),
+    "jwt_cache_evictions_total": ("counter", "Tokens JWT desalojados de la cache"),
+    "db_table_rows": ("gauge", "Registros en la tabla")
+}
+
+metricas = Metricas(DEFINICION_METRICAS)
+metricas.registrar_colector('logs', lambda: [("log_events_dropped_total", (), logs.descartados)])
+metricas_procesos = MetricasProcesos(metricas, METRICAS_DIR, METRICAS_INTERVALO, logs) if METRICAS_DIR else None
+if metricas_procesos is not None:
+    metricas_procesos.iniciar()
+medir_peticiones(app, metricas)
+
+# ===== TRAZAS =====
+# Trazas distribuidas con W3C Trace Context (comun/trazas.py)
+
+trazas = Trazas(SERVICIO, TRAZAS_MUESTREO, TRAZAS_MAX_SPANS, TRAZAS_ARCHIVO, TRAZAS_ARCHIVO_MAX_MB * 1024 * 1024, logs)
+trazar_peticiones(app, trazas)
+
+# ===== RESILIENCIA =====
+# Plazo de cada petición y circuit breaker de las llamadas a otros microservicios
+# (comun/resiliencia.py): el plazo es el que le queda a quien llama
+
+limitar_plazo(app)
+
+# ===== PAGINACIÓN Y FILTROS =====
+# limit, after_id, fields y filtros se leen con comun/peticiones.py, igual que el
+# NDJSON de los listados en streaming.
+
+# ===== OPERACIONES EN LOTE =====
+# Lectura y validación de los lotes en comun/peticiones.py: todo o nada, con un
+# resultado o un error por elemento.
+
+def respuesta_lote_rechazado(errores, codigo=400):
+    """Respuesta de un lote que no se aplicó, con el error de cada elemento que falló"""
+    errores.sort(key=lambda error: error["indice"])
+    return jsonify({
+        "error": f"El lote no se aplicó: {len(errores)} elementos con errores",
+        "errores": errores,
+        "aplicado": False,
+        "servicio": "usuario-service"
+    }), codigo
+
+def respuesta_lote(registros, mensaje, codigo=200):
+    """Respuesta de un lote aplicado: el ID resultante de cada elemento, en el orden del lote"""
+    return jsonify({
+        "resultados": [{"indice": indice, "id": registro["id"]} for indice, registro in enumerate(registros)],
+        "total": len(registros),
+        "aplicado": True,
+        "mensaje": mensaje,
+        "servicio": "usuario-service"
+    }), codigo
+
+# ===== BASE DE DATOS =====
+# Backends intercambiables con la misma interfaz, elegidos con DB_BACKEND:
+# - memoria: diccionarios dentro del proceso (un solo worker)
+# - sqlite: fichero SQLite en modo WAL compartido por todos los workers
+
+# Usuarios iniciales para demostración
+USUARIOS_INICIALES = [
+    {"nombre": "Ever", "email": "ever@example.com", "telefono": "123-456-7890"},
+    {"nombre": "Cristian", "email": "cristian@example.com", "telefono": "098-765-4321"},
+    {"nombre": "Hervin", "email": "hervin@example.com", "telefono": "555-123-4567"}
+]
+
+class Usuario(Mapping):
+    """Usuario del backend en memoria con representación compacta.
+    
+    Usa __slots__ en lugar de un diccionario por registro y guarda las fechas
+    como milisegundos enteros. Se lee como un diccionario de solo lectura
+    (usuario["nombre"], usuario.get(), dict(usuario)), igual que las filas del
+    backend SQLite, y no se modifica una vez publicado.
+    """
+    
+    __slots__ = ("id", "nombre", "email", "telefono", "fecha_creacion", "fecha_actualizacion")
+    CAMPOS = __slots__
+    
+    def __init__(self, id, nombre, email, telefono, fecha_creacion, fecha_actualizacion=None):
+        self.id = id
+        self.nombre = nombre
+        self.email = email
+        self.telefono = telefono
+        self.fecha_creacion = fecha_creacion
+        self.fecha_actualizacion = fecha_actualizacion  # None hasta la primera actualización
+    
+    @classmethod
+    def desde_diccionario(cls, datos):
+        return cls(**datos)
+    
+    def __getitem__(self, campo):
+        if campo not in Usuario.CAMPOS or (campo == "fecha_actualizacion" and self.fecha_actualizacion is None):
+            raise KeyError(campo)
+        return getattr(self, campo)
+    
+    def __iter__(self):
+        return iter(Usuario.CAMPOS if self.fecha_actualizacion is not None else Usuario.CAMPOS[:-1])
+    
+    def __len__(self):
+        return len(Usuario.CAMPOS) - (self.fecha_actualizacion is None)
+    
+    def __repr__(self):
+        return repr(self.a_diccionario())
+    
+    def a_diccionario(self):
+        """Copia como diccionario, sin pasar por __getitem__ campo a campo"""
+        datos = {"id": self.id, "nombre": self.nombre, "email": self.email, "telefono": self.telefono,
+                 "fecha_creacion": self.fecha_creacion}
+        if self.fecha_actualizacion is not None:
+            datos["fecha_actualizacion"] = self.fecha_actualizacion
+        return datos
+
+class UsuarioDBBase:
+    """Interfaz común de los backends de usuarios.
+    
+    Cada backend implementa obtener_todos, obtener_por_id, obtener_por_ids,
+    listar, crear_usuario, actualizar_usuario, eliminar_usuario,
+    contar_usuarios y sus versiones en lote crear_usuarios,
+    actualizar_usuarios y eliminar_usuarios (todo o nada); los usuarios se
+    devuelven como diccionarios.
+    """
     
     def _crear_usuarios_iniciales(self):
         """Crear usuarios iniciales para demostración"""
-        usuarios_iniciales = [
-            {"nombre": "Ever", "email": "ever@example.com", "telefono": "123-456-7890"},
-            {"nombre": "Cristian", "email": "cristian@example.com", "telefono": "098-765-4321"},
-            {"nombre": "Hervin", "email": "hervin@example.com", "telefono": "555-123-4567"}
-        ]
-        
-        for usuario_data in usuarios_iniciales:
+        for usuario_data in USUARIOS_INICIALES:
             self.crear_usuario(usuario_data)
     
+    def iterar_lotes(self, tamano_lote, after_id=None, filtros=None):
+        """Generador de lotes de hasta tamano_lote registros, ordenados por ID.
+        
+        Cada lote se obtiene con listar() a partir del último ID entregado, así
+        que la iteración tolera inserciones y borrados concurrentes.
+        """
+        while True:
+            lote, hay_mas = self.listar(tamano_lote, after_id, filtros)
+            if lote:
+                yield lote
+            if not hay_mas:
+                return
+            after_id = lote[-1]["id"]
+
+# Base de datos en memoria para usuarios (indexada por ID)
+@operaciones_trazadas(trazas)
+class UsuarioDB(UsuarioDBBase):
+    """Usuarios en memoria, seguros con el servidor multihilo.
+    
+    Los registros publicados no se modifican nunca (copy-on-write): una
+    actualización crea un Usuario nuevo y lo publica con una sola
+    asignación, así que las lecturas no toman locks ni ven registros a medias.
+    Las escrituras se serializan con un lock y los IDs salen de un contador
+    atómico dentro de él, por lo que ids_ordenados siempre queda ordenada.
+    Con persistencia cada escritura se apunta en el WAL antes de publicarla y
+    se confirma en disco antes de devolverla; si el fsync falla se deshace (ver
+    _confirmar). Las operaciones en lote comprueban todos los IDs antes
+    de modificar nada y se apuntan como una sola entrada del WAL (todo o nada);
+    los lectores sí pueden ver un lote a medio aplicar.
+    """
+    
+    def __init__(self, persistencia=None):
+        self.usuarios = {}  # id -> usuario, en orden de creación
+        self.ids_ordenados = []  # IDs crecientes para paginar con bisect (puede contener eliminados)
+        self._siguiente_id = 1  # asignador de IDs (solo se usa con el lock de escritura)
+        self._lock_escritura = threading.Lock()
+        self._persistencia = persistencia
+        self._no_durables = deque()  # (lsn, [(id, usuario anterior o None), ...]) de escrituras aún sin fsync
+        guardado = persistencia.cargar() if persistencia is not None else None
+        if guardado is not None:
+            registros, self._siguiente_id = guardado
+            self._publicar_tabla({i: Usuario.desde_diccionario(registro) for i, registro in registros.items()})
+        else:
+            # Agregar algunos usuarios iniciales
+            self._crear_usuarios_iniciales()
+    
+    def _publicar_tabla(self, usuarios):
+        """Reemplazar la tabla entera (al cargar o al deshacer escrituras)"""
+        self.usuarios = usuarios
+        self.ids_ordenados = list(usuarios)
+    
+    def _escribir(self, operaciones):
+        """Apuntar en el WAL y publicar escrituras [(operacion, usuario), ...] (con el lock de escritura tomado).
+        
+        Se publican solo después de apuntarlas, así que si el WAL falla no cambia
+        nada. Hasta que llegan a disco se guardan los registros anteriores para
+        poder deshacerlas. Devuelve el LSN (None sin persistencia).
+        """
+        lsn = None
+        if self._persistencia is not None and operaciones:
+            if len(operaciones) == 1:
+                lsn = self._persistencia.registrar(*operaciones[0])
+            else:
+                lsn = self._persistencia.registrar_lote(operaciones)
+            durable = self._persistencia.lsn_durable()
+            while self._no_durables and self._no_durables[0][0] <= durable:
+                self._no_durables.popleft()
+            self._no_durables.append((lsn, [(usuario.id, self.usuarios.get(usuario.id)) for _, usuario in operaciones]))
+        for operacion, usuario in operaciones:
+            if operacion == "crear":
+                self._insertar(usuario)
+            elif operacion == "actualizar":
+                self.usuarios[usuario.id] = usuario
+            else:
+                self._quitar(usuario)
+        if lsn is not None and self._persistencia.necesita_snapshot():
+            self._persistencia.iniciar_snapshot(list(self.usuarios.values()), self._siguiente_id)
+        return lsn
+    
+    def _confirmar(self, lsn):
+        """Esperar a que la escritura esté en disco, ya sin el lock para que los fsync se agrupen.
+        
+        Si el fsync falla el WAL queda inutilizable y las escrituras que no
+        llegaron a disco (esta y las de las peticiones que esperan con ella) se
+        deshacen antes de propagar el error, para no servir datos que se
+        perderían al reiniciar.
+        """
+        if lsn is None:
+            return
+        try:
+            self._persistencia.esperar(lsn)
+        except OSError:
+            with self._lock_escritura:
+                self._deshacer_no_durables()
+            raise
+    
+    def _deshacer_no_durables(self):
+        """Volver a los registros anteriores a las escrituras sin fsync (con el lock de escritura tomado)"""
+        durable = self._persistencia.lsn_durable()
+        if not self._no_durables or self._no_durables[-1][0] <= durable:
+            return
+        usuarios = dict(self.usuarios)
+        while self._no_durables and self._no_durables[-1][0] > durable:
+            _, anteriores = self._no_durables.pop()
+            for usuario_id, anterior in reversed(anteriores):
+                if anterior is None:
+                    usuarios.pop(usuario_id, None)
+                else:
+                    usuarios[usuario_id] = anterior
+        self._no_durables.clear()
+        # Los usuarios eliminados que se restauran vuelven a su posición por ID
+        self._publicar_tabla(dict(sorted(usuarios.items())))
+        logs.warning("Escrituras deshechas por un error del WAL", lsn_durable=durable, usuarios=len(usuarios))
+    
     def obtener_todos(self):
-        """Obtener todos los usuarios"""
-        return self.usuarios.copy()
+        """Obtener todos los usuarios (foto consistente: dict.copy() es atómico)"""
+        return list(self.usuarios.copy().values())
     
     def obtener_por_id(self, usuario_id):
         """Obtener usuario por ID"""
-        for usuario in self.usuarios:
-            if usuario["id"] == usuario_id:
-                return usuario
-        return None
+        return self.usuarios.get(usuario_id)
+    
+    def obtener_por_ids(self, usuario_ids):
+        """Obtener varios usuarios por ID (los inexistentes se omiten)"""
+        return [self.usuarios[i] for i in usuario_ids if i in self.usuarios]
+    
+    def listar(self, limit, after_id=None, filtros=None):
+        """Página de usuarios ordenada por ID, sin copiar la tabla completa.
+        
+        Devuelve (usuarios, hay_mas). La búsqueda del cursor es O(log n) y solo
+        se recorren los registros necesarios para llenar la página.
+        """
+        ids = self.ids_ordenados
+        inicio = bisect_right(ids, after_id) if after_id is not None else 0
+        pagina = []
+        for posicion in range(inicio, len(ids)):
+            usuario = self.usuarios.get(ids[posicion])
+            if usuario is None:
+                continue
+            if filtros and any(getattr(usuario, campo) != valor for campo, valor in filtros.items()):
+                continue
+            if len(pagina) == limit:
+                return pagina, True
+            pagina.append(usuario)
+        return pagina, False
+    
+    @staticmethod
+    def _nuevo_usuario(datos_usuario):
+        """Usuario sin ID a partir de los datos de la petición"""
+        return Usuario(
+            None,
+            datos_usuario.get("nombre", ""),
+            datos_usuario.get("email", ""),
+            datos_usuario.get("telefono", ""),
+            ahora_ms()
+        )
+    
+    def _asignar_id(self, nuevo_usuario):
+        """Dar ID a un usuario nuevo antes de apuntarlo (con el lock de escritura tomado)"""
+        nuevo_usuario.id = self._siguiente_id
+        self._siguiente_id += 1
+    
+    def _insertar(self, nuevo_usuario):
+        """Publicar un usuario nuevo (con el lock de escritura tomado)"""
+        self.usuarios[nuevo_usuario.id] = nuevo_usuario
+        self.ids_ordenados.append(nuevo_usuario.id)
+    
+    @staticmethod
+    def _actualizado(usuario, datos_actualizados):
+        """Copia actualizada del usuario, todavía sin publicar"""
+        # Solo los campos editables proporcionados
+        cambios = {campo: valor for campo, valor in datos_actualizados.items() if campo in CAMPOS_EDITABLES_USUARIO}
+        return Usuario.desde_diccionario({**usuario, **cambios, "fecha_actualizacion": ahora_ms()})
+    
+    def _quitar(self, usuario):
+        """Eliminar un usuario existente (con el lock de escritura tomado)"""
+        del self.usuarios[usuario.id]
+        # Compactar la lista de IDs cuando la mitad ya son eliminados (los lectores
+        # que estén recorriendo la lista anterior la siguen usando sin problema)
+        if len(self.ids_ordenados) > 2 * len(self.usuarios) + 64:
+            self.ids_ordenados = [i for i in self.ids_ordenados if i in self.usuarios]
     
     def crear_usuario(self, datos_usuario):
         """Crear nuevo usuario"""
-        nuevo_usuario = {
-            "id": self.next_id,
-            "nombre": datos_usuario.get("nombre", ""),
-            "email": datos_usuario.get("email", ""),
-            "telefono": datos_usuario.get("telefono", ""),
-            "fecha_creacion": str(os.popen('date').read().strip())
-        }
-        self.usuarios.append(nuevo_usuario)
-        self.next_id += 1
+        nuevo_usuario = self._nuevo_usuario(datos_usuario)
+        with self._lock_escritura:
+            self._asignar_id(nuevo_usuario)
+            lsn = self._escribir([("crear", nuevo_usuario)])
+        self._confirmar(lsn)
         return nuevo_usuario
     
     def actualizar_usuario(self, usuario_id, datos_actualizados):
-        """Actualizar usuario existente"""
-        for i, usuario in enumerate(self.usuarios):
-            if usuario["id"] == usuario_id:
-                # Actualizar solo los campos proporcionados
-                for campo, valor in datos_actualizados.items():
-                    if campo in usuario:
-                        usuario[campo] = valor
-                usuario["fecha_actualizacion"] = str(os.popen('date').read().strip())
-                return usuario
-        return None
+        """Actualizar usuario existente (publica una copia nueva del registro)"""
+        with self._lock_escritura:
+            usuario = self.usuarios.get(usuario_id)
+            if usuario is None:
+                return None
+            actualizado = self._actualizado(usuario, datos_actualizados)
+            lsn = self._escribir([("actualizar", actualizado)])
+        self._confirmar(lsn)
+        return actualizado
     
     def eliminar_usuario(self, usuario_id):
         """Eliminar usuario"""
-        for i, usuario in enumerate(self.usuarios):
-            if usuario["id"] == usuario_id:
-                return self.usuarios.pop(i)
-        return None
+        with self._lock_escritura:
+            usuario = self.usuarios.get(usuario_id)
+            if usuario is None:
+                return None
+            lsn = self._escribir([("eliminar", usuario)])
+        self._confirmar(lsn)
+        return usuario
+    
+    def crear_usuarios(self, lista_datos):
+        """Crear varios usuarios de una vez (un solo lock y una sola entrada en el WAL)"""
+        nuevos = [self._nuevo_usuario(datos_usuario) for datos_usuario in lista_datos]
+        with self._lock_escritura:
+            for nuevo_usuario in nuevos:
+                self._asignar_id(nuevo_usuario)
+            lsn = self._escribir([("crear", usuario) for usuario in nuevos])
+        self._confirmar(lsn)
+        return nuevos
+    
+    def actualizar_usuarios(self, cambios_por_id):
+        """Actualizar varios usuarios [(usuario_id, datos), ...]: todos o ninguno.
+        
+        Devuelve (actualizados, ids_no_encontrados); si falta algún ID no se
+        modifica nada.
+        """
+        with self._lock_escritura:
+            no_encontrados = [usuario_id for usuario_id, _ in cambios_por_id if usuario_id not in self.usuarios]
+            if no_encontrados:
+                return [], no_encontrados
+            actualizados = [self._actualizado(self.usuarios[usuario_id], datos) for usuario_id, datos in cambios_por_id]
+            lsn = self._escribir([("actualizar", usuario) for usuario in actualizados])
+        self._confirmar(lsn)
+        return actualizados, []
+    
+    def eliminar_usuarios(self, usuario_ids):
+        """Eliminar varios usuarios: todos o ninguno. Devuelve (eliminados, ids_no_encontrados)"""
+        usuario_ids = list(dict.fromkeys(usuario_ids))
+        with self._lock_escritura:
+            usuarios = [self.usuarios.get(usuario_id) for usuario_id in usuario_ids]
+            no_encontrados = [usuario_id for usuario_id, usuario in zip(usuario_ids, usuarios) if usuario is None]
+            if no_encontrados:
+                return [], no_encontrados
+            lsn = self._escribir([("eliminar", usuario) for usuario in usuarios])
+        self._confirmar(lsn)
+        return usuarios, []
     
     def contar_usuarios(self):
         """Contar total de usuarios"""
         return len(self.usuarios)
 
+# Base de datos SQLite para usuarios, compartida por varios procesos
+@operaciones_trazadas(trazas)
+class UsuarioDBSQLite(UsuarioDBBase):
+    """Usuarios en un fichero SQLite en modo WAL.
+    
+    Los lectores no bloquean al escritor y los workers de gunicorn comparten
+    los datos. Cada hilo usa su propia conexión; las sentencias son fijas y
+    parametrizadas, así que sqlite3 las reutiliza preparadas desde su cache.
+    Los IDs los asigna SQLite (AUTOINCREMENT) y no colisionan entre procesos.
+    """
+    
+    COLUMNAS = ("id", "nombre", "email", "telefono", "fecha_creacion", "fecha_actualizacion")
+    
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT,
+            email TEXT,
+            telefono TEXT,
+            fecha_creacion INTEGER NOT NULL,
+            fecha_actualizacion INTEGER
+        );
+    """
+    
+    SQL_INSERTAR = ("INSERT INTO usuarios (nombre, email, telefono, fecha_creacion) "
+                    "VALUES (?, ?, ?, ?) RETURNING *")
+    # Cada campo editable lleva un indicador: solo se modifica si viene en la petición
+    SQL_ACTUALIZAR = ("UPDATE usuarios SET "
+                      + ", ".join(f"{campo} = CASE WHEN ? THEN ? ELSE {campo} END" for campo in CAMPOS_EDITABLES_USUARIO)
+                      + ", fecha_actualizacion = ? WHERE id = ? RETURNING *")
+    
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        conexion = self._conexion()
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.executescript(self.ESQUEMA)
+        self._crear_usuarios_iniciales()
+    
+    def _conexion(self):
+        """Conexión del hilo actual (sqlite3 no comparte conexiones entre hilos)"""
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = self._local.conexion = conectar_sqlite(self.ruta, fila_a_diccionario)
+        return conexion
+    
+    def _crear_usuarios_iniciales(self):
+        """Crear usuarios iniciales solo la primera vez que se crea la base de datos.
+        
+        BEGIN IMMEDIATE serializa a los workers que arrancan a la vez.
+        """
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            if conexion.execute("SELECT 1 FROM sqlite_sequence WHERE name = 'usuarios'").fetchone() is None:
+                for usuario_data in USUARIOS_INICIALES:
+                    self.crear_usuario(usuario_data)
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+    
+    def obtener_todos(self):
+        """Obtener todos los usuarios"""
+        return self._conexion().execute("SELECT * FROM usuarios ORDER BY id").fetchall()
+    
+    def obtener_por_id(self, usuario_id):
+        """Obtener usuario por ID"""
+        return self._conexion().execute("SELECT * FROM usuarios WHERE id = ?", (usuario_id,)).fetchone()
+    
+    def obtener_por_ids(self, usuario_ids):
+        """Obtener varios usuarios por ID (los inexistentes se omiten)"""
+        usuario_ids = list(usuario_ids)
+        if not usuario_ids:
+            return []
+        marcadores = ",".join("?" * len(usuario_ids))
+        encontrados = {u["id"]: u for u in self._conexion().execute(
+            f"SELECT * FROM usuarios WHERE id IN ({marcadores})", usuario_ids)}
+        return [encontrados[i] for i in usuario_ids if i in encontrados]
+    
+    def listar(self, limit, after_id=None, filtros=None):
+        """Página de usuarios ordenada por ID (se pide un registro extra para saber si hay más)"""
+        condiciones = ["id > ?"]
+        parametros = [after_id if after_id is not None else 0]
+        for campo, valor in (filtros or {}).items():
+            if campo not in self.COLUMNAS:
+                raise ValueError(f"Campo de filtro desconocido: {campo}")
+            condiciones.append(f"{campo} = ?")
+            parametros.append(valor)
+        parametros.append(limit + 1)
+        pagina = self._conexion().execute(
+            f"SELECT * FROM usuarios WHERE {' AND '.join(condiciones)} ORDER BY id LIMIT ?", parametros
+        ).fetchall()
+        return pagina[:limit], len(pagina) > limit
+    
+    def crear_usuario(self, datos_usuario):
+        """Crear nuevo usuario"""
+        return self._conexion().execute(self.SQL_INSERTAR, (
+            datos_usuario.get("nombre", ""),
+            datos_usuario.get("email", ""),
+            datos_usuario.get("telefono", ""),
+            ahora_ms()
+        )).fetchone()
+    
+    def actualizar_usuario(self, usuario_id, datos_actualizados):
+        """Actualizar usuario existente"""
+        parametros = []
+        for campo in CAMPOS_EDITABLES_USUARIO:
+            parametros += [campo in datos_actualizados, datos_actualizados.get(campo)]
+        return self._conexion().execute(self.SQL_ACTUALIZAR, parametros + [ahora_ms(), usuario_id]).fetchone()
+    
+    def eliminar_usuario(self, usuario_id):
+        """Eliminar usuario"""
+        return self._conexion().execute("DELETE FROM usuarios WHERE id = ? RETURNING *", (usuario_id,)).fetchone()
+    
+    def contar_usuarios(self):
+        """Contar total de usuarios"""
+        return self._conexion().execute("SELECT COUNT(*) AS total FROM usuarios").fetchone()["total"]
+    
+    def _aplicar_en_transaccion(self, operacion, argumentos):
+        """Aplicar operacion(*args) a cada tupla de argumentos en una sola transacción.
+        
+        Devuelve (resultados, ids_no_encontrados): si alguna operación no
+        encuentra su registro se deshace la transacción entera.
+        """
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            resultados = [operacion(*args) for args in argumentos]
+            no_encontrados = [args[0] for args, resultado in zip(argumentos, resultados) if resultado is None]
+            conexion.execute("ROLLBACK" if no_encontrados else "COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+        return ([] if no_encontrados else resultados), no_encontrados
+    
+    def crear_usuarios(self, lista_datos):
+        """Crear varios usuarios en una sola transacción"""
+        return self._aplicar_en_transaccion(self.crear_usuario, [(datos,) for datos in lista_datos])[0]
+    
+    def actualizar_usuarios(self, cambios_por_id):
+        """Actualizar varios usuarios [(usuario_id, datos), ...] en una transacción: todos o ninguno"""
+        return self._aplicar_en_transaccion(self.actualizar_usuario, cambios_por_id)
+    
+    def eliminar_usuarios(self, usuario_ids):
+        """Eliminar varios usuarios en una transacción: todos o ninguno"""
+        return self._aplicar_en_transaccion(self.eliminar_usuario, [(usuario_id,) for usuario_id in dict.fromkeys(usuario_ids)])
+
+def serializar_usuario(usuario, campos=None):
+    """Copia del usuario lista para JSON, con las fechas en ISO-8601"""
+    datos = proyectar(usuario, campos) if campos else dict(usuario)
+    for campo in ("fecha_creacion", "fecha_actualizacion"):
+        if campo in datos:
+            datos[campo] = formatear_fecha(datos[campo])
+    return datos
+
+def crear_base_datos():
+    """Crear el backend de base de datos configurado en DB_BACKEND"""
+    if DB_BACKEND == 'sqlite':
+        logs.info("Base de datos SQLite (WAL)", ruta=DB_PATH)
+        return UsuarioDBSQLite(DB_PATH)
+    if PERSISTENCIA:
+        logs.info("Persistencia activada", directorio=PERSISTENCIA_DIR, fsync=WAL_FSYNC, snapshot_cada=SNAPSHOT_CADA)
+        return UsuarioDB(Persistencia(PERSISTENCIA_DIR, 'usuarios', WAL_FSYNC != 'escritura', SNAPSHOT_CADA, logs))
+    return UsuarioDB()
+
 # Instancia global de la base de datos
-db_usuarios = UsuarioDB()
+db_usuarios = crear_base_datos()
 
 # ===== FUNCIONES DE AUTENTICACIÓN =====
+# API key, llamadas internas firmadas y JWT: ver comun/autenticacion.py
+
+verificador_jwt = VerificadorJWT(app, CACHE_JWT_MAX, logs)
+metricas.registrar_colector('jwt', lambda: series_cache("jwt_cache", verificador_jwt.cache.estadisticas()))
+autenticacion = Autenticacion(SERVICIO, API_KEY, SECRETO_INTERNO, TOKEN_INTERNO_TTL, verificador_jwt, logs)
 
-def verificar_api_key():
-    """Verificar API key en headers"""
+def headers_llamada_interna(destino, identidad=None):
+    """Headers para llamar a otro microservicio en nombre de la identidad de la petición actual"""
     if not AUTH_REQUIRED:
-        return True
-    
-    api_key = request.headers.get('X-API-Key')
-    return api_key == API_KEY
+        return {}
+    if identidad is None and has_request_context():
+        identidad = g.get('identidad')
+    return autenticacion.headers_llamada_interna(destino, identidad)
 
 def verificar_autenticacion():
-    """Verificar autenticación (API key o JWT)"""
+    """Verificar autenticación (llamada interna, API key o JWT) y guardar la identidad en g.identidad"""
     if not AUTH_REQUIRED:
         return True
     
-    # Verificar API key
-    if verificar_api_key():
-        print("✅ [USUARIO-SERVICE] Autenticación exitosa con API Key")
-        return True
-    
-    # Verificar JWT token
-    try:
-        from flask_jwt_extended import verify_jwt_in_request
-        verify_jwt_in_request()
-        identity = get_jwt_identity()
-        if identity:
-            print(f"✅ [USUARIO-SERVICE] Autenticación exitosa con JWT para usuario: {identity}")
-            return True
-    except Exception as e:
-        print(f"❌ [USUARIO-SERVICE] Error en autenticación JWT: {e}")
-    
-    print("❌ [USUARIO-SERVICE] Autenticación fallida")
-    return False
+    identidad = autenticacion.identidad_peticion(request.headers, request.path)
+    if identidad is None:
+        return False
+    g.identidad = identidad
+    return True
 
 def requiere_autenticacion(f):
     """Decorador para requerir autenticación en endpoints"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not verificar_autenticacion():
+        with trazas.span("autenticacion"):
+            autenticado = verificar_autenticacion()
+        if not autenticado:
             return jsonify({
                 'error': 'No autorizado',
                 'mensaje': 'Se requiere autenticación válida (API Key o JWT Token)',
@@ -135,6 +687,45 @@ def requiere_autenticacion(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# ===== COMUNICACIÓN CON OTROS MICROSERVICIOS =====
+
+# Sesión keep-alive y circuito para las notificaciones a pedido-service
+sesion_pedido_service = requests.Session()
+circuito_pedido_service = Circuito('pedido-service', CIRCUITO_FALLOS, CIRCUITO_ESPERA, metricas, logs)
+metricas.registrar_colector('circuitos', lambda: series_circuitos([circuito_pedido_service]))
+
+def notificar_invalidacion_usuarios(usuario_ids):
+    """Avisar a pedido-service para que descarte los usuarios de su cache.
+    
+    Con el circuito abierto o sin plazo no se avisa: los usuarios caducan igualmente
+    en la cache de pedido-service al pasar su TTL.
+    """
+    motivo = rechazo_llamada(circuito_pedido_service)
+    if motivo is not None:
+        logs.warning("No se avisó a pedido-service para invalidar su cache", motivo=motivo)
+        return
+    restante = tiempo_restante()
+    inicio = time.perf_counter()
+    with trazas.span("POST pedido-service", tipo='client', endpoint="/cache/usuarios/invalidar"):
+        headers = {**headers_llamada_interna('pedido-service'), **trazas.headers()}
+        if restante is not None:
+            headers[HEADER_PLAZO] = str(int(restante * 1000))
+        try:
+            response = sesion_pedido_service.post(
+                f"{PEDIDO_SERVICE_URL}/cache/usuarios/invalidar",
+                json={"ids": list(usuario_ids)},
+                headers=headers,
+                timeout=min(1, restante) if restante is not None else 1
+            )
+            metricas.registrar_llamada('pedido-service', inicio, codigo=response.status_code)
+            circuito_pedido_service.registrar(response.status_code < 500)
+            if response.status_code != 200:
+                logs.warning("pedido-service no invalidó la cache", estado=response.status_code)
+        except requests.exceptions.RequestException as e:
+            metricas.registrar_llamada('pedido-service', inicio, error=e)
+            circuito_pedido_service.registrar(False)
+            logs.warning("No se pudo invalidar la cache de pedido-service", error=str(e))
+
 # ===== RUTAS DEL MICROSERVICIO DE USUARIOS =====
 
 @app.route("/", methods=["GET"])
@@ -147,14 +738,22 @@ def index():
         "puerto": os.getenv('PORT', 5004),
         "endpoints": {
             "usuarios": [
-                "GET /usuarios - Obtener todos los usuarios",
+                "GET /usuarios - Obtener usuarios (limit, after_id, fields, nombre, email)",
+                "GET /usuarios con 'Accept: application/x-ndjson' - Colección completa en streaming",
+                "GET /usuarios?ids=1,2,3 - Obtener varios usuarios en una sola petición",
                 "GET /usuarios/{id} - Obtener usuario por ID",
                 "POST /usuarios - Crear nuevo usuario",
                 "PUT /usuarios/{id} - Actualizar usuario",
-                "DELETE /usuarios/{id} - Eliminar usuario"
+                "DELETE /usuarios/{id} - Eliminar usuario",
+                "POST /usuarios/bulk - Crear varios usuarios (array JSON o NDJSON, todos o ninguno)",
+                "PATCH /usuarios/bulk - Actualizar varios usuarios (un objeto con 'id' por elemento)",
+                "DELETE /usuarios/bulk - Eliminar varios usuarios (IDs)"
             ],
             "health": [
-                "GET /health - Estado del servicio"
+                "GET /health - Estado del servicio",
+                "GET /metrics - Métricas para Prometheus",
+                "GET /trazas - Peticiones más lentas trazadas (limit)",
+                "GET /trazas/{trace_id} - Spans de una traza"
             ]
         },
         "autenticacion_requerida": AUTH_REQUIRED
@@ -166,19 +765,99 @@ def health_check():
     return jsonify({
         "servicio": "usuario-service",
         "estado": "healthy",
-        "timestamp": str(os.popen('date').read().strip())
+        "timestamp": timestamp_actual()
     })
 
+@app.route("/trazas", methods=["GET"])
+@requiere_autenticacion
+def trazas_lentas():
+    """Peticiones más lentas entre las trazas guardadas en memoria por este worker"""
+    limite = request.args.get('limit', 20, type=int)
+    return jsonify({"peticiones": trazas.peticiones_lentas(limite), "servicio": "usuario-service"})
+
+@app.route("/trazas/<trace_id>", methods=["GET"])
+@requiere_autenticacion
+def obtener_traza(trace_id):
+    """Spans de una traza registrados por este servicio (todos los workers si hay TRAZAS_ARCHIVO)"""
+    return jsonify({"trace_id": trace_id, "spans": trazas.buscar(trace_id.lower()), "servicio": "usuario-service"})
+
+@app.route("/metrics", methods=["GET"])
+def exponer_metricas_prometheus():
+    """Métricas en el formato de texto de Prometheus (de todos los workers)"""
+    valores = valores_metricas(metricas, metricas_procesos)
+    # La tabla se cuenta aquí y no en cada worker: con SQLite la comparten todos
+    valores[("db_table_rows", (("table", "usuarios"),))] = db_usuarios.contar_usuarios()
+    return Response(exponer_metricas(valores, DEFINICION_METRICAS), content_type=CONTENT_TYPE_METRICAS)
+
 @app.route("/usuarios", methods=["GET"])
 @requiere_autenticacion
 def obtener_usuarios():
-    """Obtener todos los usuarios"""
-    usuarios = db_usuarios.obtener_todos()
+    """Obtener todos los usuarios (o varios por ID con ?ids=1,2,3)"""
+    if 'ids' in request.args:
+        return obtener_usuarios_por_ids(request.args.get('ids', ''))
+    
+    streaming = acepta_ndjson(request)
+    try:
+        limit, after_id, filtros, campos = leer_parametros_listado(request, FILTROS_USUARIO, LIMITE_PAGINA_DEFECTO, LIMITE_PAGINA_MAX, streaming)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "servicio": "usuario-service"
+        }), 400
+    
+    if streaming:
+        logs.debug_muestreado("Listado de usuarios en streaming NDJSON")
+        return Response(stream_with_context(generar_usuarios_ndjson(limit, after_id, filtros, campos)),
+                        mimetype=MIMETYPE_NDJSON)
+    
+    usuarios, hay_mas = db_usuarios.listar(limit, after_id, filtros)
     total = db_usuarios.contar_usuarios()
-    print(f"📋 [USUARIO-SERVICE] Obteniendo todos los usuarios ({total} usuarios)")
+    logs.debug_muestreado("Listado de usuarios", devueltos=len(usuarios), total=total)
     return jsonify({
-        "usuarios": usuarios,
+        "usuarios": [serializar_usuario(u, campos) for u in usuarios],
         "total": total,
+        "paginacion": {
+            "limit": limit,
+            "after_id": after_id,
+            "siguiente_after_id": usuarios[-1]["id"] if hay_mas else None
+        },
+        "servicio": "usuario-service"
+    })
+
+def generar_usuarios_ndjson(limit, after_id, filtros, campos):
+    """Generador NDJSON que recorre la base de datos por lotes sin cargarla entera"""
+    pendientes = limit
+    for lote in db_usuarios.iterar_lotes(LIMITE_PAGINA_MAX, after_id, filtros):
+        if pendientes is not None:
+            lote = lote[:pendientes]
+            pendientes -= len(lote)
+        yield ''.join(linea_ndjson(serializar_usuario(u, campos)) for u in lote)
+        if pendientes == 0:
+            return
+
+def obtener_usuarios_por_ids(ids_param):
+    """Búsqueda en lote de usuarios para evitar una petición por usuario"""
+    try:
+        usuario_ids = list(dict.fromkeys(int(i) for i in ids_param.split(',') if i.strip()))
+    except ValueError:
+        return jsonify({
+            "error": "El parámetro 'ids' debe ser una lista de enteros separados por comas",
+            "servicio": "usuario-service"
+        }), 400
+    
+    if len(usuario_ids) > MAX_IDS_POR_LOTE:
+        return jsonify({
+            "error": f"Máximo {MAX_IDS_POR_LOTE} IDs por petición",
+            "servicio": "usuario-service"
+        }), 400
+    
+    usuarios = db_usuarios.obtener_por_ids(usuario_ids)
+    encontrados = {u["id"] for u in usuarios}
+    logs.debug_muestreado("Búsqueda de usuarios por IDs", encontrados=len(usuarios), solicitados=len(usuario_ids))
+    return jsonify({
+        "usuarios": [serializar_usuario(u) for u in usuarios],
+        "total": len(usuarios),
+        "no_encontrados": [i for i in usuario_ids if i not in encontrados],
         "servicio": "usuario-service"
     })
 
@@ -186,16 +865,15 @@ def obtener_usuarios():
 @requiere_autenticacion
 def obtener_usuario(id_usuario):
     """Obtener usuario por ID"""
-    print(f"🔍 [USUARIO-SERVICE] Buscando usuario con ID: {id_usuario}")
     usuario = db_usuarios.obtener_por_id(id_usuario)
     if usuario:
-        print(f"✅ [USUARIO-SERVICE] Usuario encontrado: {usuario}")
+        logs.debug_muestreado("Usuario encontrado", usuario_id=id_usuario)
         return jsonify({
-            "usuario": usuario,
+            "usuario": serializar_usuario(usuario),
             "servicio": "usuario-service"
         })
     
-    print(f"❌ [USUARIO-SERVICE] Usuario con ID {id_usuario} no encontrado")
+    logs.debug_muestreado("Usuario no encontrado", usuario_id=id_usuario)
     return jsonify({
         "error": "Usuario no encontrado",
         "id_buscado": id_usuario,
@@ -216,9 +894,9 @@ def crear_usuario():
         }), 400
     
     nuevo_usuario = db_usuarios.crear_usuario(datos_usuario)
-    print(f"➕ [USUARIO-SERVICE] Nuevo usuario creado: {nuevo_usuario}")
+    logs.info("Usuario creado", usuario_id=nuevo_usuario["id"])
     return jsonify({
-        "usuario": nuevo_usuario,
+        "usuario": serializar_usuario(nuevo_usuario),
         "mensaje": "Usuario creado exitosamente",
         "servicio": "usuario-service"
     }), 201
@@ -238,14 +916,15 @@ def actualizar_usuario(id_usuario):
     usuario_actualizado = db_usuarios.actualizar_usuario(id_usuario, datos_actualizados)
     
     if usuario_actualizado:
-        print(f"✏️ [USUARIO-SERVICE] Usuario {id_usuario} actualizado: {usuario_actualizado}")
+        logs.info("Usuario actualizado", usuario_id=id_usuario)
+        notificar_invalidacion_usuarios([id_usuario])
         return jsonify({
-            "usuario": usuario_actualizado,
+            "usuario": serializar_usuario(usuario_actualizado),
             "mensaje": "Usuario actualizado exitosamente",
             "servicio": "usuario-service"
         }), 200
     else:
-        print(f"❌ [USUARIO-SERVICE] Usuario con ID {id_usuario} no encontrado para actualizar")
+        logs.info("Usuario no encontrado para actualizar", usuario_id=id_usuario)
         return jsonify({
             "error": "Usuario no encontrado",
             "id_buscado": id_usuario,
@@ -259,26 +938,102 @@ def eliminar_usuario(id_usuario):
     usuario_eliminado = db_usuarios.eliminar_usuario(id_usuario)
     
     if usuario_eliminado:
-        print(f"🗑️ [USUARIO-SERVICE] Usuario {id_usuario} eliminado: {usuario_eliminado}")
+        logs.info("Usuario eliminado", usuario_id=id_usuario)
+        notificar_invalidacion_usuarios([id_usuario])
         return jsonify({
-            "usuario_eliminado": usuario_eliminado,
+            "usuario_eliminado": serializar_usuario(usuario_eliminado),
             "mensaje": "Usuario eliminado exitosamente",
             "servicio": "usuario-service"
         }), 200
     else:
-        print(f"❌ [USUARIO-SERVICE] Usuario con ID {id_usuario} no encontrado para eliminar")
+        logs.info("Usuario no encontrado para eliminar", usuario_id=id_usuario)
         return jsonify({
             "error": "Usuario no encontrado",
             "id_buscado": id_usuario,
             "servicio": "usuario-service"
         }), 404
 
+@app.route("/usuarios/bulk", methods=["POST"])
+@requiere_autenticacion
+def crear_usuarios_lote():
+    """Crear varios usuarios (array JSON o NDJSON): se crean todos o ninguno"""
+    try:
+        elementos, errores = leer_lote(request, MAX_ELEMENTOS_LOTE)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "servicio": "usuario-service"
+        }), 400
+    
+    for indice, datos_usuario in enumerate(elementos):
+        if datos_usuario is not None and not (isinstance(datos_usuario, dict) and datos_usuario.get("nombre")):
+            errores.append({"indice": indice, "error": "El campo 'nombre' es requerido"})
+    if errores:
+        return respuesta_lote_rechazado(errores)
+    
+    nuevos_usuarios = db_usuarios.crear_usuarios(elementos)
+    logs.info("Usuarios creados en lote", total=len(nuevos_usuarios))
+    return respuesta_lote(nuevos_usuarios, "Usuarios creados exitosamente", 201)
+
+@app.route("/usuarios/bulk", methods=["PATCH"])
+@requiere_autenticacion
+def actualizar_usuarios_lote():
+    """Actualizar varios usuarios ({"id": 1, "email": ...} por elemento): se actualizan todos o ninguno"""
+    try:
+        elementos, errores = leer_lote(request, MAX_ELEMENTOS_LOTE)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "servicio": "usuario-service"
+        }), 400
+    
+    ids = ids_del_lote(elementos, errores)
+    if errores:
+        return respuesta_lote_rechazado(errores)
+    
+    usuarios_actualizados, no_encontrados = db_usuarios.actualizar_usuarios(list(zip(ids, elementos)))
+    if no_encontrados:
+        logs.info("Lote no aplicado", no_encontrados=len(no_encontrados))
+        return respuesta_lote_rechazado(errores_no_encontrados(ids, no_encontrados, "Usuario no encontrado"), 404)
+    
+    logs.info("Usuarios actualizados en lote", total=len(usuarios_actualizados))
+    notificar_invalidacion_usuarios(ids)
+    return respuesta_lote(usuarios_actualizados, "Usuarios actualizados exitosamente")
+
+@app.route("/usuarios/bulk", methods=["DELETE"])
+@requiere_autenticacion
+def eliminar_usuarios_lote():
+    """Eliminar varios usuarios (IDs o {"id": 1} por elemento): se eliminan todos o ninguno"""
+    try:
+        elementos, errores = leer_lote(request, MAX_ELEMENTOS_LOTE)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "servicio": "usuario-service"
+        }), 400
+    
+    ids = ids_del_lote(elementos, errores, admite_numeros=True)
+    if errores:
+        return respuesta_lote_rechazado(errores)
+    
+    usuarios_eliminados, no_encontrados = db_usuarios.eliminar_usuarios(ids)
+    if no_encontrados:
+        logs.info("Lote no aplicado", no_encontrados=len(no_encontrados))
+        return respuesta_lote_rechazado(errores_no_encontrados(ids, no_encontrados, "Usuario no encontrado"), 404)
+    
+    logs.info("Usuarios eliminados en lote", total=len(usuarios_eliminados))
+    notificar_invalidacion_usuarios(ids)
+    return respuesta_lote(usuarios_eliminados, "Usuarios eliminados exitosamente")
+
 if __name__ == "__main__":
     port = int(os.getenv('PORT', 5004))
-    debug = os.getenv('DEBUG', 'True').lower() == 'true'
+    debug = os.getenv('DEBUG', 'False').lower() == 'true'
     host = os.getenv('HOST', 'localhost')
     
-    print(f"🚀 [USUARIO-SERVICE] Iniciando microservicio en {host}:{port}")
-    print(f"🔐 [USUARIO-SERVICE] Autenticación requerida: {AUTH_REQUIRED}")
+    logs.info("Iniciando microservicio", host=host, puerto=port, autenticacion=AUTH_REQUIRED,
+              modo_servidor=SERVER_MODE)
+    
+    if SERVER_MODE == 'production':
+        logs.warning("gunicorn no está instalado; se usa el servidor de desarrollo de Flask")
     
-    app.run(host=host, port=port, debug=debug)
+    app.run(host=host, port=port, debug=debug, threaded=True)
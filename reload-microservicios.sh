@@ -0,0 +1,48 @@
+#!/bin/bash
+
+# Script para recargar los microservicios sin cortar las peticiones en curso
+echo "♻️  Recargando Arquitectura de Microservicios"
+echo "============================================="
+
+# Variable de un servicio: el entorno tiene prioridad sobre su config.env (como load_dotenv)
+config_servicio() {
+    local valor=$(sed -n "s/^$2=//p" microservicios/$1/config.env 2>/dev/null | tail -n 1)
+    echo "${!2:-$valor}"
+}
+
+# Función para recargar un servicio (gunicorn reemplaza sus workers al recibir HUP)
+reload_service() {
+    local service_name=$1
+    local pid_file="logs/${service_name}.pid"
+    
+    # Con DB_BACKEND=memoria y sin PERSISTENCIA los datos solo están en el worker:
+    # el nuevo empezaría con los datos iniciales. Con PERSISTENCIA el worker nuevo
+    # espera a que el antiguo termine y carga su WAL (ver comun/persistencia.py).
+    local backend=$(config_servicio "$service_name" DB_BACKEND)
+    local persistencia=$(config_servicio "$service_name" PERSISTENCIA)
+    if [ "$service_name" != "gateway-service" ] && [ "${backend:-memoria}" = "memoria" ] \
+        && [ "$(echo "${persistencia:-False}" | tr '[:upper:]' '[:lower:]')" != "true" ]; then
+        echo "⚠️  $service_name no se recarga: usa DB_BACKEND=memoria sin PERSISTENCIA y perdería sus datos"
+        return
+    fi
+    
+    if [ -f "$pid_file" ]; then
+        local pid=$(cat "$pid_file")
+        echo "🔄 Recargando $service_name (PID: $pid)..."
+        
+        if kill -HUP $pid 2>/dev/null; then
+            echo "✅ $service_name recargado"
+        else
+            echo "❌ Error recargando $service_name (proceso no encontrado)"
+        fi
+    else
+        echo "⚠️  $service_name no está ejecutándose (no hay archivo PID)"
+    fi
+}
+
+reload_service "usuario-service"
+reload_service "pedido-service"
+reload_service "gateway-service"
+
+echo ""
+echo "ℹ️  La recarga ordenada requiere SERVER_MODE=production (gunicorn)"
@@ -25,12 +25,48 @@ check_port 5005 || { echo "Pedido-service necesita puerto 5005"; exit 1; }
 echo "🐍 Activando entorno virtual..."
 source venv/bin/activate
 
+# Núcleos disponibles para calcular procesos (workers) por servicio
+CPUS=$(nproc 2>/dev/null || sysctl -n hw.ncpu 2>/dev/null || echo 2)
+
+# Gateway: sin estado, escala con procesos (2 x núcleos + 1).
+# Con GATEWAY_MODE=async (app_async.py) cada proceso atiende muchas peticiones sin hilos: uno por núcleo.
+GATEWAY_MODE=${GATEWAY_MODE:-$(sed -n 's/^GATEWAY_MODE=//p' microservicios/gateway-service/config.env)}
+if [ "$GATEWAY_MODE" = "async" ]; then
+    GATEWAY_APP=app_async.py
+    GATEWAY_WORKERS=$CPUS
+else
+    GATEWAY_APP=app.py
+    GATEWAY_WORKERS=$((CPUS * 2 + 1))
+fi
+GATEWAY_THREADS=8
+# Usuario/Pedido: con DB_BACKEND=memoria guardan los datos en el proceso, así que un solo
+# proceso con más hilos; con DB_BACKEND=sqlite comparten la base de datos y usan todos los núcleos
+DATA_THREADS=$((CPUS * 4 > 16 ? CPUS * 4 : 16))
+data_workers() {
+    local backend=$(sed -n 's/^DB_BACKEND=//p' microservicios/$1/config.env)
+    if [ "${DB_BACKEND:-$backend}" = "sqlite" ]; then
+        echo $((CPUS * 2 + 1))
+    else
+        echo 1
+    fi
+}
+
+# Secreto con el que los servicios firman sus llamadas internas (X-Auth-Interna): el mismo para
+# los tres y distinto en cada despliegue. Se hereda del entorno si ya está definido.
+if [ -z "$SECRETO_INTERNO" ]; then
+    SECRETO_INTERNO=$(python -c 'import secrets; print(secrets.token_hex(32))')
+fi
+export SECRETO_INTERNO
+
 # Función para iniciar un servicio
 start_service() {
     local service_name=$1
     local port=$2
+    local workers=$3
+    local threads=$4
+    local script=${5:-app.py}
     
-    echo "🔄 Iniciando $service_name en puerto $port..."
+    echo "🔄 Iniciando $service_name en puerto $port (workers: $workers, hilos: $threads)..."
     
     # Crear directorio de logs si no existe
     mkdir -p logs
@@ -38,8 +74,8 @@ start_service() {
     # Cambiar al directorio del servicio y usar su config.env
     cd microservicios/$service_name
     
-    # Iniciar servicio en background
-    nohup python app.py > ../../logs/${service_name}.log 2>&1 &
+    # Iniciar servicio en background (con SERVER_MODE=production arranca gunicorn)
+    WORKERS=$workers THREADS=$threads nohup python $script > ../../logs/${service_name}.log 2>&1 &
     
     # Volver al directorio raíz
     cd ../..
@@ -63,21 +99,21 @@ start_service() {
 echo "🚀 Iniciando microservicios..."
 
 # 1. Usuario Service (debe iniciar primero)
-start_service "usuario-service" "5004"
+start_service "usuario-service" "5004" "$(data_workers usuario-service)" "$DATA_THREADS"
 if [ $? -ne 0 ]; then
     echo "❌ Error iniciando usuario-service"
     exit 1
 fi
 
 # 2. Pedido Service (depende de usuario-service)
-start_service "pedido-service" "5005"
+start_service "pedido-service" "5005" "$(data_workers pedido-service)" "$DATA_THREADS"
 if [ $? -ne 0 ]; then
     echo "❌ Error iniciando pedido-service"
     exit 1
 fi
 
 # 3. Gateway (depende de ambos servicios)
-start_service "gateway-service" "5003"
+start_service "gateway-service" "5003" "$GATEWAY_WORKERS" "$GATEWAY_THREADS" "$GATEWAY_APP"
 if [ $? -ne 0 ]; then
     echo "❌ Error iniciando gateway-service"
     exit 1
@@ -94,6 +130,7 @@ echo ""
 echo "🔧 Comandos útiles:"
 echo "   • Ver logs:         tail -f logs/[servicio].log"
 echo "   • Detener todo:     ./stop-microservicios.sh"
+echo "   • Recargar (sin cortar peticiones): ./reload-microservicios.sh"
 echo "   • Estado:           ./status-microservicios.sh"
 echo ""
 echo "📋 Para probar la API:"
@@ -123,6 +123,67 @@ except:
     print('   ❌ Error procesando respuesta')
 "
 
+echo ""
+
+# 7. Pruebas de concurrencia (IDs duplicados y actualizaciones perdidas)
+echo "🧵 Pruebas de Concurrencia"
+echo "=========================="
+echo "🔍 Creando usuarios y actualizando el mismo usuario desde varios hilos a la vez..."
+API_KEY="$API_KEY" BASE_URL="$BASE_URL" python3 -c "
+import json, os, threading, urllib.request
+
+BASE_URL, HEADERS = os.environ['BASE_URL'], {'X-API-Key': os.environ['API_KEY'], 'Content-Type': 'application/json'}
+HILOS, POR_HILO, ACTUALIZACIONES = 20, 10, 30
+
+def peticion(metodo, endpoint, datos=None):
+    cuerpo = json.dumps(datos).encode() if datos is not None else None
+    with urllib.request.urlopen(urllib.request.Request(BASE_URL + endpoint, cuerpo, HEADERS, method=metodo)) as r:
+        return json.load(r)
+
+def en_paralelo(funcion, argumentos):
+    hilos = [threading.Thread(target=funcion, args=a) for a in argumentos]
+    [h.start() for h in hilos]
+    [h.join() for h in hilos]
+
+total_antes = peticion('GET', '/usuarios?limit=1')['total']
+ids = []
+def crear(n):
+    for i in range(POR_HILO):
+        ids.append(peticion('POST', '/usuarios', {'nombre': f'Concurrente {n}-{i}'})['usuario']['id'])
+en_paralelo(crear, [(n,) for n in range(HILOS)])
+total_despues = peticion('GET', '/usuarios?limit=1')['total']
+esperados = HILOS * POR_HILO
+if len(set(ids)) == esperados and total_despues - total_antes == esperados:
+    print(f'   ✅ {esperados} usuarios creados en paralelo con IDs únicos')
+else:
+    print(f'   ❌ IDs únicos: {len(set(ids))}/{esperados}, incremento del total: {total_despues - total_antes}')
+
+# Cada hilo modifica un campo distinto del mismo usuario: ningún cambio debe perderse
+usuario_id = ids[0]
+def actualizar(campo):
+    for k in range(ACTUALIZACIONES):
+        peticion('PUT', f'/usuarios/{usuario_id}', {campo: f'{campo}-{k}'})
+campos = ('nombre', 'email', 'telefono')
+en_paralelo(actualizar, [(c,) for c in campos])
+usuario = peticion('GET', f'/usuarios/{usuario_id}')['usuario']
+perdidos = [c for c in campos if usuario[c] != f'{c}-{ACTUALIZACIONES - 1}']
+if not perdidos:
+    print(f'   ✅ {len(campos) * ACTUALIZACIONES} actualizaciones concurrentes sin cambios perdidos')
+else:
+    print(f'   ❌ Actualizaciones perdidas en: {perdidos}')
+
+for i in ids:
+    peticion('DELETE', f'/usuarios/{i}')
+"
+
+# Las mismas comprobaciones dentro de un proceso, con miles de operaciones por hilo sobre UsuarioDB y PedidoDB
+echo "🔍 Estrés multihilo de las bases de datos en memoria (microservicios/bench/estres_db.py)..."
+python3 microservicios/bench/estres_db.py 2>&1 | sed 's/^/   /'
+
+# Pruebas de comportamiento dentro del proceso: WAL y snapshot, lotes, caches, llamadas internas y precios
+echo "🔍 Pruebas de comportamiento (microservicios/tests)..."
+python3 -m pytest -q microservicios/tests 2>&1 | sed 's/^/   /'
+
 echo ""
 echo "🎉 ¡Pruebas completadas!"
 echo "========================"